@@ -0,0 +1,138 @@
+"""
+Cold-start benchmark for the Flask app.
+
+Starts fresh interpreters that import src/app.py and serve GET / through
+the test client, and reports how long that takes, which top-level imports
+the time goes to (from python -X importtime) and whether any of the heavy
+modules the request path no longer needs at startup got pulled back in.
+
+    python benchmarks/cold_start.py                   # 5 runs, 1s budget
+    python benchmarks/cold_start.py --runs 10 --budget 0.5 --output cold_start.json
+
+Exits with status 1 when the median time to the first response is over
+budget or a deferred module is imported at startup, so it can guard
+against regressions.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+
+DEFAULT_BUDGET = 1.0
+# Loaded on first use (matching, OpenAI calls), never at startup
+DEFERRED_MODULES = ['pandas', 'numpy', 'openai']
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_response_seconds': served - start,
+    'status': response.status_code,
+    'deferred_loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (DEFERRED_MODULES,)
+
+
+def run_probe(importtime=False):
+    """One fresh interpreter: the probe's measurements, plus -X importtime's lines if asked"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run(command, cwd=SRC_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"probe failed:\n{result.stderr[-2000:]}")
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    return measurement, result.stderr.splitlines() if importtime else []
+
+
+def import_report(lines, top=10):
+    """Heaviest modules imported directly by app, as (name, cumulative seconds)"""
+    modules = []
+    children = []
+    for line in lines:
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        # Nested imports are listed (indented) before the module importing them
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1e6))
+        elif depth == 0:
+            if name.strip() == 'app':
+                modules = children
+            children = []
+    return sorted(modules, key=lambda item: -item[1])[:top]
+
+
+def run(runs, budget=DEFAULT_BUDGET):
+    """Time runs fresh starts; returns the summary (with 'failures') and prints it"""
+    # Warm the bytecode and OS caches once so runs are comparable
+    run_probe()
+    measurements = [run_probe()[0] for _ in range(runs)]
+    _, importtime_lines = run_probe(importtime=True)
+
+    first_response = statistics.median(run['first_response_seconds'] for run in measurements)
+    imports = statistics.median(run['import_seconds'] for run in measurements)
+    deferred_loaded = sorted({name for run in measurements for name in run['deferred_loaded']})
+    heaviest = import_report(importtime_lines)
+
+    print(f"import app:      {imports * 1000:.0f} ms (median of {runs})")
+    print(f"first response:  {first_response * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    print("heaviest imports:")
+    for name, seconds in heaviest:
+        print(f"  {name:<24} {seconds * 1000:7.1f} ms")
+
+    failures = []
+    if first_response > budget:
+        failures.append(f"first response took {first_response:.3f}s, budget is {budget:.3f}s")
+    if deferred_loaded:
+        failures.append(f"imported at startup: {', '.join(deferred_loaded)}")
+    if any(run['status'] != 200 for run in measurements):
+        failures.append("GET / did not return 200")
+
+    return {
+        'benchmark': 'cold_start',
+        'runs': runs,
+        'import_seconds': imports,
+        'first_response_seconds': first_response,
+        'budget_seconds': budget,
+        'deferred_loaded': deferred_loaded,
+        'heaviest_imports': dict(heaviest),
+        'passed': not failures,
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the app's cold start")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET,
+                        help="Allowed median seconds from interpreter start to the first response")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args.runs, args.budget)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+        print(f"Results saved to: {args.output}")
+
+    for failure in result['failures']:
+        print(f"FAIL: {failure}")
+    return 1 if result['failures'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Per-endpoint latency of the Flask app with the OpenAI API stubbed locally.
+
+Each corpus size gets a fresh interpreter that points the app at the
+synthetic corpus (SURVEY_DATA_DIR), starts scripts/helpers/upstream_stub.py
+in-process as the OpenAI endpoint, keeps avatars in a temporary directory
+and calls every endpoint through Flask's test client, one request at a
+time. Upstream time is the stub's (near zero), so the numbers are the
+app's own work: loading data, matching, rendering, caching.
+
+    python benchmarks/endpoints.py                     # 1k corpus, 30 requests per endpoint
+    python benchmarks/endpoints.py --sizes 1k,10k --requests 100
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import (ROOT_DIR, SRC_DIR, EMBEDDING_DIMS, parse_size, format_size, write_corpus, corpus_dir,
+                     participant_id, app_skip_reason, percentiles, peak_rss_mb, timed, run_worker, write_results)
+
+DEFAULT_SIZES = '1k'
+DEFAULT_REQUESTS = 30
+
+# One reply that both JSON-parsing endpoints accept
+STUB_CHAT_CONTENT = json.dumps({
+    'summary': 'You both love a singalong.',
+    'insights': [{'field': 'Q18_Life_theme_song', 'insight': 'You both picked anthems.'}],
+    'ai_level': 'curious',
+    'intensity_level': 'engaged',
+    'sociality_level': 'social_listener',
+    'favourite_genre': 'rock',
+    'favourite_band': 'Queen',
+})
+
+USER_ANSWERS = {
+    'q1': "It's part of who I am",
+    'q2': 'My parents\' records',
+    'q3': 'Classic throwbacks',
+    'q4': "I'm curious but cautious",
+    'q5': 'Commuting and cooking',
+    'q6': 'Queen, because Freddie',
+}
+
+
+def endpoint_requests(size, i):
+    """(name, method, path, json body) for the i-th round of requests"""
+    respondent = participant_id(i % size)
+    return [
+        ('index', 'GET', '/', None),
+        ('stats_page', 'GET', '/stats', None),
+        ('api_stats', 'GET', '/api/stats', None),
+        ('api_responses', 'GET', '/api/responses', None),
+        ('api_response', 'GET', f'/api/response/{respondent}', None),
+        ('submit_answers', 'POST', '/submit_answers', dict(USER_ANSWERS, q6=f"{USER_ANSWERS['q6']} #{i}")),
+        ('analyze_match', 'POST', '/analyze_match', {'user_answers': USER_ANSWERS, 'match_profile': {'theme_song': f'Song {i}'}}),
+        ('generate_avatar', 'POST', '/generate_avatar', {'participant_id': respondent}),
+        ('generate_user_avatar', 'POST', '/generate_user_avatar',
+         {'physical_description': f'curly hair, glasses #{i}', 'user_answers': USER_ANSWERS}),
+    ]
+
+
+def worker(size, requests):
+    """Time every endpoint against one corpus (runs in its own interpreter)"""
+    scratch = tempfile.mkdtemp(prefix='bench-endpoints-')
+    os.environ['STUB_CHAT_CONTENT'] = STUB_CHAT_CONTENT
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'scripts', 'helpers'))
+    from upstream_stub import start_stub_server
+    server, base_url = start_stub_server()
+
+    os.environ.update({
+        'SURVEY_DATA_DIR': corpus_dir(size, EMBEDDING_DIMS),
+        'OPENAI_BASE_URL': f"{base_url}/v1",
+        'OPENAI_API_KEY': 'benchmark',
+        'AVATAR_CACHE_DIR': os.path.join(scratch, 'avatar_cache'),
+        'AVATAR_PREGENERATED_DIR': os.path.join(scratch, 'avatars'),
+    })
+    sys.path.insert(0, SRC_DIR)
+    import app
+    client = app.app.test_client()
+
+    samples = {}
+    statuses = {}
+    # The app logs every request; keep stdout for the result line
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for i in range(requests):
+            for name, method, path, body in endpoint_requests(size, i):
+                response, seconds = timed(lambda: client.open(path, method=method, json=body))
+                samples.setdefault(name, []).append(seconds)
+                statuses.setdefault(name, {}).setdefault(str(response.status_code), 0)
+                statuses[name][str(response.status_code)] += 1
+    server.shutdown()
+
+    return {
+        'size': size,
+        'endpoints': {
+            name: dict(percentiles(times), first_ms=times[0] * 1000, statuses=statuses[name])
+            for name, times in samples.items()
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run(sizes, requests, timeout=None):
+    results = []
+    for size in sizes:
+        reason = app_skip_reason(size, EMBEDDING_DIMS)
+        if reason:
+            print(f"[{format_size(size)}] endpoints skipped: {reason}")
+            results.append({'size': size, 'error': reason})
+            continue
+        write_corpus(size, EMBEDDING_DIMS)
+        print(f"[{format_size(size)}] endpoints...")
+        result = run_worker('endpoints.py', ['--worker', size, '--requests', requests], timeout=timeout)
+        result.setdefault('size', size)
+        results.append(result)
+        if 'error' in result:
+            print(f"[{format_size(size)}] {result['error']}")
+            continue
+        for name, summary in result['endpoints'].items():
+            print(f"  {name:<22} p50 {summary['p50_ms']:8.1f} ms  p99 {summary['p99_ms']:8.1f} ms  {summary['statuses']}")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app's endpoints against a local OpenAI stub")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Corpus sizes, e.g. 1k,10k")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="Requests per endpoint")
+    parser.add_argument('--output', help="Results file (default benchmarks/results/endpoints-<commit>.json)")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.requests)))
+        return 0
+
+    results = run([parse_size(size) for size in args.sizes.split(',')], args.requests)
+    write_results('endpoints', results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
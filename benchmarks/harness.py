@@ -0,0 +1,268 @@
+"""
+Shared pieces of the benchmark suite: synthetic corpora, timing summaries
+and the JSON result files.
+
+Synthetic corpora live under benchmarks/.data/<size>x<dims>/:
+
+    embeddings.npy          seeded random unit vectors (float32), row i
+                            belonging to participant_id(i); engines that can
+                            memory-map it use it at any size
+    survey_embeddings.json  the same vectors in the format the app reads
+    survey_data.csv         from SURVEY_DATA_DIR, plus real published rows
+                            resampled under the new participant ids
+
+The app files are only written for sizes the app is run at (they take ~21
+bytes per float on disk and ~55 in memory once loaded). Everything is
+written in chunks, so even the 1M corpus is generated in constant memory,
+and reused by later runs.
+
+Results are written to benchmarks/results/<benchmark>-<commit>.json with
+the commit, machine and parameters, so runs can be compared across commits
+(run_benchmarks.py --compare).
+"""
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import socket
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+DATA_ROOT = os.path.join(BENCH_DIR, '.data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+PUBLISHED_CSV = os.path.join(SRC_DIR, 'static', 'data', 'survey_data.csv')
+
+# text-embedding-3-small, which the app embeds user answers with
+EMBEDDING_DIMS = 1536
+SEED = 1234
+CHUNK = 10000
+
+
+def parse_size(text):
+    """'1k' -> 1000, '100k' -> 100000, '1M' -> 1000000"""
+    text = text.strip()
+    multiplier = {'k': 1000, 'K': 1000, 'm': 1000000, 'M': 1000000}.get(text[-1])
+    return int(float(text[:-1]) * multiplier) if multiplier else int(text)
+
+
+def format_size(size):
+    for suffix, unit in (('M', 1000000), ('k', 1000)):
+        if size >= unit and size % unit == 0:
+            return f"{size // unit}{suffix}"
+    return str(size)
+
+
+def participant_id(i):
+    return f"synthetic-{i:08d}"
+
+
+def corpus_dir(size, dims=EMBEDDING_DIMS):
+    return os.path.join(DATA_ROOT, f"{format_size(size)}x{dims}")
+
+
+def estimated_matrix_bytes(size, dims=EMBEDDING_DIMS):
+    return size * dims * 4
+
+
+def estimated_app_corpus_bytes(size, dims=EMBEDDING_DIMS):
+    # ~21 characters per JSON float plus ~3 KB of survey row per respondent
+    return size * (dims * 21 + 3000)
+
+
+def estimated_load_bytes(size, dims=EMBEDDING_DIMS):
+    # json.load keeps every float as a Python object in a list: ~55 bytes each
+    return size * dims * 55
+
+
+def physical_memory_bytes():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def write_embeddings(size, dims=EMBEDDING_DIMS, seed=SEED):
+    """Generate (or reuse) the corpus's embeddings.npy; returns its path"""
+    import numpy as np
+
+    directory = corpus_dir(size, dims)
+    path = os.path.join(directory, 'embeddings.npy')
+    done_marker = os.path.join(directory, '.embeddings-complete')
+    if os.path.exists(done_marker):
+        return path
+    os.makedirs(directory, exist_ok=True)
+
+    print(f"Generating {format_size(size)} x {dims} embeddings in {directory}...")
+    rng = np.random.default_rng(seed)
+    matrix = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(size, dims))
+    for start in range(0, size, CHUNK):
+        vectors = rng.standard_normal((min(CHUNK, size - start), dims))
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        matrix[start:start + len(vectors)] = vectors
+    matrix.flush()
+    del matrix
+
+    open(done_marker, 'w').close()
+    return path
+
+
+def write_corpus(size, dims=EMBEDDING_DIMS):
+    """Generate (or reuse) the app's files for a corpus; returns its directory"""
+    import numpy as np
+
+    directory = corpus_dir(size, dims)
+    done_marker = os.path.join(directory, '.app-complete')
+    if os.path.exists(done_marker):
+        return directory
+    matrix = np.load(write_embeddings(size, dims), mmap_mode='r')
+
+    print(f"Writing the app's {format_size(size)} x {dims} corpus in {directory}...")
+    with open(os.path.join(directory, 'survey_embeddings.json'), 'w', encoding='utf-8') as f:
+        f.write('[')
+        for start in range(0, size, CHUNK):
+            vectors = np.round(matrix[start:start + CHUNK].astype(np.float64), 8).tolist()
+            entries = (
+                json.dumps({'participant_id': participant_id(start + i), 'embedding': vector})
+                for i, vector in enumerate(vectors)
+            )
+            f.write((',' if start else '') + ','.join(entries))
+        f.write(']')
+
+    with open(PUBLISHED_CSV, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        template_rows = list(reader)
+    with open(os.path.join(directory, 'survey_data.csv'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for i in range(size):
+            row = dict(template_rows[i % len(template_rows)])
+            row['participant_id'] = participant_id(i)
+            writer.writerow(row)
+
+    open(done_marker, 'w').close()
+    return directory
+
+
+def app_skip_reason(size, dims=EMBEDDING_DIMS):
+    """Why the app can't be run against a corpus of this size here, or None"""
+    directory = corpus_dir(size, dims)
+    os.makedirs(DATA_ROOT, exist_ok=True)
+    needed = estimated_app_corpus_bytes(size, dims)
+    free = shutil.disk_usage(DATA_ROOT).free
+    if not os.path.exists(os.path.join(directory, '.app-complete')) and needed > free:
+        return f"not enough disk: the app's corpus needs ~{needed / 1e9:.1f} GB, {free / 1e9:.1f} GB free"
+    needed = estimated_load_bytes(size, dims)
+    memory = physical_memory_bytes()
+    if memory and needed > memory:
+        return f"not enough memory: the app's json.load needs ~{needed / 1e9:.1f} GB, {memory / 1e9:.1f} GB installed"
+    return None
+
+
+def embeddings_skip_reason(size, dims=EMBEDDING_DIMS):
+    """Why embeddings.npy can't be written here, or None"""
+    os.makedirs(DATA_ROOT, exist_ok=True)
+    needed = estimated_matrix_bytes(size, dims)
+    free = shutil.disk_usage(DATA_ROOT).free
+    if not os.path.exists(os.path.join(corpus_dir(size, dims), '.embeddings-complete')) and needed > free:
+        return f"not enough disk: embeddings.npy needs ~{needed / 1e9:.1f} GB, {free / 1e9:.1f} GB free"
+    return None
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': pick(0.5),
+        'p90_ms': pick(0.9),
+        'p99_ms': pick(0.99),
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process. On Linux this is VmHWM, because
+    ru_maxrss carries the parent's peak across fork/exec (and the parent may
+    just have generated a corpus); elsewhere ru_maxrss (bytes on macOS)
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run_worker(script, args, timeout=None):
+    """
+    Run a benchmark worker in its own interpreter (so peak RSS is its own)
+    and return the JSON it writes; failures are returned as {'error': ...}
+    """
+    command = [sys.executable, os.path.join(BENCH_DIR, script)] + [str(arg) for arg in args]
+    try:
+        result = subprocess.run(command, cwd=ROOT_DIR, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': f"timed out after {timeout}s"}
+    if result.returncode != 0:
+        reason = 'killed (out of memory?)' if result.returncode in (-9, 137) else f"exit {result.returncode}"
+        return {'error': reason, 'stderr': result.stderr[-1000:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', 'src', 'scripts', 'benchmarks'],
+                               cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if commit and dirty else (commit or 'unknown')
+    except OSError:
+        return 'unknown'
+
+
+def result_metadata():
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_results(name, results, output=None):
+    """Write one benchmark's results (with metadata) as JSON; returns the path"""
+    document = dict(result_metadata(), benchmark=name, results=results)
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{document['commit']}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=1)
+    print(f"Results saved to: {output}")
+    return output
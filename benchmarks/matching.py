@@ -0,0 +1,221 @@
+"""
+Matching benchmark: load time, match latency and peak RSS per corpus size
+and engine.
+
+Engines:
+    app     find_best_match() from src/app.py, as /submit_answers runs it
+            (cosine_similarity() against every stored embedding in Python),
+            on the app's own survey_embeddings.json / survey_data.csv
+    numpy   reference: embeddings.npy normalised into one float32 matrix,
+            each query a single matrix-vector product; a matrix too big for
+            half the machine's memory is streamed from disk in fixed-size
+            blocks instead, so every size runs in bounded memory
+
+Every (size, engine) pair runs in a fresh interpreter, so load times are
+cold and peak RSS is that engine's own. The app engine is skipped (with the
+reason) at sizes whose JSON this machine can't hold; --force runs it anyway.
+A run that gets killed is recorded as an error and the rest carry on.
+
+    python benchmarks/matching.py                                # 1k, 100k, 1M
+    python benchmarks/matching.py --sizes 1k,10k --queries 50
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import (SRC_DIR, EMBEDDING_DIMS, parse_size, format_size, participant_id, write_corpus, write_embeddings, corpus_dir,
+                     estimated_matrix_bytes, physical_memory_bytes, app_skip_reason, embeddings_skip_reason,
+                     percentiles, peak_rss_mb, timed, run_worker, write_results)
+
+ENGINES = ['app', 'numpy']
+DEFAULT_SIZES = '1k,100k,1M'
+DEFAULT_QUERIES = 20
+# A slow engine stops taking queries after this long (it still reports what it did)
+DEFAULT_MAX_SECONDS = 60
+# Rows per block when the numpy engine normalises or streams the matrix (~100 MB at 1536 dims)
+STREAM_ROWS = 16384
+
+
+def query_vectors(count, dims, seed=99):
+    """Unit vectors standing in for user embeddings (plain lists, as the OpenAI SDK returns)"""
+    import numpy as np
+
+    vectors = np.random.default_rng(seed).standard_normal((count, dims))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.tolist()
+
+
+def matrix_blocks(path, buffer):
+    """Successive row blocks of a .npy matrix, read into buffer (so memory stays bounded)"""
+    import numpy as np
+
+    header = np.load(path, mmap_mode='r')
+    rows, offset = header.shape[0], header.offset
+    del header
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for start in range(0, rows, len(buffer)):
+            block = buffer[:min(len(buffer), rows - start)]
+            f.readinto(memoryview(block).cast('B'))
+            yield start, block
+
+
+def numpy_engine(path):
+    """match(user_embedding) over embeddings.npy, and whether it runs in memory or streamed"""
+    import numpy as np
+
+    size, dims = np.load(path, mmap_mode='r').shape
+    memory = physical_memory_bytes()
+    if memory is None or estimated_matrix_bytes(size, dims) <= memory // 2:
+        matrix = np.load(path)
+        for start in range(0, size, STREAM_ROWS):
+            block = matrix[start:start + STREAM_ROWS]
+            block /= np.linalg.norm(block, axis=1, keepdims=True)
+
+        def match(user_embedding):
+            query = np.asarray(user_embedding, dtype=np.float32)
+            similarities = matrix @ (query / np.linalg.norm(query))
+            best = int(similarities.argmax())
+            return participant_id(best), float(similarities[best])
+
+        return match, 'in-memory'
+
+    buffer = np.empty((STREAM_ROWS, dims), dtype=np.float32)
+    norms = np.empty(size, dtype=np.float32)
+    for start, block in matrix_blocks(path, buffer):
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+
+    def match(user_embedding):
+        query = np.asarray(user_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query)
+        best, best_similarity = None, -np.inf
+        for start, block in matrix_blocks(path, buffer):
+            similarities = (block @ query) / norms[start:start + len(block)]
+            i = int(similarities.argmax())
+            if similarities[i] > best_similarity:
+                best, best_similarity = start + i, float(similarities[i])
+        return participant_id(best), best_similarity
+
+    return match, 'streamed'
+
+
+def worker(size, dims, engine, queries, max_seconds):
+    """Measure one engine on one corpus (runs in its own interpreter)"""
+    result = {'size': size, 'dims': dims, 'engine': engine}
+    if engine == 'app':
+        os.environ['SURVEY_DATA_DIR'] = corpus_dir(size, dims)
+        sys.path.insert(0, SRC_DIR)
+        import app
+
+        embeddings_data, embeddings_seconds = timed(app.load_embeddings)
+        _, survey_cold_seconds = timed(app.load_survey_data)
+        _, survey_warm_seconds = timed(app.load_survey_data)
+        result['load'] = {
+            'embeddings_seconds': embeddings_seconds,
+            'survey_cold_seconds': survey_cold_seconds,
+            'survey_warm_seconds': survey_warm_seconds,
+        }
+
+        def match(user_embedding):
+            return app.find_best_match(user_embedding, embeddings_data)
+    else:
+        (match, mode), embeddings_seconds = timed(numpy_engine, os.path.join(corpus_dir(size, dims), 'embeddings.npy'))
+        result['load'] = {'embeddings_seconds': embeddings_seconds}
+        result['mode'] = mode
+
+    samples = []
+    best = []
+    started = time.perf_counter()
+    for user_embedding in query_vectors(queries, dims):
+        (match_id, _), seconds = timed(match, user_embedding)
+        samples.append(seconds)
+        best.append(match_id)
+        if time.perf_counter() - started > max_seconds:
+            break
+
+    result.update(match=percentiles(samples), peak_rss_mb=peak_rss_mb(), best_matches=best)
+    return result
+
+
+def skip_reason(size, dims, engine):
+    """Why an engine can't be run on a corpus of this size here, or None"""
+    return embeddings_skip_reason(size, dims) or (app_skip_reason(size, dims) if engine == 'app' else None)
+
+
+def run(sizes, engines, queries, dims=EMBEDDING_DIMS, max_seconds=DEFAULT_MAX_SECONDS, timeout=None, force=False):
+    """Every engine on every corpus size; returns the list of results"""
+    results = []
+    for size in sizes:
+        by_engine = {}
+        for engine in engines:
+            reason = None if force else skip_reason(size, dims, engine)
+            if reason:
+                print(f"[{format_size(size)}] {engine} skipped: {reason}")
+                results.append({'size': size, 'dims': dims, 'engine': engine, 'error': reason})
+                continue
+            if engine == 'app':
+                write_corpus(size, dims)
+            else:
+                write_embeddings(size, dims)
+
+            print(f"[{format_size(size)}] {engine}...")
+            result = run_worker('matching.py', ['--worker', size, '--dims', dims, '--engines', engine,
+                                                '--queries', queries, '--max-seconds', max_seconds], timeout=timeout)
+            result.setdefault('size', size)
+            result.setdefault('dims', dims)
+            result.setdefault('engine', engine)
+            by_engine[engine] = result
+            results.append(result)
+            if 'error' in result:
+                print(f"[{format_size(size)}] {engine}: {result['error']}")
+            else:
+                mode = f" ({result['mode']})" if 'mode' in result else ''
+                print(f"[{format_size(size)}] {engine}{mode}: load {result['load']['embeddings_seconds']:.2f}s, "
+                      f"match p50 {result['match']['p50_ms']:.1f} ms, p99 {result['match']['p99_ms']:.1f} ms, "
+                      f"peak RSS {result['peak_rss_mb']:.0f} MB")
+
+        # Engines must agree on the answer for the queries they all ran
+        answered = [result['best_matches'] for result in by_engine.values() if 'best_matches' in result]
+        if len(answered) > 1:
+            common = min(len(best) for best in answered)
+            agree = all(best[:common] == answered[0][:common] for best in answered)
+            for result in by_engine.values():
+                if 'best_matches' in result:
+                    result['engines_agree'] = agree
+            if not agree:
+                print(f"[{format_size(size)}] WARNING: engines picked different matches")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark matching across corpus sizes and engines")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Corpus sizes, e.g. 1k,100k,1M")
+    parser.add_argument('--engines', default=','.join(ENGINES), help="Engines to run: " + ', '.join(ENGINES))
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES, help="Match queries per engine")
+    parser.add_argument('--dims', type=int, default=EMBEDDING_DIMS, help="Embedding dimensions")
+    parser.add_argument('--max-seconds', type=float, default=DEFAULT_MAX_SECONDS,
+                        help="Stop issuing queries to an engine after this long")
+    parser.add_argument('--force', action='store_true', help="Run the app engine at sizes this machine looks too small for")
+    parser.add_argument('--output', help="Results file (default benchmarks/results/matching-<commit>.json)")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.dims, args.engines, args.queries, args.max_seconds)))
+        return 0
+
+    engines = [engine.strip() for engine in args.engines.split(',')]
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(sorted(unknown))}")
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    results = run(sizes, engines, args.queries, args.dims, args.max_seconds, force=args.force)
+    write_results('matching', results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
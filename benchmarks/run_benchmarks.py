@@ -0,0 +1,103 @@
+"""
+Run the whole benchmark suite and write one results file per commit, or
+compare two results files.
+
+    python benchmarks/run_benchmarks.py                          # cold start, matching (1k,100k,1M), endpoints (1k)
+    python benchmarks/run_benchmarks.py --sizes 1k,10k --endpoint-sizes 1k
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/suite-OLD.json benchmarks/results/suite-NEW.json
+
+Results go to benchmarks/results/suite-<commit>.json. --compare prints
+every numeric measurement the two files share, with the relative change.
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from harness import parse_size, format_size, write_results
+import cold_start
+import matching
+import endpoints
+
+# Printed as identifiers in --compare, not compared
+KEY_FIELDS = ('size', 'dims', 'engine')
+
+
+def flatten(value, prefix=''):
+    """{'matching/1kx1536/app/match/p50_ms': 12.3, ...} for every number in a results tree"""
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}/{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, dict) and 'size' in item:
+                label = '/'.join(format_size(item[key]) if key == 'size' else str(item[key])
+                                 for key in KEY_FIELDS if key in item)
+            else:
+                label = str(i)
+            flat.update(flatten({k: v for k, v in item.items() if k not in KEY_FIELDS}
+                                if isinstance(item, dict) else item, f"{prefix}/{label}" if prefix else label))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix] = value
+    return flat
+
+
+def compare(old_path, new_path):
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{old.get('commit', old_path)} -> {new.get('commit', new_path)}")
+    if old.get('host') != new.get('host'):
+        print(f"WARNING: different machines ({old.get('host')} vs {new.get('host')})")
+
+    old_values = flatten(old.get('results', {}))
+    new_values = flatten(new.get('results', {}))
+    for key in sorted(set(old_values) & set(new_values)):
+        before, after = old_values[key], new_values[key]
+        change = f"{(after - before) / before * 100:+7.1f}%" if before else '      -'
+        print(f"  {key:<64} {before:12.3f} {after:12.3f} {change}")
+    for key in sorted(set(old_values) ^ set(new_values)):
+        print(f"  {key:<64} only in {'old' if key in old_values else 'new'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite or compare two results files")
+    parser.add_argument('--sizes', default=matching.DEFAULT_SIZES, help="Matching corpus sizes")
+    parser.add_argument('--engines', default=','.join(matching.ENGINES), help="Matching engines")
+    parser.add_argument('--queries', type=int, default=matching.DEFAULT_QUERIES, help="Match queries per engine")
+    parser.add_argument('--force', action='store_true', help="Run the app matching engine at sizes this machine looks too small for")
+    parser.add_argument('--endpoint-sizes', default=endpoints.DEFAULT_SIZES, help="Corpus sizes for the endpoint benchmark")
+    parser.add_argument('--requests', type=int, default=endpoints.DEFAULT_REQUESTS, help="Requests per endpoint")
+    parser.add_argument('--runs', type=int, default=5, help="Cold-start runs")
+    parser.add_argument('--skip', default='', help="Benchmarks to skip: cold_start, matching, endpoints")
+    parser.add_argument('--output', help="Results file (default benchmarks/results/suite-<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="Compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    skip = {name.strip() for name in args.skip.split(',') if name.strip()}
+    results = {}
+    if 'cold_start' not in skip:
+        print("=== cold start ===")
+        results['cold_start'] = cold_start.run(args.runs)
+    if 'matching' not in skip:
+        print("=== matching ===")
+        results['matching'] = matching.run([parse_size(size) for size in args.sizes.split(',')],
+                                           [engine.strip() for engine in args.engines.split(',')], args.queries,
+                                           force=args.force)
+    if 'endpoints' not in skip:
+        print("=== endpoints ===")
+        results['endpoints'] = endpoints.run([parse_size(size) for size in args.endpoint_sizes.split(',')], args.requests)
+
+    write_results('suite', results, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,34 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
 import json
-import time
-from openai import OpenAI
-from tqdm import tqdm
+import argparse
 
 # Base directory configuration
 BASE_DIR = os.path.dirname(__file__)
 
+# Shared upstream clients live with the app
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'src'))
+from upstream import enable_rate_limiting, get_openai_client
+from helpers.executor import run_ordered, checkpoint_file
+from helpers.batch_mode import run_batch, parse_answers
+from helpers.completion_cache import complete, get_completion_cache
+from helpers.effort_heuristics import (build_vocabulary, prefilter_respondent, calibrate_thresholds,
+                                       load_thresholds, save_thresholds, THRESHOLDS_PATH)
+
+parser = argparse.ArgumentParser(description="Filter out low-effort survey responses")
+parser.add_argument('--batch', action='store_true', help="Submit all requests as one Batch API job instead of calling per row")
+parser.add_argument('--refresh', action='store_true', help="Ignore cached completions and ask the model again")
+parser.add_argument('--no-prefilter', action='store_true', help="Send every respondent to the model, not just the ambiguous ones")
+parser.add_argument('--calibrate', action='store_true',
+                    help="Send every respondent to the model and fit the local pre-filter's thresholds to its labels")
+args = parser.parse_args()
+get_completion_cache().refresh = args.refresh
+
+# Pace upstream calls from their rate-limit headers instead of fixed sleeps
+enable_rate_limiting()
+
 def load_data():
     """Load the music survey dataset"""
     data_path = os.path.join(BASE_DIR, "../data/raw/music_survey_data.csv")
@@ -33,8 +53,8 @@ df = df.drop(columns='Q17_Video_share_concent')
 # No non-null values (Inuit?) 
 df = df.drop(columns='FirstNation_23_3')
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Shared OpenAI client (pooled connections, retries, circuit breaker)
+client = get_openai_client()
 
 # Fields to check for effort
 EFFORT_FIELDS = {
@@ -44,11 +64,8 @@ EFFORT_FIELDS = {
     'Q19_Lyric_that_stuck_with_you': "What’s one song lyric that stuck with you or changed the way you see the world? Share it and who wrote it!"
 }
 
-def analyze_respondent(row):
-    """
-    Analyze all open-ended responses for a single respondent in ONE API call
-    Returns: dict with overall assessment
-    """
+def effort_request(row):
+    """Chat completion arguments for judging all of one respondent's answers in ONE API call"""
     # Prepare all responses
     responses_text = []
     for field, question in EFFORT_FIELDS.items():
@@ -80,73 +97,120 @@ Respond with ONLY a JSON object with this structure:
   "Q19_Lyric_that_stuck_with_you": {{"is_low_effort": true/false}}
 }}"""
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a survey quality analyst. Respond only with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=400
-        )
-
-        result_text = response.choices[0].message.content.strip()
-        # Remove markdown code blocks if present
-        if result_text.startswith('```'):
-            result_text = result_text.split('```')[1]
-            if result_text.startswith('json'):
-                result_text = result_text[4:]
-            result_text = result_text.strip()
-
-        results = json.loads(result_text)
-
-        # Process results
-        low_effort_count = 0
-        low_effort_fields = []
-
-        for field in EFFORT_FIELDS.keys():
-            field_result = results.get(field, {'is_low_effort': False})
-            if field_result['is_low_effort']:
-                low_effort_count += 1
-                text = row.get(field, '')
-                low_effort_fields.append({
-                    'field': field,
-                    'text': text,
-                })
-
-        # Consider low-effort if 2+ non-Q16 fields are low-effort
-        non_q16_low_effort = sum(1 for f in low_effort_fields if f['field'] != 'Q16_Music_guilty_pleasure_text_OE')
-
-        return {
-            'is_low_effort': non_q16_low_effort >= 2,
-            'low_effort_count': low_effort_count,
-            'low_effort_fields': low_effort_fields
-        }
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a survey quality analyst. Respond only with valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3,
+        "max_tokens": 400
+    }
+
+
+def parse_effort_response(row, result_text):
+    """Overall assessment for a respondent from the model's reply"""
+    result_text = result_text.strip()
+    # Remove markdown code blocks if present
+    if result_text.startswith('```'):
+        result_text = result_text.split('```')[1]
+        if result_text.startswith('json'):
+            result_text = result_text[4:]
+        result_text = result_text.strip()
+
+    results = json.loads(result_text)
+
+    # Process results
+    low_effort_count = 0
+    low_effort_fields = []
+
+    for field in EFFORT_FIELDS.keys():
+        field_result = results.get(field, {'is_low_effort': False})
+        if field_result['is_low_effort']:
+            low_effort_count += 1
+            text = row.get(field, '')
+            low_effort_fields.append({
+                'field': field,
+                'text': text,
+            })
+
+    # Consider low-effort if 2+ non-Q16 fields are low-effort
+    non_q16_low_effort = sum(1 for f in low_effort_fields if f['field'] != 'Q16_Music_guilty_pleasure_text_OE')
+
+    return {
+        'is_low_effort': non_q16_low_effort >= 2,
+        'low_effort_count': low_effort_count,
+        'low_effort_fields': low_effort_fields
+    }
 
-    except Exception as e:
-        print(f"\nError analyzing respondent: {e}")
-        # On error, assume acceptable to be safe
-        return {
-            'is_low_effort': False,
-            'low_effort_count': 0,
-            'low_effort_fields': []
-        }
+
+def analyze_respondent(row):
+    """
+    Analyze all open-ended responses for a single respondent in ONE API call
+    Returns: dict with overall assessment
+    """
+    return complete(client, effort_request(row), lambda text: parse_effort_response(row, text))
+
+
+def respondent_key(row):
+    return str(row.get('participant_id', f'row_{row.name}'))
+
+
+def analysis_failed(row, error):
+    """On error, assume acceptable to be safe (the row is retried on the next run)"""
+    return {
+        'is_low_effort': False,
+        'low_effort_count': 0,
+        'low_effort_fields': [],
+        'failed': True
+    }
 
 
 print("\n" + "="*60)
 print("FILTERING LOW-EFFORT RESPONSES")
 print("="*60)
 
-# Analyze each response
-print("Analyzing response quality using OpenAI...")
-results = []
-
-for idx, row in tqdm(df.iterrows(), total=len(df), desc="Analyzing"):
-    analysis = analyze_respondent(row)
-    analysis['participant_id'] = row.get('participant_id', f'row_{idx}')
-    results.append(analysis)
-    df.at[idx, 'is_low_effort'] = analysis['is_low_effort']
+rows = [row for _, row in df.iterrows()]
+
+# Decide the clear cases locally; only the ambiguous ones need the model
+vocabulary = build_vocabulary(df[list(EFFORT_FIELDS)].values.tolist())
+if args.no_prefilter or args.calibrate:
+    results = [None] * len(rows)
+else:
+    thresholds = load_thresholds()
+    results = [prefilter_respondent(row, EFFORT_FIELDS, vocabulary, thresholds) for row in rows]
+ambiguous = [row for row, result in zip(rows, results) if result is None]
+print(f"Decided locally: {len(rows) - len(ambiguous)}/{len(rows)} respondents")
+
+# Analyze the rest
+print(f"Analyzing {len(ambiguous)} responses using OpenAI...")
+if args.batch:
+    by_key = {respondent_key(row): row for row in ambiguous}
+    answers = run_batch(client, '01_low_effort', {key: effort_request(row) for key, row in by_key.items()}, BASE_DIR,
+                        parse=lambda key, text: parse_effort_response(by_key[key], text))
+    model_results = parse_answers(ambiguous, respondent_key, answers, parse_effort_response, on_error=analysis_failed)
+else:
+    model_results = run_ordered(
+        analyze_respondent,
+        ambiguous,
+        key=respondent_key,
+        checkpoint_path=checkpoint_file(BASE_DIR, '01_low_effort'),
+        on_error=analysis_failed,
+        desc="Analyzing",
+    )
+model_results = iter(model_results)
+results = [result if result is not None else next(model_results) for result in results]
+
+if args.calibrate:
+    thresholds = calibrate_thresholds(rows, results, EFFORT_FIELDS, vocabulary)
+    save_thresholds(thresholds, THRESHOLDS_PATH)
+    print(f"Pre-filter thresholds saved to: {THRESHOLDS_PATH}")
+    for field, limits in thresholds.items():
+        print(f"   {field}: low <= {limits['low']}, high >= {limits['high']} ({limits['labelled']} labelled)")
+
+for row, analysis in zip(rows, results):
+    analysis['participant_id'] = row.get('participant_id', f'row_{row.name}')
+    df.at[row.name, 'is_low_effort'] = analysis['is_low_effort']
 
 # Filter out low-effort responses
 original_count = len(df)
@@ -165,7 +229,8 @@ with open(report_file, 'w', encoding='utf-8') as f:
     f.write("="*80 + "\n\n")
     f.write(f"Total responses analyzed: {original_count}\n")
     f.write(f"Low-effort responses removed: {original_count - len(df)}\n")
-    f.write(f"High-quality responses kept: {len(df)}\n\n")
+    f.write(f"High-quality responses kept: {len(df)}\n")
+    f.write(f"Decided by the local pre-filter: {len(rows) - len(ambiguous)}\n\n")
 
     f.write("ALL LOW-EFFORT RESPONSES\n")
     f.write("-"*80 + "\n\n")
@@ -173,12 +238,14 @@ with open(report_file, 'w', encoding='utf-8') as f:
     low_effort_results = [r for r in results if r['is_low_effort']]
     for idx, result in enumerate(low_effort_results):
         f.write(f"{idx + 1}. Participant ID: {result['participant_id']}\n")
-        f.write(f"   Low-effort fields: {result['low_effort_count']}/{len(EFFORT_FIELDS)}\n")
+        decided_by = 'pre-filter' if result.get('decided_locally') else 'model'
+        f.write(f"   Low-effort fields: {result['low_effort_count']}/{len(EFFORT_FIELDS)} ({decided_by})\n")
         for field_info in result['low_effort_fields']:
             f.write(f"   - {field_info['field']}: \"{field_info['text']}\"\n")
         f.write("\n")
 
 print(f"   Report saved to: {report_file}")
+print(f"   Completion cache: {get_completion_cache().stats()}")
 
 # Save cleaned high-effort data
 output_file = os.path.join(BASE_DIR, "../data/processed/01_music_survey_high_effort.csv")
@@ -1,16 +1,27 @@
 import pandas as pd
-import openai
 import os
+import sys
 from typing import Optional
 from enum import Enum
 import json
-import time
+import argparse
 
 # Base directory configuration
 BASE_DIR = os.path.dirname(__file__)
 
-# Initialize OpenAI client
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Shared upstream clients live with the app
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'src'))
+from upstream import enable_rate_limiting, get_openai_client
+from helpers.executor import run_ordered, checkpoint_file
+from helpers.batch_mode import run_batch, parse_answers
+from helpers.completion_cache import complete, get_completion_cache
+from helpers.genre_classifier import load_genre_classifier, train_genre_classifier, save_genre_classifier
+
+# Pace upstream calls from their rate-limit headers instead of fixed sleeps
+enable_rate_limiting()
+
+# Shared OpenAI client (pooled connections, retries, circuit breaker)
+client = get_openai_client()
 
 class MusicGenre(Enum):
     """Predefined music genres for classification."""
@@ -37,9 +48,10 @@ class MusicGenre(Enum):
 
 # TODO add 'none/all' genre
 
-def extract_genre_and_band(row: pd.Series) -> dict:
+def genre_request(row: pd.Series) -> Optional[dict]:
     """
-    Extract genre and favourite band from survey responses using OpenAI API.
+    Chat completion arguments for extracting genre and favourite band from a
+    respondent's survey responses, or None if they gave nothing to go on.
 
     Fields used:
     - Q3_artist_that_pulled_you_in (open ended)
@@ -68,7 +80,7 @@ def extract_genre_and_band(row: pd.Series) -> dict:
         context_parts.append(f"Memorable lyric: {row['Q19_Lyric_that_stuck_with_you']}")
 
     if not context_parts:
-        return {"genre": None, "favourite_band": None, "confidence": "low"}
+        return None
 
     context = "\n".join(context_parts)
 
@@ -90,45 +102,104 @@ Respond in JSON format with these fields:
 
 Keep your response concise and only return the JSON object."""
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a music analyst who extracts genre and artist preferences from survey data. Always respond with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=150
-        )
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a music analyst who extracts genre and artist preferences from survey data. Always respond with valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3,
+        "max_tokens": 150
+    }
+
+
+def parse_genre_response(row: pd.Series, result_text: str) -> dict:
+    """Genre/band result from the model's reply, with the genre checked against MusicGenre"""
+    result_text = result_text.strip()
+
+    # Parse JSON response
+    # Remove markdown code blocks if present
+    if result_text.startswith("```"):
+        result_text = result_text.split("```")[1]
+        if result_text.startswith("json"):
+            result_text = result_text[4:]
+
+    result = json.loads(result_text.strip())
+
+    # Validate genre against enum
+    if result.get('genre') is not None:
+        genre_lower = result['genre'].lower()
+        valid_genres = [g.value for g in MusicGenre]
+        if genre_lower not in valid_genres:
+            # Try to find closest match or set to "other"
+            result['genre'] = "other"
+            result['confidence'] = "low"
+
+    return result
 
-        result_text = response.choices[0].message.content.strip()
 
-        # Parse JSON response
-        # Remove markdown code blocks if present
-        if result_text.startswith("```"):
-            result_text = result_text.split("```")[1]
-            if result_text.startswith("json"):
-                result_text = result_text[4:]
+def extract_genre_and_band(row: pd.Series) -> dict:
+    """Extract genre and favourite band from survey responses using OpenAI API."""
+    request = genre_request(row)
+    if request is None:
+        return {"genre": None, "favourite_band": None, "confidence": "low"}
+
+    return complete(client, request, lambda text: parse_genre_response(row, text))
+
+
+def extract_genres_batch(rows: list) -> list:
+    """extract_genre_and_band for every row, submitted as one Batch API job"""
+    requests = {}
+    by_id = {}
+    for row in rows:
+        request = genre_request(row)
+        if request is not None:
+            requests[str(row['participant_id'])] = request
+            by_id[str(row['participant_id'])] = row
+
+    answers = run_batch(client, '02_genre_bands', requests, BASE_DIR,
+                        parse=lambda pid, text: parse_genre_response(by_id[pid], text))
+    to_parse = [row for row in rows if str(row['participant_id']) in requests]
+    parsed = iter(parse_answers(to_parse, lambda row: row['participant_id'], answers,
+                                parse_genre_response, on_error=extraction_failed))
+    return [
+        next(parsed) if str(row['participant_id']) in requests
+        else {"genre": None, "favourite_band": None, "confidence": "low"}
+        for row in rows
+    ]
 
-        result = json.loads(result_text.strip())
 
-        # Validate genre against enum
-        if result.get('genre') is not None:
-            genre_lower = result['genre'].lower()
-            valid_genres = [g.value for g in MusicGenre]
-            if genre_lower not in valid_genres:
-                # Try to find closest match or set to "other"
-                result['genre'] = "other"
-                result['confidence'] = "low"
+def extraction_failed(row: pd.Series, error: Exception) -> dict:
+    """Result recorded for a row whose extraction raised (retried on the next run)"""
+    return {"genre": None, "favourite_band": None, "confidence": "error", "error": str(error)}
 
-        return result
 
-    except Exception as e:
-        print(f"Error processing row: {e}")
-        return {"genre": None, "favourite_band": None, "confidence": "error", "error": str(e)}
+def local_classifier(output_path: str, train: bool = False):
+    """
+    The saved genre classifier, or with train set one retrained on the
+    previous output's model-labelled rows. Only --train reads the previous
+    output, so a normal run depends on its input and the saved model alone.
+    """
+    if not train:
+        classifier = load_genre_classifier()
+        if classifier is None:
+            print("No saved genre classifier (run with --train to build one); every row goes to the model")
+        return classifier
+    if not os.path.exists(output_path):
+        print(f"Can't train the local genre classifier: {output_path} doesn't exist yet")
+        return None
+    try:
+        classifier = train_genre_classifier(pd.read_csv(output_path))
+    except ImportError as e:
+        print(f"Can't train the local genre classifier ({e}); every row goes to the model")
+        return None
+    if classifier is not None:
+        save_genre_classifier(classifier)
+    return classifier
 
 
-def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[int] = None):
+def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[int] = None, batch: bool = False,
+                        local: bool = True, train: bool = False):
     """
     Process the music survey data and extract genre/band information.
 
@@ -136,6 +207,9 @@ def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[i
         csv_path: Path to the input CSV file
         output_path: Path to save the output CSV file
         sample_size: If provided, only process this many rows (useful for testing)
+        batch: Submit all requests as one Batch API job instead of calling per row
+        local: Label rows the local classifier is confident about without the model
+        train: Retrain the local classifier on the previous output first
     """
 
     # Load the data
@@ -149,16 +223,28 @@ def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[i
     else:
         print(f"Processing {len(df)} rows")
 
-    # Process each row
-    results = []
-    for idx, row in df.iterrows():
-        print(f"Processing row {idx + 1}/{len(df)}...", end="\r")
+    rows = [row for _, row in df.iterrows()]
 
-        result = extract_genre_and_band(row)
-        results.append(result)
+    # Confident rows are labelled locally; the model only sees the rest
+    classifier = local_classifier(output_path, train) if local else None
+    results = classifier.label(rows) if classifier else [None] * len(rows)
+    pending = [row for row, result in zip(rows, results) if result is None]
+    print(f"Labelled locally: {len(rows) - len(pending)}/{len(rows)} rows")
 
-        # Add small delay to avoid rate limits
-        time.sleep(0.5)
+    if batch:
+        model_results = extract_genres_batch(pending)
+    else:
+        # Process rows concurrently; results come back in row order
+        model_results = run_ordered(
+            extract_genre_and_band,
+            pending,
+            key=lambda row: str(row['participant_id']),
+            checkpoint_path=checkpoint_file(BASE_DIR, '02_genre_bands'),
+            on_error=extraction_failed,
+            desc="Extracting genres",
+        )
+    model_results = iter(model_results)
+    results = [result if result is not None else next(model_results) for result in results]
 
     print("\nProcessing complete!")
 
@@ -166,6 +252,7 @@ def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[i
     df['extracted_genre'] = [r.get('genre') for r in results]
     df['extracted_favourite_band'] = [r.get('favourite_band') for r in results]
     df['extraction_confidence'] = [r.get('confidence') for r in results]
+    df['genre_source'] = [r.get('source', 'model') for r in results]
 
     # Save results
     df.to_csv(output_path, index=False)
@@ -178,11 +265,21 @@ def process_survey_data(csv_path: str, output_path: str, sample_size: Optional[i
     print(f"Bands extracted: {df['extracted_favourite_band'].notna().sum()}")
     print(f"\nConfidence distribution:")
     print(df['extraction_confidence'].value_counts())
+    print(f"\nLabelled by: {df['genre_source'].value_counts().to_dict()}")
+    print(f"Completion cache: {get_completion_cache().stats()}")
 
     return df
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract favourite genre and band for each respondent")
+    parser.add_argument('--batch', action='store_true', help="Submit all requests as one Batch API job instead of calling per row")
+    parser.add_argument('--refresh', action='store_true', help="Ignore cached completions and ask the model again")
+    parser.add_argument('--no-local', action='store_true', help="Send every row to the model instead of labelling confident ones locally")
+    parser.add_argument('--train', action='store_true', help="Retrain the local genre classifier on the previous output first")
+    args = parser.parse_args()
+    get_completion_cache().refresh = args.refresh
+
     # File paths
     input_csv = os.path.join(BASE_DIR, "../data/processed/01_music_survey_high_effort.csv")
     output_csv = os.path.join(BASE_DIR, "../data/processed/02_music_survey_with_genres.csv")
@@ -191,7 +288,8 @@ if __name__ == "__main__":
     SAMPLE_SIZE = None
 
     # Process the data
-    df_result = process_survey_data(input_csv, output_csv, sample_size=SAMPLE_SIZE)
+    df_result = process_survey_data(input_csv, output_csv, sample_size=SAMPLE_SIZE, batch=args.batch,
+                                    local=not args.no_local, train=args.train)
 
     # Display some examples
     print("\n--- Sample Results ---")
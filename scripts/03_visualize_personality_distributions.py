@@ -2,6 +2,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import sys
+import argparse
 
 # Base directory configuration
 BASE_DIR = os.path.dirname(__file__)
@@ -9,56 +10,46 @@ BASE_DIR = os.path.dirname(__file__)
 # Add helpers to path
 sys.path.insert(0, os.path.join(BASE_DIR, 'helpers'))
 from generate_image_prompt import (
-    calculate_ai_spectrum,
-    calculate_intensity,
-    calculate_sociality,
+    score_personalities,
+    check_batch_scores,
     AISpectrumLevel,
     IntensityLevel,
     SocialityLevel
 )
 
+# Published survey data, which carries the stored dimension columns
+# (08_score_personality_dimensions.py)
+INPUT_CSV = os.path.join(BASE_DIR, "../src/static/data/survey_data.csv")
+DIMENSION_COLUMNS = ['ai_level', 'ai_score', 'intensity_level', 'intensity_score', 'sociality_level', 'sociality_score']
+
 def calculate_all_scores(sample_size=None):
     """Calculate personality scores for all survey respondents"""
 
     # Load the processed survey data
-    input_csv = os.path.join(BASE_DIR, "../data/processed/04_music_survey_with_artist_urls.csv")
-
-    print(f"Loading data from {input_csv}...")
-    df = pd.read_csv(input_csv)
+    print(f"Loading data from {INPUT_CSV}...")
+    df = pd.read_csv(INPUT_CSV)
 
     if sample_size:
         df = df.sample(n=min(sample_size, len(df)))
 
-    print(f"Calculating personality scores for {len(df)} respondents...")
-
-    results = []
+    if all(column in df.columns for column in DIMENSION_COLUMNS):
+        print(f"Using stored personality scores for {len(df)} respondents...")
+        scores = df[DIMENSION_COLUMNS].copy()
+    else:
+        print(f"Calculating personality scores for {len(df)} respondents...")
+        # Score every row at once with column operations (see check_batch_scores)
+        scores = score_personalities(df)
+    scores.insert(0, 'participant_id', df['participant_id'])
 
-    for idx, (_, row) in enumerate(df.iterrows(), 1):
-        if idx % 100 == 0:
-            print(f"Processing {idx}/{len(df)}...", end="\r")
+    # Rows the AI scorer can't place (unrecognised answers) are left out
+    skipped = scores['ai_level'].isna()
+    for participant_id in scores.loc[skipped, 'participant_id']:
+        print(f"Error processing participant {participant_id}: unrecognised AI answers")
+    results = scores[~skipped].reset_index(drop=True)
 
-        try:
-            # Calculate all dimensions
-            ai_level, ai_score = calculate_ai_spectrum(row)
-            intensity_level, intensity_score = calculate_intensity(row)
-            sociality_level, sociality_score = calculate_sociality(row)
+    print(f"✓ Processed {len(results)} respondents")
 
-            results.append({
-                'participant_id': row['participant_id'],
-                'ai_level': ai_level.name,
-                'ai_score': ai_score,
-                'intensity_level': intensity_level.name,
-                'intensity_score': intensity_score,
-                'sociality_level': sociality_level.name,
-                'sociality_score': sociality_score
-            })
-        except Exception as e:
-            print(f"\nError processing participant {row['participant_id']}: {e}")
-            continue
-
-    print(f"\n✓ Processed {len(results)} respondents")
-
-    return pd.DataFrame(results)
+    return results
 
 
 def plot_personality_distributions(df):
@@ -230,6 +221,19 @@ def print_distribution_stats(df):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score and plot the personality dimensions")
+    parser.add_argument('--check', action='store_true',
+                        help="Verify the vectorised scores equal the per-row scorers on every row, then exit")
+    args = parser.parse_args()
+
+    if args.check:
+        survey = pd.read_csv(INPUT_CSV)
+        mismatches = check_batch_scores(survey)
+        for index, dimension, expected, actual in mismatches[:20]:
+            print(f"Row {index} {dimension}: per-row {expected}, vectorised {actual}")
+        print(f"{len(survey)} rows checked, {len(mismatches)} mismatches")
+        sys.exit(1 if mismatches else 0)
+
     # Calculate scores for all respondents (or set sample_size for subset)
     SAMPLE_SIZE = None  # Set to None for all data, or a number for sample
 
@@ -1,48 +1,121 @@
 import os
-import csv
 import json
+import argparse
 import numpy as np
 import pandas as pd
-from openai import OpenAI
 from tqdm import tqdm
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 # Base directory configuration
 BASE_DIR = os.path.dirname(__file__)
 
-from helpers.identity_string_utils import create_survey_identity_string
+from helpers.identity_string_utils import create_survey_identity_strings, check_identity_strings
+from helpers.executor import pipeline_concurrency
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Shared upstream clients live with the app
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'src'))
+from upstream import enable_rate_limiting, get_openai_client
 
-def get_embedding(text):
-    """Get OpenAI embedding for text"""
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Per-request limits of the embeddings endpoint
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+# Leave headroom under the token limit when counts are estimated
+TOKEN_BUDGET_PER_REQUEST = int(MAX_TOKENS_PER_REQUEST * 0.9)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+except Exception:
+    # Without tiktoken, ~3 characters per token over-counts and keeps us under the limit
+    _encoding = None
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 3 + 1
+
+
+def chunk_inputs(texts):
+    """
+    Split texts into request-sized chunks of indices, respecting both the
+    input count and the total token limit per request
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if current and (len(current) >= MAX_INPUTS_PER_REQUEST or current_tokens + tokens > TOKEN_BUDGET_PER_REQUEST):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def embed_chunk(client, texts):
+    """Embed a list of texts in one request, returned in input order"""
     response = client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
+        input=texts,
+        model=EMBEDDING_MODEL
     )
-    return response.data[0].embedding
+    embeddings = [None] * len(texts)
+    for item in response.data:
+        embeddings[item.index] = item.embedding
+    return embeddings
+
+
+def get_embeddings(client, texts):
+    """Get OpenAI embeddings for many texts: chunked multi-input requests, issued concurrently"""
+    chunks = chunk_inputs(texts)
+    print(f"Embedding {len(texts)} texts in {len(chunks)} requests...")
+
+    embeddings = [None] * len(texts)
+    with ThreadPoolExecutor(max_workers=pipeline_concurrency()) as executor:
+        chunk_results = executor.map(
+            lambda chunk_texts: embed_chunk(client, chunk_texts),
+            [[texts[i] for i in chunk] for chunk in chunks]
+        )
+        for chunk, chunk_embeddings in tqdm(zip(chunks, chunk_results), total=len(chunks), desc="Generating embeddings"):
+            for i, embedding in zip(chunk, chunk_embeddings):
+                embeddings[i] = embedding
+    return embeddings
+
+SURVEY_FILE = os.path.join(BASE_DIR, "../data/processed/02_music_survey_with_genres.csv")
+
+def load_survey():
+    """
+    The survey as strings, blanks kept as "" rather than NaN, exactly as
+    csv.DictReader (which this stage used before) reads it, so the identity
+    strings and hence the embeddings don't change
+    """
+    return pd.read_csv(SURVEY_FILE, dtype=str, keep_default_na=False)
 
 def generate_survey_embeddings():
     """Generate embeddings for all survey rows and save to disk"""
-    survey_file = os.path.join(BASE_DIR, "../data/processed/02_music_survey_with_genres.csv")
     output_file = os.path.join(BASE_DIR, "../data/processed/survey_embeddings.json")
 
     print("Loading survey data...")
-    with open(survey_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    df = load_survey()
+    rows = df.to_dict('records')
 
     print(f"Generating embeddings for {len(rows)} survey responses...")
 
-    embeddings_data = []
+    # All identity strings at once, column-wise
+    survey_texts = create_survey_identity_strings(df).tolist()
+    # Created here rather than at import, so --check runs without an API key
+    enable_rate_limiting()
+    client = get_openai_client()
+    embeddings = get_embeddings(client, survey_texts)
 
-    for row in tqdm(rows, desc="Generating embeddings"):
-        # Convert dict row to pandas Series for the function
-        row_series = pd.Series(row)
-        survey_text = create_survey_identity_string(row_series)
-        embedding = get_embedding(survey_text)
+    embeddings_data = []
 
+    for row, embedding in zip(rows, embeddings):
         embeddings_data.append({
             'participant_id': row['participant_id'],
             'embedding': embedding,
@@ -71,4 +144,15 @@ def generate_survey_embeddings():
     print(f"File size: {os.path.getsize(output_file) / 1024 / 1024:.2f} MB")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed every survey respondent's identity string")
+    parser.add_argument('--check', action='store_true',
+                        help="Verify the column-wise identity strings equal the per-row function on every row, then exit")
+    args = parser.parse_args()
+
+    if args.check:
+        survey = load_survey()
+        mismatches = check_identity_strings(survey)
+        print(f"{len(survey)} rows checked, {len(mismatches)} identity strings differ")
+        sys.exit(1 if mismatches else 0)
+
     generate_survey_embeddings()
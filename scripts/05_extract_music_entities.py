@@ -1,13 +1,29 @@
 import pandas as pd
 import os
-from openai import OpenAI
+import sys
 import json
-import requests
 import time
 import re
+import argparse
+import threading
 
+SCRIPT_DIR = os.path.dirname(__file__)
 
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Shared upstream clients live with the app
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', 'src'))
+from upstream import enable_rate_limiting, get_openai_client
+from helpers.executor import (
+    run_ordered, checkpoint_file, load_checkpoint, append_checkpoint, clear_checkpoint, materialize_csv
+)
+from helpers.batch_mode import run_batch
+from helpers.completion_cache import complete, get_completion_cache
+from helpers.spotify import get_spotify_resolver
+
+# Pace upstream calls from their rate-limit headers instead of fixed sleeps
+enable_rate_limiting()
+
+# Shared OpenAI client (pooled connections, retries, circuit breaker)
+client = get_openai_client()
 
 def validate_extracted_entities(original_text, entities_json):
     """
@@ -96,69 +112,16 @@ def validate_extracted_entities(original_text, entities_json):
 
     return len(errors) == 0, errors
 
-# Spotify API setup
-SPOTIFY_CLIENT_ID = os.getenv('SPOTIFY_CLIENT_ID')
-SPOTIFY_CLIENT_SECRET = os.getenv('SPOTIFY_CLIENT_SECRET')
-
-def get_spotify_token():
-    """Get Spotify access token"""
-    try:
-        auth_response = requests.post('https://accounts.spotify.com/api/token', {
-            'grant_type': 'client_credentials',
-            'client_id': SPOTIFY_CLIENT_ID,
-            'client_secret': SPOTIFY_CLIENT_SECRET,
-        })
-        auth_response.raise_for_status()
-        auth_data = auth_response.json()
-        return auth_data.get('access_token')
-    except Exception as e:
-        print(f"Error getting Spotify token: {e}")
-        return None
-
 def search_spotify(query, search_type='track'):
-    """Search Spotify for a track, artist, or album"""
-    token = get_spotify_token()
-    if not token:
-        return None
-
-    headers = {'Authorization': f'Bearer {token}'}
-
-    params = {
-        'q': query,
-        'type': search_type,
-        'limit': 1
-    }
-
+    """Search Spotify for a track, artist, or album (cached, see helpers/spotify.py)"""
     try:
-        response = requests.get('https://api.spotify.com/v1/search', headers=headers, params=params)
-
-        if response.status_code == 200:
-            data = response.json()
-            if search_type == 'track' and data.get('tracks', {}).get('items'):
-                item = data['tracks']['items'][0]
-                return {
-                    'name': item['name'],
-                    'artist': item['artists'][0]['name'],
-                    'url': item['external_urls']['spotify'],
-                    'type': 'track'
-                }
-            elif search_type == 'artist' and data.get('artists', {}).get('items'):
-                item = data['artists']['items'][0]
-                return {
-                    'name': item['name'],
-                    'url': item['external_urls']['spotify'],
-                    'type': 'artist'
-                }
+        return get_spotify_resolver().search(query, search_type)
     except Exception as e:
         print(f"Error searching Spotify: {e}")
-
     return None
 
-def extract_music_entities(text, question_context):
-    """Use OpenAI to extract music entities by inline annotation"""
-    if pd.isna(text) or not text.strip():
-        return None
-
+def entity_request(text, question_context):
+    """Chat completion arguments for annotating music entities inline"""
     prompt = f"""Add inline music entity annotations to this survey response.
 
 Question: {question_context}
@@ -198,17 +161,19 @@ Cant thing of any
 
 Now annotate this text: {text}"""
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
             {"role": "system", "content": "You are a music entity annotation expert. Return the annotated text."},
             {"role": "user", "content": prompt}
         ],
-        # temperature=0.3,
-        max_tokens=800
-    )
+        # "temperature": 0.3,
+        "max_tokens": 800
+    }
 
-    annotated_text = response.choices[0].message.content.strip()
+def parse_annotated_text(annotated_text):
+    """Entities from the model's annotated text"""
+    annotated_text = annotated_text.strip()
 
     # Parse the inline annotations
     pattern = r'\|\|(\{[^}]+\})([^|]+)\|\|'
@@ -228,8 +193,288 @@ Now annotate this text: {text}"""
         'entities': entities
     }
 
+# Structured mode: the model returns spans under a JSON schema and the
+# annotated text is rebuilt locally, so it can never drift from the original
+ENTITY_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "text": {"type": "string"},
+        "start": {"type": "integer"},
+        "type": {"type": "string", "enum": ["song", "artist", "album"]},
+        "name": {"type": "string"},
+        "artist": {"type": ["string", "null"]}
+    },
+    "required": ["text", "start", "type", "name", "artist"],
+    "additionalProperties": False
+}
+
+ENTITY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "entities": {"type": "array", "items": ENTITY_ITEM_SCHEMA}
+    },
+    "required": ["entities"],
+    "additionalProperties": False
+}
+
+ENTITY_INSTRUCTIONS = """For each entity return:
+- "text": the exact characters from the response that mention it (preserve typos, spacing, capitalization)
+- "start": the character offset where that text starts in the response (0-based)
+- "type": "song", "artist" or "album"
+- "name": the CORRECT, properly spelled name (for Spotify search), e.g. L'il nas x → Lil Nas X
+- "artist": for songs and albums the correct artist if known, otherwise null
+
+Rules:
+- Only include entities you're confident about
+- Don't return overlapping or duplicate spans
+- If there are no music entities return an empty list
+
+Example:
+Response: my favourite song is probably Sleepwalking by Bring Me The Horizon
+Entities: [{"text": "Sleepwalking", "start": 30, "type": "song", "name": "Sleepwalking", "artist": "Bring Me The Horizon"}, {"text": "Bring Me The Horizon", "start": 46, "type": "artist", "name": "Bring Me The Horizon", "artist": null}]"""
+
+def structured_entity_request(text, question_context):
+    """Chat completion arguments for extracting music entities as spans of the original text"""
+    prompt = f"""Find the songs, artists, and albums mentioned in this survey response.
+
+Question: {question_context}
+Response: {text}
+
+{ENTITY_INSTRUCTIONS}"""
+
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a music entity annotation expert."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 800,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "music_entities", "strict": True, "schema": ENTITY_SCHEMA}
+        }
+    }
+
+def locate_span(text, quote, start):
+    """(start, end) of quote in text, preferring the model's offset; None if it isn't there"""
+    if not quote:
+        return None
+    if text[start:start + len(quote)] == quote:
+        return start, start + len(quote)
+    positions = [m.start() for m in re.finditer(re.escape(quote), text)]
+    if not positions:
+        return None
+    nearest = min(positions, key=lambda p: abs(p - start))
+    return nearest, nearest + len(quote)
+
+def _marker_value(value):
+    # The inline marker syntax can't contain these inside metadata
+    return re.sub(r'[{}|]', '', value)
+
+def build_annotation(text, spans):
+    """
+    Rebuild the inline-marker annotation from (start, end, entity) spans over
+    the original text, in the same shape parse_annotated_text() returns.
+    Overlapping spans and spans containing '|' are dropped.
+    """
+    pieces = []
+    entities = []
+    position = 0
+    for start, end, entity in sorted(spans, key=lambda span: span[0]):
+        matched_text = text[start:end]
+        if start < position or '|' in matched_text:
+            record_stat('dropped_spans')
+            continue
+        metadata = {'type': entity['type'], 'name': _marker_value(entity['name'])}
+        if entity.get('artist'):
+            metadata['artist'] = _marker_value(entity['artist'])
+        pieces.append(text[position:start])
+        pieces.append(f"||{json.dumps(metadata, ensure_ascii=False)}{matched_text}||")
+        entities.append(dict(metadata, matched_text=matched_text))
+        position = end
+    pieces.append(text[position:])
+
+    return {
+        'annotated_text': ''.join(pieces),
+        'entities': entities
+    }
+
+def annotation_from_spans(text, entity_list):
+    """Locate the model's spans in text and rebuild the annotation from them"""
+    spans = []
+    for entity in entity_list:
+        span = locate_span(text, entity.get('text'), entity.get('start') or 0)
+        if span is None:
+            record_stat('dropped_spans')
+            continue
+        spans.append((span[0], span[1], entity))
+    return build_annotation(text, spans)
+
+def parse_structured_entities(text, content):
+    """Annotation for text from the model's JSON span list"""
+    return annotation_from_spans(text, json.loads(content).get('entities', []))
+
+def respondent_entity_request(fields):
+    """
+    Chat completion arguments for extracting entities from all of one
+    respondent's answers in a single call. fields: [(question, text)];
+    the reply has one span list per question column.
+    """
+    responses = "\n\n".join(
+        f"{q['column']}\nQuestion: {q['question']}\nResponse: {text}" for q, text in fields
+    )
+    prompt = f"""Find the songs, artists, and albums mentioned in each of these survey responses from one person.
+
+{responses}
+
+Return the entities of each response under its field name; "start" offsets are within that response.
+
+{ENTITY_INSTRUCTIONS}"""
+
+    schema = {
+        "type": "object",
+        "properties": {q['column']: {"type": "array", "items": ENTITY_ITEM_SCHEMA} for q, _ in fields},
+        "required": [q['column'] for q, _ in fields],
+        "additionalProperties": False
+    }
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a music entity annotation expert."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": 800 * len(fields),
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "respondent_music_entities", "strict": True, "schema": schema}
+        }
+    }
+
+def parse_respondent_reply(fields, content):
+    """Span lists by column from a respondent reply; ValueError if it doesn't match the schema"""
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+    for q, _ in fields:
+        if not isinstance(data.get(q['column']), list):
+            raise ValueError(f"reply has no span list for {q['column']}")
+    return data
+
+def split_respondent_entities(fields, data):
+    """
+    Per-column results from a parsed respondent reply: the entity JSON to
+    store for each answer that validates, None for the rest (retried per question)
+    """
+    results = {}
+    for q, text in fields:
+        entities = annotation_from_spans(text, data.get(q['column']) or [])
+        if q['column'] in data and validate_extracted_entities(text, json.dumps(entities))[0]:
+            record_stat('answers')
+            results[q['new_column']] = json.dumps(add_spotify_links(entities))
+        else:
+            record_stat('validation_failures')
+            results[q['new_column']] = None
+    return results
+
+def extract_respondent_entities(fields, refresh=False):
+    """
+    One LLM call for all of a respondent's open-ended answers. A reply that
+    doesn't parse is never cached; it is asked for once more, then the
+    answers are left to the per-question pass.
+    """
+    request = respondent_entity_request(fields)
+    for attempt in range(2):
+        try:
+            data = complete(client, request, lambda content: parse_respondent_reply(fields, content),
+                            refresh or attempt > 0, on_call=lambda: record_stat('llm_calls'))
+            return split_respondent_entities(fields, data)
+        except ValueError as e:
+            print(f"Respondent reply attempt {attempt + 1} returned invalid JSON: {e}")
+    return split_respondent_entities(fields, {})
+
+def extract_respondents(df, questions, batch=False, refresh=False):
+    """
+    Per-respondent pass: fill every question column that is still empty with
+    one call per respondent. Answers it couldn't validate stay empty and are
+    picked up by the per-question pass that follows.
+    """
+    for q in questions:
+        if q['new_column'] not in df.columns:
+            df[q['new_column']] = None
+
+    pending = []
+    for idx, row in df.iterrows():
+        fields = [
+            (q, row[q['column']]) for q in questions
+            if pd.isna(df.at[idx, q['new_column']])
+            and pd.notna(row[q['column']]) and str(row[q['column']]).strip()
+        ]
+        if fields:
+            pending.append((idx, row['participant_id'], fields))
+
+    print(f"\nProcessing {len(pending)} respondents (all questions per call)")
+    journal = checkpoint_file(SCRIPT_DIR, "03_respondents")
+    if batch:
+        def run(todo):
+            requests = {str(pid): respondent_entity_request(fields) for _, pid, fields in todo}
+            fields_by_pid = {str(pid): fields for _, pid, fields in todo}
+            answers = run_batch(client, "03_respondents", requests, SCRIPT_DIR,
+                                parse=lambda pid, content: parse_respondent_reply(fields_by_pid[pid], content),
+                                on_call=lambda count: record_stat('llm_calls', count))
+            results = []
+            for _, pid, fields in todo:
+                try:
+                    data = parse_respondent_reply(fields, answers.get(str(pid)) or '')
+                except ValueError:
+                    data = {}
+                results.append(split_respondent_entities(fields, data))
+            return results
+        results = journaled_batch(journal, pending, run)
+    else:
+        results = run_ordered(
+            lambda item: extract_respondent_entities(item[2], refresh),
+            pending,
+            key=lambda item: str(item[1]),
+            checkpoint_path=journal,
+            desc="Respondents",
+            keep_checkpoint=True,
+        )
+
+    for (idx, _, _), columns in zip(pending, results):
+        for column, entities_json in (columns or {}).items():
+            df.at[idx, column] = entities_json
+
+# How each extraction mode builds its request and parses the reply
+ENTITY_MODES = {
+    'structured': (structured_entity_request, parse_structured_entities),
+    'inline': (entity_request, lambda text, content: parse_annotated_text(content)),
+}
+
+# Per-run counters, printed at the end to show how often validation retries happen
+extraction_stats = {'answers': 0, 'llm_calls': 0, 'validation_failures': 0, 'dropped_spans': 0}
+_stats_lock = threading.Lock()
+
+def record_stat(name, count=1):
+    with _stats_lock:
+        extraction_stats[name] += count
+
+def extract_music_entities(text, question_context, mode='structured', refresh=False):
+    """
+    Use OpenAI to extract music entities (structured spans, or inline annotation).
+    refresh=True skips the cached reply, for retries after it failed validation.
+    """
+    if pd.isna(text) or not text.strip():
+        return None
+
+    build_request, parse_reply = ENTITY_MODES[mode]
+    return complete(client, build_request(text, question_context), lambda content: parse_reply(text, content), refresh,
+                    on_call=lambda: record_stat('llm_calls'))
+
 def add_spotify_links(entities):
-    """Add Spotify links to extracted entities"""
+    """
+    Add Spotify links to extracted songs. Artists are linked once per
+    canonical artist by the catalog stage (06_build_artist_catalog.py).
+    """
     if not entities or 'entities' not in entities:
         return entities
 
@@ -243,22 +488,122 @@ def add_spotify_links(entities):
                 entity['spotify_url'] = spotify_result['url']
                 entity['spotify_match'] = spotify_result['name']
 
-        elif entity['type'] == 'artist':
-            spotify_result = search_spotify(entity['name'], 'artist')
-            if spotify_result:
-                entity['spotify_url'] = spotify_result['url']
-                entity['spotify_match'] = spotify_result['name']
-
-        time.sleep(0.1)  # Rate limiting
 
     return entities
 
-def process_survey_data(questions, test_rows=None, ):
+def extract_validated_entities(idx, text, question_context, mode='structured'):
+    """
+    Extract entities for one answer, retrying until the annotation validates,
+    then add Spotify links. Returns the JSON to store, or None.
+    """
+    max_retries = 10
+    entities = None
+    record_stat('answers')
+
+    for attempt in range(max_retries):
+        try:
+            entities = extract_music_entities(text, question_context, mode, refresh=attempt > 0)
+        except ValueError as e:
+            # Unparseable reply (rare with a strict schema): retry like a validation failure
+            record_stat('validation_failures')
+            print(f"Row {idx} attempt {attempt+1} returned invalid JSON: {e}")
+            entities = None
+            continue
+
+        if entities:
+            entities_json = json.dumps(entities)
+            is_valid, errors = validate_extracted_entities(text, entities_json)
+
+            if is_valid:
+                # Add Spotify links
+                entities = add_spotify_links(entities)
+                break
+            else:
+                record_stat('validation_failures')
+                print(f"Row {idx} attempt {attempt+1} validation failed: {errors}")
+                if attempt < max_retries - 1:
+                    time.sleep(0.1)  # Brief pause before retry
+                else:
+                    print(f"Row {idx} failed validation after {max_retries} attempts, skipping")
+                    # entities = None
+        else:
+            break
+
+    return json.dumps(entities) if entities else None
+
+def journaled_batch(journal, pending, run):
+    """
+    Batch-mode counterpart of run_ordered()'s journal for (idx, participant_id, ...)
+    items: rows already in the journal are replayed, run(todo) handles the
+    rest and its non-empty results are appended. Returns results in order.
+    """
+    done = load_checkpoint(journal)
+    todo = [item for item in pending if str(item[1]) not in done]
+    fresh = [
+        (str(item[1]), result) for item, result in zip(todo, run(todo) if todo else [])
+        if result is not None
+    ]
+    append_checkpoint(journal, fresh)
+    done.update(fresh)
+    return [done.get(str(item[1])) for item in pending]
+
+def extract_entities_batch(pending, q, mode='structured'):
+    """
+    Batch API version of extract_validated_entities over (idx, participant_id, text)
+    items. Answers that fail validation are retried synchronously.
+    """
+    build_request, parse_reply = ENTITY_MODES[mode]
+    requests = {str(pid): build_request(text, q['question']) for _, pid, text in pending}
+    texts = {str(pid): text for _, pid, text in pending}
+
+    def parse_valid(pid, content):
+        # Only answers that validate are cached; the rest are retried below
+        entities = parse_reply(texts[pid], content)
+        is_valid, errors = validate_extracted_entities(texts[pid], json.dumps(entities))
+        if not is_valid:
+            raise ValueError(f"validation failed: {errors}")
+        return entities
+
+    answers = run_batch(client, f"03_{q['new_column']}", requests, SCRIPT_DIR, parse=parse_valid,
+                        on_call=lambda count: record_stat('llm_calls', count))
+
+    results = []
+    retry = []
+    for i, (idx, pid, text) in enumerate(pending):
+        answer = answers.get(str(pid))
+        try:
+            entities = parse_reply(text, answer) if answer is not None else None
+        except ValueError:
+            entities = None
+        if entities and validate_extracted_entities(text, json.dumps(entities))[0]:
+            record_stat('answers')
+            results.append(json.dumps(add_spotify_links(entities)))
+        else:
+            record_stat('validation_failures')
+            results.append(None)
+            retry.append(i)
+
+    if retry:
+        print(f"Retrying {len(retry)} answers without the batch")
+        retried = run_ordered(
+            lambda i: extract_validated_entities(pending[i][0], pending[i][2], q['question'], mode),
+            retry,
+            desc=q['column'],
+        )
+        for i, entities_json in zip(retry, retried):
+            results[i] = entities_json
+    return results
+
+def process_survey_data(questions, test_rows=None, batch=False, mode='structured', per_respondent=False, refresh=False):
     """
     Process the survey CSV and extract music entities
 
     Args:
         test_rows: Optional int to limit processing to first N rows for testing
+        batch: Submit each question's requests as one Batch API job
+        mode: 'structured' (JSON spans, annotation rebuilt locally) or 'inline' (model writes the markers)
+        per_respondent: First annotate all of a respondent's answers in one call (structured only)
+        refresh: Ask the model again instead of replaying cached replies
     """
 
     # Read the survey data
@@ -271,16 +616,33 @@ def process_survey_data(questions, test_rows=None, ):
 
     output_path = 'data/processed/03_music_survey_with_extracted_entities.csv'
 
-    # Check if we have partial progress to resume from
+    # Reuse the previous output's entities, matched by participant (stage 02
+    # reorders rows) and only where the answer itself hasn't changed
     if os.path.exists(output_path):
         print(f"Found existing output file. Loading progress...")
         existing_df = pd.read_csv(output_path)
-        for q in questions:
-            if q['new_column'] in existing_df.columns:
-                df[q['new_column']] = existing_df[q['new_column']]
-                print(f"  Loaded existing data for {q['column']}")
-
+        if 'participant_id' in existing_df.columns:
+            existing_df = existing_df.drop_duplicates('participant_id').set_index('participant_id')
+            for q in questions:
+                if q['new_column'] not in existing_df.columns:
+                    continue
+                previous = df['participant_id'].map(existing_df[q['new_column']])
+                if q['column'] in existing_df.columns:
+                    previous_answer = df['participant_id'].map(existing_df[q['column']])
+                    previous = previous.where(previous_answer.fillna('').astype(str) == df[q['column']].fillna('').astype(str))
+                df[q['new_column']] = previous
+                print(f"  Loaded existing data for {q['column']} ({previous.notna().sum()} answers)")
+
+    # Every finished answer is appended to a journal under
+    # data/processed/.checkpoints/ as it completes; the CSV is written once
+    # at the end, so an interrupted run resumes from the journal
+    journals = [checkpoint_file(SCRIPT_DIR, "03_respondents")] + [
+        checkpoint_file(SCRIPT_DIR, f"03_{q['new_column']}") for q in questions
+    ]
     try:
+        if per_respondent:
+            extract_respondents(df, questions, batch, refresh)
+
         for q in questions:
             # Skip if already completed
             if q['new_column'] in df.columns and df[q['new_column']].notna().all():
@@ -293,80 +655,49 @@ def process_survey_data(questions, test_rows=None, ):
             if q['new_column'] not in df.columns:
                 df[q['new_column']] = None
 
+            # Rows still to do; blank answers have nothing to extract
+            pending = []
             for idx, row in df.iterrows():
-                # Skip if already processed
                 if pd.notna(df.at[idx, q['new_column']]):
-                    # print(f"\nRow {idx} already completed, skipping...")
                     continue
-
                 text = row[q['column']]
-
                 if pd.isna(text) or not str(text).strip():
                     df.at[idx, q['new_column']] = None
                     continue
-
-                if pd.notna(text) and text.strip():
-                    print(f"\nProcessing row {idx}")
-                    try:
-                        # Extract entities with retry on validation failure
-                        max_retries = 10
-                        entities = None
-
-                        for attempt in range(max_retries):
-                            entities = extract_music_entities(text, q['question'])
-
-                            if entities:
-                                entities_json = json.dumps(entities)
-                                is_valid, errors = validate_extracted_entities(text, entities_json)
-
-                                if is_valid:
-                                    # Add Spotify links
-                                    entities = add_spotify_links(entities)
-                                    break
-                                else:
-                                    print(f"Row {idx} attempt {attempt+1} validation failed: {errors}")
-                                    if attempt < max_retries - 1:
-                                        time.sleep(0.1)  # Brief pause before retry
-                                    else:
-                                        print(f"Row {idx} failed validation after {max_retries} attempts, skipping")
-                                        # entities = None
-                            else:
-                                break
-
-                        df.at[idx, q['new_column']] = json.dumps(entities) if entities else None
-                    except Exception as e:
-                        print(f"Error processing row {idx}: {e}")
-                        df.at[idx, q['new_column']] = None
-                else:
-                    df.at[idx, q['new_column']] = None
-
-                if (idx + 1) % 10 == 0:
-                    print(f"Processed {idx + 1}/{len(df)} rows")
-                    # Save checkpoint every 10 rows
-                    df.to_csv(output_path, index=False)
-
-                time.sleep(0.1)  # Rate limiting for OpenAI
-
-            # Save after each question
-            df.to_csv(output_path, index=False)
-            print(f"Saved checkpoint for {q['column']}")
+                pending.append((idx, row['participant_id'], text))
+
+            journal = checkpoint_file(SCRIPT_DIR, f"03_{q['new_column']}")
+            if batch:
+                results = journaled_batch(journal, pending, lambda todo: extract_entities_batch(todo, q, mode))
+            else:
+                results = run_ordered(
+                    lambda item: extract_validated_entities(item[0], item[2], q['question'], mode),
+                    pending,
+                    key=lambda item: str(item[1]),
+                    checkpoint_path=journal,
+                    desc=q['column'],
+                    keep_checkpoint=True,
+                )
+            for (idx, _, _), entities_json in zip(pending, results):
+                df.at[idx, q['new_column']] = entities_json
 
     except KeyboardInterrupt:
-        print("\n\nInterrupted! Saving progress...")
-        df.to_csv(output_path, index=False)
-        print(f"Progress saved to: {output_path}")
+        print("\n\nInterrupted! Completed answers are journaled under data/processed/.checkpoints/")
         print("Run script again to resume from where you left off.")
         raise
-    except Exception as e:
-        print(f"\n\nError occurred: {e}")
-        print("Saving progress...")
-        df.to_csv(output_path, index=False)
-        print(f"Progress saved to: {output_path}")
-        raise
 
-    # Final save
-    df.to_csv(output_path, index=False)
+    # Materialise the output once, then drop the journals it now contains
+    materialize_csv(df, output_path)
+    for journal in journals:
+        clear_checkpoint(journal)
     print(f"\nCompleted! Results saved to: {output_path}")
+    print(f"Spotify lookups: {get_spotify_resolver().stats()}")
+    print(f"Completion cache: {get_completion_cache().stats()}")
+
+    retry_rate = extraction_stats['validation_failures'] / max(extraction_stats['answers'], 1)
+    print(f"Entity extraction ({mode}): {extraction_stats['answers']} answers, "
+          f"{extraction_stats['llm_calls']} LLM calls, {extraction_stats['validation_failures']} "
+          f"validation retries ({retry_rate:.1%}), {extraction_stats['dropped_spans']} spans dropped")
 
     return df
 
@@ -394,7 +725,20 @@ questions = [
         },
     ]
 if __name__ == "__main__":
-    df = process_survey_data(questions)
+    parser = argparse.ArgumentParser(description="Annotate music entities in the open-ended answers")
+    parser.add_argument('--batch', action='store_true', help="Submit each question's requests as one Batch API job instead of calling per row")
+    parser.add_argument('--mode', choices=sorted(ENTITY_MODES), default='structured',
+                        help="structured: JSON spans with the annotation rebuilt locally (default); inline: model writes the markers")
+    parser.add_argument('--per-respondent', action='store_true',
+                        help="Annotate all of a respondent's answers in one call (structured mode only)")
+    parser.add_argument('--refresh', action='store_true', help="Ignore cached completions and ask the model again")
+    args = parser.parse_args()
+    get_completion_cache().refresh = args.refresh
+    if args.per_respondent and args.mode != 'structured':
+        parser.error("--per-respondent needs --mode structured")
+
+    df = process_survey_data(questions, batch=args.batch, mode=args.mode, per_respondent=args.per_respondent,
+                             refresh=args.refresh)
 
     # Print sample results
     print("\n=== SAMPLE EXTRACTIONS ===")
@@ -0,0 +1,153 @@
+import pandas as pd
+import os
+import sys
+import json
+
+# Base directory configuration
+BASE_DIR = os.path.dirname(__file__)
+
+# Shared upstream clients live with the app
+sys.path.insert(0, os.path.join(BASE_DIR, '..', 'src'))
+from upstream import enable_rate_limiting
+from entity_spans import spans_from_annotation, spans_column
+from helpers.spotify import get_spotify_resolver
+from helpers.executor import run_ordered, materialize_csv
+from helpers.artist_catalog import ArtistCatalog, load_catalog, save_catalog
+
+# Pace upstream calls from their rate-limit headers instead of fixed sleeps
+enable_rate_limiting()
+
+ENTITY_COLUMNS = ['Q3_extracted_entities', 'Q18_extracted_entities', 'Q16_extracted_entities', 'Q19_extracted_entities']
+
+
+def load_entities(value):
+    """Parsed entity annotation from a CSV cell, or None"""
+    if pd.isna(value) or not str(value).strip():
+        return None
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def entity_artist_names(entities):
+    """Artist names mentioned by one annotation: artist entities and song artists"""
+    names = []
+    for entity in (entities or {}).get('entities', []):
+        if entity.get('type') == 'artist':
+            names.append(entity.get('name'))
+        elif entity.get('type') == 'song' and entity.get('artist'):
+            names.append(entity['artist'])
+    return names
+
+
+def search_spotify_artist(artist_name):
+    """Search Spotify for an artist and return their URL"""
+    try:
+        result = get_spotify_resolver().search(artist_name, 'artist')
+        if result:
+            return result['url']
+    except Exception as e:
+        print(f"Error searching Spotify for '{artist_name}': {e}")
+
+    return None
+
+
+def link_entities(entities, catalog):
+    """Point artist mentions at their catalog id (and the artist's Spotify URL)"""
+    for entity in entities.get('entities', []):
+        if entity.get('type') == 'artist':
+            artist_id = catalog.lookup(entity.get('name'))
+            if artist_id:
+                entity['artist_id'] = artist_id
+                spotify_url = catalog.artists[artist_id]['spotify_url']
+                if spotify_url:
+                    entity['spotify_url'] = spotify_url
+                    entity['spotify_match'] = catalog.artists[artist_id]['name']
+        elif entity.get('type') == 'song' and entity.get('artist'):
+            artist_id = catalog.lookup(entity['artist'])
+            if artist_id:
+                entity['artist_id'] = artist_id
+    return entities
+
+
+def build_artist_catalog():
+    """
+    Collect every artist mention (favourite bands and extracted entities),
+    group the spellings into canonical artists, resolve each artist on
+    Spotify once and link the survey rows to the catalog by artist id
+    """
+
+    # Read the survey data
+    input_path = os.path.join(BASE_DIR, '../data/processed/03_music_survey_with_extracted_entities.csv')
+    output_path = os.path.join(BASE_DIR, '../data/processed/04_music_survey_with_artist_urls.csv')
+    catalog_path = os.path.join(BASE_DIR, '../data/processed/artist_catalog.json')
+
+    df = pd.read_csv(input_path)
+
+    # Gather mentions
+    mentions = [name for name in df['extracted_favourite_band'] if pd.notna(name)]
+    for column in ENTITY_COLUMNS:
+        if column in df.columns:
+            for value in df[column]:
+                mentions.extend(entity_artist_names(load_entities(value)))
+
+    catalog = ArtistCatalog(load_catalog(catalog_path))
+    catalog.add_mentions(mentions)
+    print(f"{len(mentions)} artist mentions -> {len(catalog.artists)} catalog artists")
+
+    # One Spotify lookup per canonical artist still missing a link. Each
+    # lookup is committed to the resolver's SQLite cache as it finishes, so
+    # an interrupted run only repeats the unfinished ones
+    unresolved = [artist_id for artist_id, entry in catalog.artists.items() if not entry['spotify_url']]
+    print(f"Resolving {len(unresolved)} artists on Spotify...")
+    urls = run_ordered(
+        lambda artist_id: search_spotify_artist(catalog.artists[artist_id]['name']),
+        unresolved,
+        desc="Resolving artists",
+    )
+    for artist_id, spotify_url in zip(unresolved, urls):
+        catalog.artists[artist_id]['spotify_url'] = spotify_url
+
+    save_catalog(catalog, catalog_path)
+    print(f"Catalog saved to: {catalog_path}")
+
+    # Link rows to the catalog
+    band_ids = [catalog.lookup(name) if pd.notna(name) else None for name in df['extracted_favourite_band']]
+    df['extracted_favourite_band_artist_id'] = band_ids
+    df['extracted_favourite_band_spotify_url'] = [
+        catalog.artists[artist_id]['spotify_url'] if artist_id else None for artist_id in band_ids
+    ]
+    for column in ENTITY_COLUMNS:
+        if column in df.columns:
+            linked = [link_entities(entities, catalog) if entities else None for entities in map(load_entities, df[column])]
+            df[column] = [json.dumps(entities) if entities else None for entities in linked]
+            # Compact (start, end, type, name, spotify_url, artist_id) spans the app renders from
+            df[spans_column(column)] = [
+                json.dumps(spans, ensure_ascii=False, separators=(',', ':')) if spans else None
+                for spans in map(spans_from_annotation, linked)
+            ]
+
+    materialize_csv(df, output_path)
+    print(f"\nCompleted! Results saved to: {output_path}")
+
+    # Print statistics
+    total_artists = df['extracted_favourite_band'].notna().sum()
+    found_urls = df['extracted_favourite_band_spotify_url'].notna().sum()
+    print(f"\n=== STATISTICS ===")
+    print(f"Total favourite artists: {total_artists}")
+    print(f"Spotify URLs found: {found_urls}")
+    print(f"Success rate: {found_urls/total_artists*100:.1f}%")
+    print(f"Spotify lookups: {get_spotify_resolver().stats()}")
+
+    return df
+
+if __name__ == "__main__":
+    df = build_artist_catalog()
+
+    # Print sample results
+    print("\n=== SAMPLE RESULTS ===")
+    sample = df[df['extracted_favourite_band_spotify_url'].notna()][
+        ['extracted_favourite_band', 'extracted_favourite_band_artist_id', 'extracted_favourite_band_spotify_url']
+    ].head(5)
+    print(sample.to_string(index=False))
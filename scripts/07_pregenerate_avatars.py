@@ -0,0 +1,180 @@
+import os
+import sys
+import csv
+import json
+import base64
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+# Base directory configuration
+BASE_DIR = os.path.dirname(__file__)
+SRC_DIR = os.path.join(BASE_DIR, '..', 'src')
+
+# Prompts and avatar ids must match the app exactly, so use its modules
+sys.path.insert(0, SRC_DIR)
+from generate_image_prompt import create_image_prompt_from_survey
+from avatar_cache import avatar_key, load_pregenerated_avatars
+from upstream import enable_rate_limiting, get_openai_client
+from avatar_derivatives import derivative_formats, has_derivatives, write_derivatives
+
+# Pace upstream calls from their rate-limit headers instead of fixed sleeps
+enable_rate_limiting()
+
+# Shared OpenAI client (pooled connections, retries, circuit breaker)
+client = get_openai_client()
+
+# Must match the image settings in src/app.py
+IMAGE_MODEL = "gpt-image-1"
+IMAGE_SIZE = "1024x1024"
+IMAGE_QUALITY = "medium"
+
+SURVEY_FILE = os.path.join(SRC_DIR, "static/data/survey_data.csv")
+MANIFEST_FILE = os.path.join(SRC_DIR, "static/data/avatar_manifest.json")
+
+# Save the manifest (our checkpoint) after this many new avatars
+CHECKPOINT_EVERY = 10
+
+
+def is_safety_block(error):
+    """Same moderation check the app uses before retrying without the band"""
+    error_str = str(error).lower()
+    return 'safety system' in error_str or 'moderation_blocked' in error_str or 'content_policy' in error_str
+
+
+def load_manifest():
+    """Load the existing manifest so an interrupted run can resume"""
+    if os.path.exists(MANIFEST_FILE):
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {
+        'model': IMAGE_MODEL,
+        'size': IMAGE_SIZE,
+        'quality': IMAGE_QUALITY,
+        'avatars': {}
+    }
+
+
+def save_manifest(manifest):
+    """Write the manifest atomically so a crash never leaves a half-written file"""
+    tmp_path = f"{MANIFEST_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def is_done(entry, row, store):
+    """An avatar is up to date if its file exists and the prompt hasn't changed"""
+    if not entry or store.get(entry['avatar_id']) is None:
+        return False
+    with_band = entry.get('with_band', True)
+    return entry['prompt'] == create_image_prompt_from_survey(row, with_band=with_band)
+
+
+def generate_image(prompt, store):
+    """Generate one image into the pregenerated store and return its avatar id"""
+    key = avatar_key(prompt, IMAGE_MODEL, IMAGE_SIZE, IMAGE_QUALITY)
+    if store.get(key) is not None:
+        return key
+
+    response = client.images.generate(
+        model=IMAGE_MODEL,
+        prompt=prompt,
+        size=IMAGE_SIZE,
+        quality=IMAGE_QUALITY,
+        n=1,
+    )
+    store.put(key, base64.b64decode(response.data[0].b64_json))
+    return key
+
+
+def pregenerate_avatar(row, store):
+    """Generate the avatar for one respondent, retrying without the band on a safety block"""
+    prompt = create_image_prompt_from_survey(row, with_band=True)
+    try:
+        return {'avatar_id': generate_image(prompt, store), 'prompt': prompt, 'with_band': True}
+    except Exception as e:
+        if not is_safety_block(e):
+            raise
+        print(f"\nSafety block for {row['participant_id']}, retrying without band")
+
+    prompt = create_image_prompt_from_survey(row, with_band=False)
+    return {'avatar_id': generate_image(prompt, store), 'prompt': prompt, 'with_band': False}
+
+
+def write_all_derivatives(avatar_ids, store, workers=None):
+    """Write resized WebP/AVIF copies for every avatar that doesn't have them yet"""
+    todo = [a for a in avatar_ids if not has_derivatives(store.cache_dir, a)]
+    if not todo:
+        return
+
+    formats = derivative_formats()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(write_derivatives, store.path_for(a), store.cache_dir, a, formats)
+            for a in todo
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Writing derivatives"):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"\nError writing derivatives: {e}")
+
+
+def pregenerate_avatars(concurrency=4, limit=None):
+    """Generate avatars for every survey respondent and record them in the manifest"""
+    with open(SURVEY_FILE, 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    store = load_pregenerated_avatars(SRC_DIR)
+    manifest = load_manifest()
+    avatars = manifest['avatars']
+
+    todo = [row for row in rows if not is_done(avatars.get(row['participant_id']), row, store)]
+    if limit:
+        todo = todo[:limit]
+
+    print(f"{len(rows) - len(todo)} avatars already generated, {len(todo)} to go")
+
+    failures = []
+    completed = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(pregenerate_avatar, row, store): row['participant_id'] for row in todo}
+
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Generating avatars"):
+                participant_id = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    print(f"\nError generating avatar for {participant_id}: {e}")
+                    failures.append(participant_id)
+                    continue
+
+                avatars[participant_id] = entry
+                completed += 1
+                if completed % CHECKPOINT_EVERY == 0:
+                    save_manifest(manifest)
+
+    except KeyboardInterrupt:
+        print("\n\nInterrupted! Saving progress...")
+        save_manifest(manifest)
+        print("Run script again to resume from where you left off.")
+        raise
+
+    save_manifest(manifest)
+    print(f"\n✓ Generated {completed} avatars ({len(failures)} failed)")
+
+    write_all_derivatives({entry['avatar_id'] for entry in avatars.values()}, store)
+    print(f"Manifest saved to: {MANIFEST_FILE}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pregenerate avatars for all survey respondents")
+    parser.add_argument('--concurrency', type=int, default=4, help="Parallel image generations")
+    parser.add_argument('--limit', type=int, default=None, help="Only generate this many (for testing)")
+    args = parser.parse_args()
+
+    pregenerate_avatars(concurrency=args.concurrency, limit=args.limit)
@@ -0,0 +1,72 @@
+import pandas as pd
+import os
+import sys
+import argparse
+
+# Base directory configuration
+BASE_DIR = os.path.dirname(__file__)
+
+# Add helpers to path
+sys.path.insert(0, os.path.join(BASE_DIR, 'helpers'))
+from generate_image_prompt import score_personalities
+from helpers.executor import materialize_csv, materialize_file
+
+INPUT_CSV = os.path.join(BASE_DIR, "../data/processed/04_music_survey_with_artist_urls.csv")
+# The survey file the app (and 07_pregenerate_avatars.py) reads
+PUBLISHED_CSV = os.path.join(BASE_DIR, "../src/static/data/survey_data.csv")
+# The artist catalog the published rows' artist ids resolve against (06_build_artist_catalog.py)
+CATALOG_JSON = os.path.join(BASE_DIR, "../data/processed/artist_catalog.json")
+PUBLISHED_CATALOG = os.path.join(BASE_DIR, "../src/static/data/artist_catalog.json")
+
+DIMENSION_COLUMNS = ['ai_level', 'ai_score', 'intensity_level', 'intensity_score', 'sociality_level', 'sociality_score']
+
+
+def add_personality_dimensions(df):
+    """
+    df with the personality dimension columns (re)computed for every row.
+    Rows whose AI answers can't be placed keep empty values; readers score
+    those themselves.
+    """
+    df = df.drop(columns=[column for column in DIMENSION_COLUMNS if column in df.columns])
+    return pd.concat([df, score_personalities(df)], axis=1)
+
+
+def publish_survey_data(input_csv, output_csv, catalog_json=None, published_catalog=None):
+    """
+    Score every respondent once and write the survey file the app serves,
+    publishing the artist catalog alongside it when given
+    """
+    print(f"Loading data from {input_csv}...")
+    df = pd.read_csv(input_csv)
+
+    df = add_personality_dimensions(df)
+    unscored = df['ai_level'].isna().sum()
+
+    if catalog_json:
+        # Catalog first: it only ever gains artists, so the rows published next never
+        # refer to an id the app can't resolve
+        if os.path.exists(catalog_json):
+            materialize_file(catalog_json, published_catalog)
+            print(f"✓ Artist catalog published to: {published_catalog}")
+        else:
+            print(f"Warning: {catalog_json} not found, artist catalog not published")
+    materialize_csv(df, output_csv)
+    print(f"✓ Scored {len(df)} respondents ({unscored} without an AI level)")
+    print(f"✓ Saved to: {output_csv}")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store the personality dimensions in the published survey data")
+    parser.add_argument('--in-place', action='store_true',
+                        help="Rescore the published survey file itself instead of the pipeline output")
+    args = parser.parse_args()
+
+    if args.in_place:
+        df = publish_survey_data(PUBLISHED_CSV, PUBLISHED_CSV)
+    else:
+        df = publish_survey_data(INPUT_CSV, PUBLISHED_CSV, CATALOG_JSON, PUBLISHED_CATALOG)
+
+    print("\n--- Level counts ---")
+    for column in ('ai_level', 'intensity_level', 'sociality_level'):
+        print(df[column].value_counts().to_string(), "\n")
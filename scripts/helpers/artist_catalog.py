@@ -0,0 +1,149 @@
+"""
+Canonical artist catalog.
+
+Favourite bands (stage 02) and artist entities (stage 05) arrive in many
+spellings of the same artist ("L'il nas", "Lil Nas X", "lil nas x"). The
+catalog groups them by a normalised key plus fuzzy matching, gives each
+artist a stable id and is written as a compact id-keyed table:
+
+    {"artists": {"ar_3f9c...": {"name": "Lil Nas X",
+                                "spotify_url": "https://open.spotify.com/artist/...",
+                                "aliases": ["lil nas", "lil nas x"]}}}
+
+Ids are kept from the previous catalog wherever an alias is already known,
+so they stay stable across rebuilds.
+"""
+import os
+import re
+import json
+import hashlib
+import unicodedata
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+# Minimum similarity of two normalised names to treat them as one artist
+FUZZY_CUTOFF = 0.85
+# Shorter names only merge on an exact normalised match ("abba" vs "aba")
+FUZZY_MIN_LENGTH = 5
+
+
+def normalize_artist_name(name):
+    """
+    Key used to group spellings: case, diacritics, punctuation, "&"/"and"
+    and a leading "the" don't matter. Returns '' for blank names.
+    """
+    if name is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace('&', ' and ')
+    # Apostrophes join words (L'il -> lil), other punctuation separates them
+    text = re.sub(r"['’`]", '', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = ' '.join(text.split())
+    if text.startswith('the '):
+        text = text[4:]
+    return text
+
+
+def artist_id_for(key):
+    """Stable id for a new artist, derived from its first canonical key"""
+    return 'ar_' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+
+
+def _similar(a, b):
+    if min(len(a), len(b)) < FUZZY_MIN_LENGTH:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= FUZZY_CUTOFF
+
+
+class ArtistCatalog:
+    """Groups artist mentions into canonical artists (see module docstring)"""
+
+    def __init__(self, previous=None):
+        self.artists = {}        # id -> {'name', 'spotify_url', 'aliases'}
+        self._by_key = {}        # normalised key -> id
+        # Fuzzy candidates bucketed by first character, so matching a name
+        # only compares it with artists that could plausibly be the same
+        self._buckets = defaultdict(list)
+        self._spellings = defaultdict(Counter)
+
+        for artist_id, entry in (previous or {}).get('artists', {}).items():
+            self.artists[artist_id] = {'name': entry['name'], 'spotify_url': entry.get('spotify_url'), 'aliases': []}
+            for key in entry.get('aliases', []):
+                self._link(key, artist_id)
+
+    def _link(self, key, artist_id):
+        if key not in self._by_key:
+            self._by_key[key] = artist_id
+            self._buckets[key[0]].append(key)
+            self.artists[artist_id]['aliases'].append(key)
+
+    def _match(self, key):
+        artist_id = self._by_key.get(key)
+        if artist_id is not None:
+            return artist_id
+        for candidate in self._buckets.get(key[0], []):
+            if _similar(key, candidate):
+                return self._by_key[candidate]
+        return None
+
+    def add_mentions(self, names):
+        """
+        Add every mention (repeats included) and assign them to artists. More
+        frequent spellings are placed first so they become the canonical ones.
+        """
+        counts = Counter()
+        for name in names:
+            key = normalize_artist_name(name)
+            if key:
+                counts[key] += 1
+                self._spellings[key][str(name).strip()] += 1
+
+        for key, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+            artist_id = self._match(key)
+            if artist_id is None:
+                artist_id = artist_id_for(key)
+                self.artists[artist_id] = {'name': None, 'spotify_url': None, 'aliases': []}
+            self._link(key, artist_id)
+
+        # Display name: the most common spelling across all of an artist's aliases
+        for artist_id, entry in self.artists.items():
+            spellings = Counter()
+            for key in entry['aliases']:
+                spellings.update(self._spellings.get(key, {}))
+            if spellings:
+                entry['name'] = sorted(spellings.items(), key=lambda item: (-item[1], -len(item[0]), item[0]))[0][0]
+
+    def lookup(self, name):
+        """Artist id for a name, or None if it isn't in the catalog"""
+        key = normalize_artist_name(name)
+        return self._match(key) if key else None
+
+    def to_json(self):
+        return {
+            'artists': {
+                artist_id: {
+                    'name': entry['name'],
+                    'spotify_url': entry['spotify_url'],
+                    'aliases': sorted(entry['aliases']),
+                }
+                for artist_id, entry in sorted(self.artists.items())
+            }
+        }
+
+
+def load_catalog(path):
+    """Previously written catalog table, or an empty one"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'artists': {}}
+
+
+def save_catalog(catalog, path):
+    """Write the catalog table atomically"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog.to_json(), f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
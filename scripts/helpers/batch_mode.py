@@ -0,0 +1,211 @@
+"""
+Batch-API mode for the offline LLM stages.
+
+Instead of one synchronous chat completion per row, a stage writes all of
+its requests to a JSONL file, submits them as a single batch job, polls
+until it finishes and merges the answers back by custom_id (the
+participant id). Batch requests are billed at a discount and the upstream
+works through them on its own schedule, so huge datasets don't need this
+process to babysit every request.
+
+    requests = {pid: {'model': ..., 'messages': [...], ...} for ...}
+    answers = run_batch(client, '02_genre_bands', requests, parse=lambda pid, text: json.loads(text))
+    # answers[pid] is the reply text, or None if that request failed
+
+Requests already answered in the completion cache (completion_cache.py)
+aren't submitted again, and new answers are added to it. As with
+complete(), only answers parse(custom_id, text) accepts are cached (and
+cached answers it rejects are asked for again); answers cut off by
+max_tokens count as failed.
+
+The submitted batch id is remembered next to the input file, so if the
+process is stopped while a batch is running the next run picks the same
+batch up again instead of paying for it twice.
+
+scripts/helpers/upstream_stub.py implements /v1/files and /v1/batches for
+testing without the real API.
+"""
+import os
+import json
+import time
+import hashlib
+
+from helpers.completion_cache import get_completion_cache
+
+ENDPOINT = "/v1/chat/completions"
+FINISHED_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def batch_dir(base_dir):
+    """Where batch input files and their state live (data/processed/.batches/)"""
+    path = os.path.join(base_dir, '..', 'data', 'processed', '.batches')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_batch_file(path, requests):
+    """Write {custom_id: chat completion kwargs} as batch JSONL; returns its content hash"""
+    lines = [
+        json.dumps({'custom_id': str(custom_id), 'method': 'POST', 'url': ENDPOINT, 'body': body}, ensure_ascii=False)
+        for custom_id, body in requests.items()
+    ]
+    content = ("\n".join(lines) + "\n").encode('utf-8')
+    with open(path, 'wb') as f:
+        f.write(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def _load_state(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return None
+
+
+def _save_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def submit_batch(client, input_path):
+    """Upload the input file and create the batch job. Returns the batch id."""
+    with open(input_path, 'rb') as f:
+        uploaded = client.files.create(file=f, purpose='batch')
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=ENDPOINT,
+        completion_window='24h',
+    )
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_interval=30):
+    """Poll until the batch reaches a final status; returns the batch object"""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts is not None:
+            print(f"Batch {batch_id}: {batch.status}, {counts.completed}/{counts.total} done, {counts.failed} failed", end="\r")
+        if batch.status in FINISHED_STATUSES:
+            print()
+            return batch
+        time.sleep(poll_interval)
+
+
+def read_results(client, batch):
+    """Reply text by custom_id; failed or truncated (max_tokens) requests map to None"""
+    answers = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code') != 200:
+                answers[record['custom_id']] = None
+                continue
+            choice = response['body']['choices'][0]
+            if choice.get('finish_reason') == 'length':
+                answers[record['custom_id']] = None
+                continue
+            answers[record['custom_id']] = choice['message']['content']
+    return answers
+
+
+def _accepts(parse, custom_id, text):
+    """Whether parse takes the answer (always, without a parser)"""
+    if parse is None:
+        return True
+    try:
+        parse(custom_id, text)
+        return True
+    except Exception as e:
+        print(f"Answer for {custom_id} doesn't parse ({e}), not caching it")
+        return False
+
+
+def run_batch(client, name, requests, base_dir=None, poll_interval=None, parse=None, on_call=None):
+    """
+    Run {custom_id: chat completion kwargs} as one batch job and return
+    {custom_id: reply text or None}. Ids missing from the batch output
+    (e.g. the batch expired) are returned as None as well. parse(custom_id,
+    text) decides which answers are cached: it should raise for any answer
+    the stage would reject. on_call(count) is told how many requests go to
+    the model, i.e. weren't answered from the completion cache.
+    """
+    if not requests:
+        return {}
+    cache = get_completion_cache()
+    answers = {}
+    for custom_id, body in requests.items():
+        cached = cache.get(body)
+        if cached is not None and _accepts(parse, str(custom_id), cached):
+            answers[str(custom_id)] = cached
+    if answers:
+        print(f"{name}: {len(answers)}/{len(requests)} answers from the completion cache")
+    to_submit = {custom_id: body for custom_id, body in requests.items() if str(custom_id) not in answers}
+    if not to_submit:
+        return {str(custom_id): answers[str(custom_id)] for custom_id in requests}
+    if on_call is not None:
+        on_call(len(to_submit))
+
+    base_dir = base_dir or os.path.dirname(os.path.dirname(__file__))
+    if poll_interval is None:
+        poll_interval = float(os.getenv('BATCH_POLL_SECONDS', 30))
+
+    directory = batch_dir(base_dir)
+    input_path = os.path.join(directory, f"{name}.jsonl")
+    state_path = os.path.join(directory, f"{name}.batch.json")
+
+    digest = write_batch_file(input_path, to_submit)
+    state = _load_state(state_path)
+    if state and state['input_sha256'] == digest:
+        print(f"Resuming batch {state['batch_id']} for {name}")
+        batch_id = state['batch_id']
+    else:
+        batch_id = submit_batch(client, input_path)
+        _save_state(state_path, {'batch_id': batch_id, 'input_sha256': digest})
+        print(f"Submitted batch {batch_id} for {name} ({len(to_submit)} requests)")
+
+    batch = wait_for_batch(client, batch_id, poll_interval)
+    if batch.status != 'completed':
+        print(f"Batch {batch_id} ended with status {batch.status}")
+
+    results = read_results(client, batch)
+    # The batch is finished either way; a rerun should submit a fresh one
+    os.remove(state_path)
+    for custom_id, body in to_submit.items():
+        answer = results.get(str(custom_id))
+        if answer is not None and _accepts(parse, str(custom_id), answer):
+            cache.put(body, answer)
+    answers.update(results)
+
+    missing = [custom_id for custom_id in map(str, to_submit) if custom_id not in results]
+    failed = sum(1 for answer in results.values() if answer is None)
+    if missing or failed:
+        print(f"Batch {batch_id}: {failed} requests failed, {len(missing)} missing")
+    return {str(custom_id): answers.get(str(custom_id)) for custom_id in requests}
+
+
+def parse_answers(items, key, answers, parse, on_error=None):
+    """
+    Turn batch answers back into per-item results in input order, mirroring
+    run_ordered(): parse(item, text) for each answer, on_error(item, exc) for
+    items whose request failed or whose answer doesn't parse.
+    """
+    results = []
+    for item in items:
+        item_key = str(key(item))
+        try:
+            answer = answers.get(item_key)
+            if answer is None:
+                raise ValueError("no answer in batch output")
+            results.append(parse(item, answer))
+        except Exception as e:
+            print(f"Error processing {item_key}: {e}")
+            results.append(on_error(item, e) if on_error else None)
+    return results
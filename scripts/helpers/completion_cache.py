@@ -0,0 +1,152 @@
+"""
+Persistent cache of chat completions for the pipeline stages.
+
+Every LLM call in 01, 02 and 05 goes through complete() (and run_batch()),
+which keys the request on a hash of its model, messages and sampling
+parameters. Re-running a stage, or resuming after a crash, answers rows it
+has already seen from data/cache/completions.sqlite without an upstream
+call; only new or changed prompts are sent.
+
+    text = complete(client, request)                                # reply text
+    result = complete(client, request, parse=lambda text: json.loads(text))
+
+A reply is only stored once parse() accepts it (and never when it was cut
+off by max_tokens), so a bad answer is asked for again on the next run;
+callers that reject a reply later pass refresh=True on their retry. Batch
+answers are stored as they come back.
+
+The cache is capped at COMPLETION_CACHE_MAX_MB if set, dropping the least
+recently used entries. Stages take --refresh to ignore cached replies (new
+ones still overwrite them).
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'cache', 'completions.sqlite')
+
+
+def completion_key(request):
+    """Content hash of chat completion kwargs (model, messages, sampling parameters)"""
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CompletionCache:
+    """SQLite store of reply text by completion_key() (see module docstring)"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=None, refresh=False):
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self._stats = {'hits': 0, 'misses': 0, 'evicted': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets stages running side by side share the cache
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS completions ('
+            ' key TEXT PRIMARY KEY,'
+            ' model TEXT,'
+            ' content TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)')
+        self._db.commit()
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM completions').fetchone()[0]
+
+    def get(self, request):
+        """Cached reply text for request, or None (always None when refreshing)"""
+        if self.refresh:
+            return None
+        key = completion_key(request)
+        with self._lock:
+            row = self._db.execute('SELECT content FROM completions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['hits'] += 1
+            self._db.execute('UPDATE completions SET last_used = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, request, content):
+        key = completion_key(request)
+        size = len(content.encode('utf-8'))
+        with self._lock:
+            previous = self._db.execute('SELECT size FROM completions WHERE key = ?', (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO completions (key, model, content, size, last_used) VALUES (?, ?, ?, ?, ?)',
+                (key, request.get('model'), content, size, time.time())
+            )
+            self._size += size - (previous[0] if previous else 0)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache fits its cap again
+        while self.max_bytes and self._size > self.max_bytes:
+            rows = self._db.execute('SELECT key, size FROM completions ORDER BY last_used LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._size <= self.max_bytes:
+                    break
+                self._db.execute('DELETE FROM completions WHERE key = ?', (key,))
+                self._size -= size
+                self._stats['evicted'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size_mb=round(self._size / 1e6, 2))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_completion_cache():
+    """The process-wide cache, configured from COMPLETION_CACHE_* environment variables"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            max_mb = float(os.getenv('COMPLETION_CACHE_MAX_MB', 0))
+            _cache = CompletionCache(
+                os.getenv('COMPLETION_CACHE_PATH', DEFAULT_CACHE_PATH),
+                max_bytes=int(max_mb * 1e6) or None,
+            )
+        return _cache
+
+
+def complete(client, request, parse=None, refresh=False, on_call=None):
+    """
+    Reply to chat completion kwargs, from the cache when possible. With parse,
+    returns parse(text) and only caches replies it accepts (errors propagate).
+    refresh=True skips the cached reply for this call; on_call() is called
+    when the request actually goes to the model (e.g. to count calls).
+    """
+    cache = get_completion_cache()
+    content = None if refresh else cache.get(request)
+    if content is not None:
+        if not parse:
+            return content
+        try:
+            return parse(content)
+        except Exception as e:
+            # Stored before the parser changed: ask again
+            print(f"Cached reply no longer parses ({e}), requesting a new one")
+
+    if on_call is not None:
+        on_call()
+    response = client.chat.completions.create(**request)
+    choice = response.choices[0]
+    content = choice.message.content
+    result = parse(content) if parse else content
+    if content is not None and choice.finish_reason != 'length':
+        cache.put(request, content)
+    return result
@@ -0,0 +1,207 @@
+"""
+Local effort scoring in front of the LLM low-effort classifier (stage 01).
+
+Most answers are obviously fine or obviously not ("idk", "n/a", "asdfgh",
+a blank, or a few sentences about a song). Each answer gets a score in
+[0, 1] from cheap features:
+
+    length      characters in the answer (short answers score lower)
+    entropy     Shannon entropy of its characters (keyboard mash and "....." are low)
+    repeats     share of characters in runs of 3+ ("aaaaa", "!!!!!")
+    dictionary  share of its words that other respondents use too
+    stop        a known non-answer ("idk", "none", "not sure", ...) scores 0
+
+The "dictionary" is the survey's own vocabulary: words written by at least
+VOCAB_MIN_RESPONDENTS respondents, which covers plain English as well as
+the artist names people keep mentioning, while mashed keys never repeat.
+
+Per field, a score at or below its 'low' threshold marks the answer low
+effort and one at or above 'high' marks it fine; anything between is
+ambiguous. A respondent is decided locally when two of the three required
+answers are clearly low (low effort) or clearly fine (kept); everyone else
+goes to the LLM. Thresholds are calibrated per field against LLM labels
+(calibrate_thresholds(), 01_clean_data.py --calibrate) and stored in
+data/processed/effort_thresholds.json; until then DEFAULT_THRESHOLDS only
+decides blanks, stop answers and long, plain answers.
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+
+THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'processed', 'effort_thresholds.json')
+
+# Answers that never count as effort, compared after lowercasing and
+# stripping punctuation
+STOP_ANSWERS = {
+    '', 'idk', 'i dont know', 'dont know', 'dunno', 'no idea', 'i have no idea', 'not sure', 'unsure',
+    'none', 'nothing', 'no', 'nope', 'na', 'n a', 'nil', 'null', 'pass', 'skip', 'nah', 'no answer',
+    'cant remember', 'i cant remember', 'dont remember', 'i dont remember', 'not applicable',
+    'no comment', 'whatever', 'anything', 'everything', 'all', 'x', 'xx', 'xxx', 'test', 'asdf', 'lol',
+}
+
+VOCAB_MIN_RESPONDENTS = 3
+# Answers this long (characters) or with this much entropy (bits) aren't penalised
+FULL_LENGTH = 40
+FULL_ENTROPY = 3.0
+# Score factor left for an answer none of whose words are in the vocabulary
+UNKNOWN_WORD_WEIGHT = 0.25
+
+# Fields that may be left blank without counting against the respondent
+OPTIONAL_FIELDS = {'Q16_Music_guilty_pleasure_text_OE'}
+
+DEFAULT_THRESHOLDS = {'low': 0.0, 'high': 0.9}
+# Calibration: share of the LLM's labels a local verdict must agree with,
+# and the fewest labelled answers a threshold may rest on
+CALIBRATION_PRECISION = 0.97
+CALIBRATION_MIN_SUPPORT = 20
+
+WORD_RE = re.compile(r"[^\W\d_]+(?:['’][^\W\d_]+)*")
+
+
+def _normalize(text):
+    text = re.sub(r"['’`]", '', str(text).casefold())
+    return ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+
+
+def answer_words(text):
+    """Lowercased words of an answer (apostrophes kept inside words)"""
+    return [word.replace('’', "'") for word in WORD_RE.findall(str(text).casefold())]
+
+
+def build_vocabulary(answers_by_respondent, min_respondents=VOCAB_MIN_RESPONDENTS):
+    """Words used by at least min_respondents respondents (lists of their answers)"""
+    counts = Counter()
+    for answers in answers_by_respondent:
+        words = set()
+        for text in answers:
+            if isinstance(text, str):
+                words.update(answer_words(text))
+        counts.update(words)
+    return {word for word, count in counts.items() if count >= min_respondents}
+
+
+def answer_features(text, vocabulary):
+    """The cheap features of one answer (see module docstring)"""
+    text = text.strip() if isinstance(text, str) else ''
+    compact = ''.join(text.casefold().split())
+    words = answer_words(text)
+
+    counts = Counter(compact)
+    entropy = -sum(n / len(compact) * math.log2(n / len(compact)) for n in counts.values()) if compact else 0.0
+    repeated = sum(len(run.group()) for run in re.finditer(r'(.)\1{2,}', compact))
+
+    return {
+        'length': len(text),
+        'entropy': entropy,
+        'repeats': repeated / len(compact) if compact else 0.0,
+        'dictionary': sum(word in vocabulary for word in words) / len(words) if words else 0.0,
+        'stop': _normalize(text) in STOP_ANSWERS,
+    }
+
+
+def effort_score(features):
+    """0 (no effort) .. 1 (clearly an answer); every weak feature pulls it down"""
+    if features['stop']:
+        return 0.0
+    length = min(1.0, math.log1p(features['length']) / math.log1p(FULL_LENGTH))
+    entropy = min(1.0, features['entropy'] / FULL_ENTROPY)
+    # Unknown words only weaken an answer: a rare artist name isn't mashed keys
+    dictionary = UNKNOWN_WORD_WEIGHT + (1.0 - UNKNOWN_WORD_WEIGHT) * features['dictionary']
+    return dictionary * length * entropy * (1.0 - features['repeats'])
+
+
+def field_verdict(field, text, vocabulary, thresholds):
+    """'low', 'ok' or None (ambiguous) for one answer"""
+    if field in OPTIONAL_FIELDS and (not isinstance(text, str) or not text.strip()):
+        return 'ok'
+    limits = thresholds.get(field, DEFAULT_THRESHOLDS)
+    score = effort_score(answer_features(text, vocabulary))
+    if limits['low'] is not None and score <= limits['low']:
+        return 'low'
+    if limits['high'] is not None and score >= limits['high']:
+        return 'ok'
+    return None
+
+
+def prefilter_respondent(row, fields, vocabulary, thresholds):
+    """
+    Local assessment in the shape the LLM path returns, or None when the
+    respondent's answers are too ambiguous to decide without it
+    """
+    verdicts = {field: field_verdict(field, row.get(field), vocabulary, thresholds) for field in fields}
+    required = [field for field in fields if field not in OPTIONAL_FIELDS]
+    low = sum(verdicts[field] == 'low' for field in required)
+    ok = sum(verdicts[field] == 'ok' for field in required)
+    # Low effort means 2+ low required answers, so two fine ones rule it out
+    if low < 2 and len(required) - ok >= 2:
+        return None
+
+    low_effort_fields = [{'field': field, 'text': row.get(field, '')} for field in fields if verdicts[field] == 'low']
+    return {
+        'is_low_effort': low >= 2,
+        'low_effort_count': len(low_effort_fields),
+        'low_effort_fields': low_effort_fields,
+        'decided_locally': True,
+    }
+
+
+def _threshold(pairs, precision, min_support):
+    # Widest cut whose side agrees with the labels at least `precision` of
+    # the time; pairs are (score, agrees) sorted from the extreme inwards
+    best = None
+    agreeing = 0
+    for seen, (score, agrees) in enumerate(pairs, 1):
+        agreeing += agrees
+        next_score = pairs[seen][0] if seen < len(pairs) else None
+        if next_score == score:
+            continue
+        if seen >= min_support and agreeing / seen >= precision:
+            best = score
+    return best
+
+
+def calibrate_thresholds(rows, results, fields, vocabulary,
+                         precision=CALIBRATION_PRECISION, min_support=CALIBRATION_MIN_SUPPORT):
+    """
+    Per-field thresholds from LLM labels: rows and their stage 01 results
+    (results with 'failed' set are ignored). 'low' / 'high' are None for a
+    field where no cut reaches the precision.
+    """
+    thresholds = {}
+    for field in fields:
+        scored = []
+        for row, result in zip(rows, results):
+            if not result or result.get('failed') or result.get('decided_locally'):
+                continue
+            text = row.get(field)
+            if field in OPTIONAL_FIELDS and (not isinstance(text, str) or not text.strip()):
+                continue
+            is_low = any(item['field'] == field for item in result['low_effort_fields'])
+            scored.append((effort_score(answer_features(text, vocabulary)), is_low))
+
+        ascending = sorted(scored, key=lambda pair: pair[0])
+        descending = [(score, not is_low) for score, is_low in reversed(ascending)]
+        low = _threshold(ascending, precision, min_support)
+        high = _threshold(descending, precision, min_support)
+        if low is not None and high is not None and low >= high:
+            high = None
+        thresholds[field] = {'low': low, 'high': high, 'labelled': len(scored)}
+    return thresholds
+
+
+def load_thresholds(path=THRESHOLDS_PATH):
+    """Calibrated thresholds by field, or {} (DEFAULT_THRESHOLDS everywhere)"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_thresholds(thresholds, path=THRESHOLDS_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(thresholds, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
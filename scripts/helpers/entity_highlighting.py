@@ -1,65 +1,39 @@
+import os
+import sys
 import json
-import re
 
-def highlight_entities_html(text, entities_json):
+# The span renderer is shared with the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+from entity_spans import load_spans, spans_from_annotation, render_spans
+
+def highlight_entities_html(text, entities_json, entity_spans=None):
     """
-    Convert annotated text with extracted entities to HTML with highlighting and Spotify links
+    Convert extracted entities to HTML with highlighting and Spotify links
 
     Args:
-        text: Original text string (fallback if no annotated text)
+        text: Original text string (fallback if there are no entities)
         entities_json: JSON string containing annotated text and extracted entities
+        entity_spans: The row's span column (JSON string or dict), used instead when present
 
     Returns:
         HTML string with highlighted entities
     """
-    if not entities_json:
-        return text
-
-    try:
-        data = json.loads(entities_json) if isinstance(entities_json, str) else entities_json
-
-        # Get annotated text (has inline markers)
-        annotated_text = data.get('annotated_text', text)
-        entities = data.get('entities', [])
-
-        if not entities:
+    spans = load_spans(entity_spans) if entity_spans else None
+    if spans is None:
+        if not entities_json:
             return text
-
-        # Replace inline markers with HTML
-        # Pattern: ||{"type": "song", ...}text||
-        def replace_marker(match):
-            try:
-                metadata_str = match.group(1)
-                entity_text = match.group(2)
-                metadata = json.loads(metadata_str)
-
-                entity_type = metadata.get('type', 'unknown')
-                css_class = f"music-entity music-entity-{entity_type}"
-
-                # Find matching entity with Spotify link
-                spotify_url = None
-                for entity in entities:
-                    if entity.get('matched_text') == entity_text:
-                        spotify_url = entity.get('spotify_url')
-                        break
-
-                if spotify_url:
-                    return f'<a href="{spotify_url}" target="_blank" class="{css_class}" title="Listen on Spotify">{entity_text} 🎵</a>'
-                else:
-                    return f'<span class="{css_class}">{entity_text}</span>'
-
-            except:
-                return match.group(2)  # Return just the text if parsing fails
-
-        pattern = r'\|\|(\{[^}]+\})([^|]+)\|\|'
-        result = re.sub(pattern, replace_marker, annotated_text)
-
-        return result
-
-    except Exception as e:
-        print(f"Error highlighting entities: {e}")
+        spans = load_spans(spans_from_annotation(entities_json))
+    if spans is None or not spans[1]:
         return text
 
+    span_text, span_list = spans
+    return render_spans(
+        span_text,
+        span_list,
+        link='<a href="{url}" target="_blank" class="music-entity music-entity-{type}" title="Listen on Spotify">{text} 🎵</a>',
+        unlinked='<span class="music-entity music-entity-{type}">{text}</span>',
+    )
+
 def get_entity_summary(entities_json):
     """
     Get a summary of extracted entities
@@ -0,0 +1,162 @@
+"""
+Concurrent, order-preserving executor for the LLM-bound pipeline stages.
+
+Rows are independent upstream calls, so a stage's wall-clock time is bound
+by request latency rather than CPU; running them on a thread pool cuts it
+roughly by the concurrency factor (the shared upstream clients pool their
+connections and pace requests, see src/upstream.py).
+
+    results = run_ordered(analyze, rows, key=lambda row: row['participant_id'],
+                          checkpoint_path='data/processed/.checkpoints/01.jsonl')
+
+Results come back in input order. A row whose call raises gets on_error's
+value instead and doesn't stop the others. Completed rows are appended to a
+JSONL checkpoint as they finish (appended and fsynced, so a crash loses at
+most the row being written), so an interrupted run resumes where it
+stopped; failed rows are not checkpointed and are retried next time. Once
+every row has succeeded the checkpoint is removed, so the next full run
+starts fresh.
+
+Stages with several passes keep their checkpoints as a journal instead
+(keep_checkpoint=True), replay it on resume and write their output once
+with materialize_csv() before clearing it.
+"""
+import os
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_CONCURRENCY = 8
+
+
+def pipeline_concurrency():
+    """Worker count for pipeline stages (PIPELINE_CONCURRENCY, default 8)"""
+    return max(1, int(os.getenv('PIPELINE_CONCURRENCY', DEFAULT_CONCURRENCY)))
+
+
+def checkpoint_file(base_dir, name):
+    """Path for a stage's checkpoint under data/processed/.checkpoints/"""
+    checkpoint_dir = os.path.join(base_dir, '..', 'data', 'processed', '.checkpoints')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    return os.path.join(checkpoint_dir, f"{name}.jsonl")
+
+
+def load_checkpoint(path):
+    """Completed results by key. A torn last line (crash mid-write) is ignored."""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            done[record['key']] = record['result']
+    return done
+
+
+def append_checkpoint(path, records):
+    """Journal (key, result) pairs that were produced outside run_ordered()"""
+    with open(path, 'a', encoding='utf-8') as f:
+        for item_key, result in records:
+            f.write(json.dumps({'key': item_key, 'result': result}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def clear_checkpoint(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def materialize_csv(df, path):
+    """Write a stage's output CSV atomically: a crash leaves the old file intact"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        df.to_csv(f, index=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def materialize_file(source, path):
+    """Copy a finished file into place atomically (e.g. publishing it to the app)"""
+    tmp_path = f"{path}.tmp"
+    shutil.copyfile(source, tmp_path)
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def run_ordered(fn, items, key=None, concurrency=None, checkpoint_path=None,
+                on_error=None, desc="Processing", keep_checkpoint=False):
+    """
+    Call fn(item) for every item on a thread pool and return the results in
+    input order.
+
+    Args:
+        fn: function of one item; its result must be JSON-serialisable when checkpointing
+        items: the inputs (e.g. DataFrame rows)
+        key: item -> stable, unique checkpoint key (required with checkpoint_path)
+        concurrency: worker count, defaults to pipeline_concurrency()
+        checkpoint_path: JSONL file to resume from and append completed rows to
+        on_error: (item, exception) -> result to use for a failed row (default None)
+        desc: label for progress output
+        keep_checkpoint: leave the checkpoint in place on success (the caller clears it)
+    """
+    items = list(items)
+    concurrency = concurrency or pipeline_concurrency()
+    results = [None] * len(items)
+
+    done = load_checkpoint(checkpoint_path)
+    pending = []
+    for i, item in enumerate(items):
+        item_key = key(item) if key else i
+        if checkpoint_path and item_key in done:
+            results[i] = done[item_key]
+        else:
+            pending.append((i, item_key, item))
+
+    if checkpoint_path and len(pending) < len(items):
+        print(f"{desc}: resuming, {len(items) - len(pending)}/{len(items)} rows already done")
+    if not pending:
+        if not keep_checkpoint:
+            clear_checkpoint(checkpoint_path)
+        return results
+
+    errors = 0
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8') if checkpoint_path else None
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        futures = {executor.submit(fn, item): (i, item_key, item) for i, item_key, item in pending}
+        for completed, future in enumerate(as_completed(futures), 1):
+            i, item_key, item = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"\nError processing {item_key}: {e}")
+                results[i] = on_error(item, e) if on_error else None
+            else:
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps({'key': item_key, 'result': results[i]}) + "\n")
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+
+            if completed % 10 == 0 or completed == len(pending):
+                print(f"{desc}: {completed}/{len(pending)} rows", end="\r")
+    finally:
+        # On Ctrl-C drop the queued rows; everything completed so far is
+        # already in the checkpoint
+        executor.shutdown(wait=True, cancel_futures=True)
+        if checkpoint is not None:
+            checkpoint.close()
+
+    if errors:
+        print(f"\n{desc}: done, {errors} rows failed (run again to retry them)")
+    else:
+        print(f"\n{desc}: done")
+        if not keep_checkpoint:
+            clear_checkpoint(checkpoint_path)
+    return results
@@ -46,15 +46,32 @@ class MusicGenre(Enum):
     KPOP = "k-pop"
     OTHER = "other"
 
+def stored_dimensions(data):
+    """
+    (ai_level, intensity_level, sociality_level) precomputed by
+    scripts/08_score_personality_dimensions.py, or None if the row doesn't
+    have them (older survey files, unscorable answers)
+    """
+    try:
+        return (
+            AISpectrumLevel[data['ai_level']],
+            IntensityLevel[data['intensity_level']],
+            SocialityLevel[data['sociality_level']],
+        )
+    except (KeyError, TypeError):
+        return None
+
 def create_image_prompt_from_survey(data):
     """
     Generate musical avatar image prompt from survey data
     """
 
-    # Calculate interpreted dimensions
-    ai_embracer_level = calculate_ai_spectrum(data)  # Returns (enum, score)
-    intensity_level = calculate_intensity(data)  # Returns (enum, score)
-    sociality_level = calculate_sociality(data)  # Returns (enum, score)
+    # Interpreted dimensions: stored with the survey data, scored here only
+    # for rows that don't have them
+    levels = stored_dimensions(data)
+    if levels is None:
+        levels = (calculate_ai_spectrum(data)[0], calculate_intensity(data)[0], calculate_sociality(data)[0])
+    ai_level, intensity_level, sociality_level = levels
     favourite_band = data.get("extracted_favourite_band")
     favourite_genre = data.get("extracted_genre")
 
@@ -68,9 +85,9 @@ def create_image_prompt_from_survey(data):
     # Generate Musical Avatar Image Prompt
     avatar_prompt = generate_avatar_prompt(
         physical_desc=physical_desc,
-        ai_level=ai_embracer_level[0],
-        intensity_level=intensity_level[0],
-        sociality_level=sociality_level[0],
+        ai_level=ai_level,
+        intensity_level=intensity_level,
+        sociality_level=sociality_level,
         favourite_genre=favourite_genre,
         favourite_band=favourite_band
     )
@@ -190,26 +207,83 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
 
     return prompt
 
+# Answer mappings shared by the per-row scorers and their *_batch versions
+Q10_AI_LEVELS = {
+    "Yes – and I already have": AISpectrumLevel.EMBRACER,
+    "Sure I would — if it sounds good, why not?": AISpectrumLevel.CURIOUS,
+    "Maybe — I’m curious": AISpectrumLevel.CURIOUS,
+    "Not sure yet": AISpectrumLevel.UNCERTAIN,
+    "Nah — I prefer music made by real people": AISpectrumLevel.REJECTOR,
+}
+
+Q11_AI_LEVELS = {
+    "I’m into it — it keeps their legacy alive": AISpectrumLevel.EMBRACER,
+    "I’m unsure — it depends how it’s done": AISpectrumLevel.UNCERTAIN,
+    "Hadn’t thought about it before": AISpectrumLevel.UNCERTAIN,
+    "I don’t like it — it feels wrong": AISpectrumLevel.REJECTOR,
+}
+
+# Base intensity from Q1 (self-reported)
+Q1_INTENSITY = {
+    "I’m obsessed 🎵": 4,
+    "I like it, but don’t keep up": 2,
+    "I’m more of a casual listener": 1,
+    "Meh — it’s not a big part of my life": 0
+}
+
+# Q8: when they listen
+Q8_LISTEN_FIELDS = [
+    'Q8_Music_listen_time_GRID_1',  # Waking up
+    'Q8_Music_listen_time_GRID_2',  # Commuting
+    'Q8_Music_listen_time_GRID_3',  # Working out
+    'Q8_Music_listen_time_GRID_4',  # Cooking
+    'Q8_Music_listen_time_GRID_5',  # Cleaning
+    'Q8_Music_listen_time_GRID_6',  # Unwinding
+]
+
+LISTEN_FREQUENCY = {
+    'Never': 0,
+    'Sometimes': 1,
+    'Often': 2,
+    'Always': 3
+}
+
+# Q12: music bingo boxes counted towards intensity
+Q12_BINGO_FIELDS = [
+    'Q12_Music_bingo_1',  # breakup playlist
+    'Q12_Music_bingo_2',  # DJ on road trip
+    'Q12_Music_bingo_3',  # hype music
+    'Q12_Music_bingo_4',  # cried to song
+    # 'Q12_Music_bingo_5',  # flirting with songs
+    'Q12_Music_bingo_6',  # vibes playlist
+    'Q12_Music_bingo_7',  # replayed same song 10+ times
+]
+
+# Each answered field is +1 sociality
+SOCIALITY_FIELDS = [
+    'Q7_New_music_discover_3',  # Friend recs
+    'Q7_New_music_discover_7',  # Music blogs or critics
+    'Q12_Music_bingo_2',  # DJ on road trip
+    'Q12_Music_bingo_5',  # Shared a song to flirt
+    'Q13_Share_the_music_you_love_1',  # Texting links
+    'Q13_Share_the_music_you_love_2',  # Group chats
+    'Q13_Share_the_music_you_love_3',  # Social media
+    'Q13_Share_the_music_you_love_4',  # Curating playlists
+    'Q13_Share_the_music_you_love_5',  # In-person
+]
+
+# Q14: response to a friend sharing a song
+Q14_FRIEND_SHARE = {
+    "Listen right away": 2,
+    "Save it for later": 1,
+    "Depends on the friend!": 1,
+    "Pretend I listened 😬": 0
+}
+
 def calculate_ai_spectrum(data):
     """Map answers to AI attitude spectrum"""
-    q10_map = {
-        "Yes – and I already have": AISpectrumLevel.EMBRACER,
-        "Sure I would — if it sounds good, why not?": AISpectrumLevel.CURIOUS,
-        "Maybe — I’m curious": AISpectrumLevel.CURIOUS,
-        "Not sure yet": AISpectrumLevel.UNCERTAIN,
-        "Nah — I prefer music made by real people": AISpectrumLevel.REJECTOR,
-    }
-
-    q11_map = {
-        "I’m into it — it keeps their legacy alive": AISpectrumLevel.EMBRACER,
-        "I’m unsure — it depends how it’s done": AISpectrumLevel.UNCERTAIN,
-        "Hadn’t thought about it before": AISpectrumLevel.UNCERTAIN,
-        "I don’t like it — it feels wrong": AISpectrumLevel.REJECTOR,
-    }
-
-
-    q10_answer = q10_map.get(data['Q10_Songs_by_AI'])
-    q11_answer = q11_map.get(data['Q11_Use_of_dead_artists_voice_feelings'])
+    q10_answer = Q10_AI_LEVELS.get(data['Q10_Songs_by_AI'])
+    q11_answer = Q11_AI_LEVELS.get(data['Q11_Use_of_dead_artists_voice_feelings'])
     
     if (q10_answer == AISpectrumLevel.EMBRACER):
         ai_level = AISpectrumLevel.EMBRACER
@@ -222,54 +296,21 @@ def calculate_intensity(data):
     Calculate music intensity from multiple signals
     """
     
-    # Base intensity from Q1 (self-reported)
-    q1_map = {
-        "I’m obsessed 🎵": 4,
-        "I like it, but don’t keep up": 2,
-        "I’m more of a casual listener": 1,
-        "Meh — it’s not a big part of my life": 0
-    }
-    base_score = q1_map.get(data['Q1_Relationship_with_music'], 2)
+    base_score = Q1_INTENSITY.get(data['Q1_Relationship_with_music'], 2)
     
     # Behavioral frequency from Q8 (when they listen)
     # Sum up: Never=0, Sometimes=1, Often=2, Always=3
     q8_score = 0
-    q8_fields = [
-        'Q8_Music_listen_time_GRID_1',  # Waking up
-        'Q8_Music_listen_time_GRID_2',  # Commuting
-        'Q8_Music_listen_time_GRID_3',  # Working out
-        'Q8_Music_listen_time_GRID_4',  # Cooking
-        'Q8_Music_listen_time_GRID_5',  # Cleaning
-        'Q8_Music_listen_time_GRID_6',  # Unwinding
-    ]
-    
-    frequency_map = {
-        'Never': 0,
-        'Sometimes': 1,
-        'Often': 2,
-        'Always': 3
-    }
-    
-    for field in q8_fields:
+    for field in Q8_LISTEN_FIELDS:
         if field in data:
-            q8_score += frequency_map.get(data[field], 0)
+            q8_score += LISTEN_FREQUENCY.get(data[field], 0)
     
     # Normalize Q8 to 0-4 scale (max possible is 18)
     q8_normalized = (q8_score / 18) * 4
     
     # Engagement depth from Q12 (music bingo)
     # Count how many boxes they checked
-    q12_fields = [
-        'Q12_Music_bingo_1',  # breakup playlist
-        'Q12_Music_bingo_2',  # DJ on road trip
-        'Q12_Music_bingo_3',  # hype music
-        'Q12_Music_bingo_4',  # cried to song
-        # 'Q12_Music_bingo_5',  # flirting with songs
-        'Q12_Music_bingo_6',  # vibes playlist
-        'Q12_Music_bingo_7',  # replayed same song 10+ times
-    ]
-    
-    q12_count = sum(1 for field in q12_fields if field in data and pd.notna(data[field]))
+    q12_count = sum(1 for field in Q12_BINGO_FIELDS if field in data and pd.notna(data[field]))
     
     # Normalize Q12 to 0-4 scale (max is 6)
     q12_normalized = (q12_count / 6) * 4
@@ -300,44 +341,11 @@ def calculate_sociality(data):
     Music Hoarder ←→ Casual Sharer ←→ Active Curator
     """
 
-    score = 0
-
-    # Discovery through social channels (+1 each)
-    if pd.notna(data.get('Q7_New_music_discover_3')):  # Friend recs
-        score += 1
-    if pd.notna(data.get('Q7_New_music_discover_7')):  # Music blogs or critics
-        score += 1
-
-    # Music bingo social behaviors (+1 each)
-    if pd.notna(data.get('Q12_Music_bingo_2')):  # DJ on road trip
-        score += 1
-    if pd.notna(data.get('Q12_Music_bingo_5')):  # Shared a song to flirt
-        score += 1
-
-    # Sharing methods (count how many ways they share)
-    sharing_count = 0
-    if pd.notna(data.get('Q13_Share_the_music_you_love_1')):  # Texting links
-        sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_2')):  # Group chats
-        sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_3')):  # Social media
-        sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_4')):  # Curating playlists
-        sharing_count += 1  # Weighted higher - more curation effort
-    if pd.notna(data.get('Q13_Share_the_music_you_love_5')):  # In-person
-        sharing_count += 1
-
-    # Add sharing count to score
-    score += sharing_count
+    # Discovery through social channels, social bingo boxes and each way they share (+1 each)
+    score = sum(1 for field in SOCIALITY_FIELDS if pd.notna(data.get(field)))
 
     # Response to friend sharing music (+bonus points for engagement)
-    q14_map = {
-        "Listen right away": 2,
-        "Save it for later": 1,
-        "Depends on the friend!": 1,
-        "Pretend I listened 😬": 0
-    }
-    score += q14_map.get(data.get('Q14_Friend_shares_a_song', ''), 0)
+    score += Q14_FRIEND_SHARE.get(data.get('Q14_Friend_shares_a_song', ''), 0)
 
     # Normalize and categorize
     # Max possible: 2 (discovery) + 2 (bingo) + 5 (sharing) + 2 (friend response) = 11
@@ -355,3 +363,102 @@ def calculate_sociality(data):
         return SocialityLevel.HOARDER, normalized_score
 
 
+# --- Whole-DataFrame scoring ---
+# Same rules as the per-row functions above, as column operations. Each
+# returns (levels, scores): level names and scores aligned with df's index.
+
+def _level_names(levels, codes):
+    """Enum member names for integer level codes (None where the code is NaN)"""
+    names = np.array([None] + [levels(value).name for value in range(4)], dtype=object)
+    return pd.Series(names[np.nan_to_num(codes.to_numpy(dtype=float), nan=-1).astype(int) + 1], index=codes.index)
+
+def _answered(df, fields):
+    """Per row, how many of fields (those present in df) are answered"""
+    present = [field for field in fields if field in df.columns]
+    return df[present].notna().sum(axis=1) if present else pd.Series(0, index=df.index)
+
+def calculate_ai_spectrum_batch(df):
+    """calculate_ai_spectrum for every row; rows it would reject get None/NaN"""
+    q10 = df['Q10_Songs_by_AI'].map({answer: level.value for answer, level in Q10_AI_LEVELS.items()})
+    q11 = df['Q11_Use_of_dead_artists_voice_feelings'].map({answer: level.value for answer, level in Q11_AI_LEVELS.items()})
+
+    # An embracing Q10 answer wins outright; otherwise both answers must be known
+    codes = q10.where(q10 == AISpectrumLevel.EMBRACER.value, np.maximum(q10, q11)).astype(float)
+    return _level_names(AISpectrumLevel, codes), codes / 3.0
+
+def calculate_intensity_batch(df):
+    """calculate_intensity for every row"""
+    base_score = df['Q1_Relationship_with_music'].map(Q1_INTENSITY).fillna(2)
+
+    q8_score = pd.Series(0, index=df.index)
+    for field in Q8_LISTEN_FIELDS:
+        if field in df.columns:
+            q8_score = q8_score + df[field].map(LISTEN_FREQUENCY).fillna(0)
+    q8_normalized = (q8_score / 18) * 4
+
+    q12_normalized = (_answered(df, Q12_BINGO_FIELDS) / 6) * 4
+
+    final_score = (
+        base_score * 0.4 +
+        q8_normalized * 0.35 +
+        q12_normalized * 0.25
+    )
+    normalized_score = final_score / 4.0
+
+    codes = pd.Series(np.select(
+        [normalized_score >= 3.5/4.0, normalized_score >= 2.5/4.0, normalized_score >= 1.5/4.0],
+        [IntensityLevel.OBSESSED.value, IntensityLevel.ENGAGED.value, IntensityLevel.CASUAL.value],
+        IntensityLevel.MINIMAL.value
+    ), index=df.index)
+    return _level_names(IntensityLevel, codes), normalized_score
+
+def calculate_sociality_batch(df):
+    """calculate_sociality for every row"""
+    score = _answered(df, SOCIALITY_FIELDS)
+    if 'Q14_Friend_shares_a_song' in df.columns:
+        score = score + df['Q14_Friend_shares_a_song'].map(Q14_FRIEND_SHARE).fillna(0)
+    normalized_score = score / 11.0
+
+    codes = pd.Series(np.select(
+        [normalized_score >= 6.0/11.0, normalized_score >= (4.0/11.0), normalized_score >= (2/11.0)],
+        [SocialityLevel.ACTIVE_CURATOR.value, SocialityLevel.SOCIAL_LISTENER.value, SocialityLevel.CASUAL_SHARER.value],
+        SocialityLevel.HOARDER.value
+    ), index=df.index)
+    return _level_names(SocialityLevel, codes), normalized_score
+
+def score_personalities(df):
+    """
+    All three dimensions for every row, in the columns the analysis uses:
+    ai_level/ai_score, intensity_level/intensity_score, sociality_level/sociality_score
+    """
+    scores = pd.DataFrame(index=df.index)
+    for name, calculate in (('ai', calculate_ai_spectrum_batch),
+                            ('intensity', calculate_intensity_batch),
+                            ('sociality', calculate_sociality_batch)):
+        levels, values = calculate(df)
+        scores[f'{name}_level'] = levels
+        scores[f'{name}_score'] = values.astype(float)
+    return scores
+
+def check_batch_scores(df):
+    """
+    Compare score_personalities() with the per-row functions on every row of
+    df. Levels and scores must be exactly equal (no tolerance); rows the
+    per-row AI scorer rejects must be None/NaN. Returns the mismatches.
+    """
+    batch = score_personalities(df)
+    scalar = {'ai': calculate_ai_spectrum, 'intensity': calculate_intensity, 'sociality': calculate_sociality}
+    mismatches = []
+    for index, row in df.iterrows():
+        for name, calculate in scalar.items():
+            try:
+                level, score = calculate(row)
+                expected = (level.name, float(score))
+            except (AttributeError, TypeError, ValueError):
+                expected = (None, None)
+            level_name = batch.at[index, f'{name}_level']
+            score = batch.at[index, f'{name}_score']
+            actual = (level_name, None if pd.isna(score) else float(score))
+            if actual != expected:
+                mismatches.append((index, name, expected, actual))
+    return mismatches
@@ -0,0 +1,178 @@
+"""
+Local genre classifier for stage 02.
+
+A logistic regression over TF-IDF of a respondent's answers (Q3, Q9, Q16,
+Q18, Q19) is trained on the genres the model already extracted into
+02_music_survey_with_genres.csv. Rows it is confident about are labelled
+locally; the rest still go to the model.
+
+The model call also names the favourite band, so a row is only labelled
+locally when its answers mention exactly one band the model has already
+picked for someone else (compared as normalize_artist_name() keys);
+otherwise the band would be lost.
+
+    classifier = train_genre_classifier(previous_output_df)   # needs scikit-learn
+    save_genre_classifier(classifier)
+    results = load_genre_classifier().label(rows)   # result dict, or None -> ask the model
+
+The confidence cut is calibrated when training: it is the lowest predicted
+probability at which cross-validated predictions still agree with the
+model's genre TARGET_ACCURACY of the time. Only rows the model labelled
+(genre_source 'model') are trained on, so local labels never feed back in.
+"""
+import os
+import pickle
+
+from helpers.artist_catalog import normalize_artist_name
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'processed', 'genre_classifier.pkl')
+
+GENRE_FIELDS = [
+    'Q3_artist_that_pulled_you_in',
+    'Q9_Music_preference_these_days',
+    'Q16_Music_guilty_pleasure_text_OE',
+    'Q18_Life_theme_song',
+    'Q19_Lyric_that_stuck_with_you',
+]
+BAND_FIELDS = [field for field in GENRE_FIELDS if field != 'Q9_Music_preference_these_days']
+
+TARGET_ACCURACY = 0.85
+MIN_SUPPORT = 20
+MIN_TRAINING_ROWS = 100
+# Rarer genres are left to the model (and can't be split into folds)
+MIN_GENRE_ROWS = 5
+FOLDS = 5
+# Shorter band keys ("abba" aside) match too many words by accident
+MIN_BAND_KEY_LENGTH = 4
+HIGH_CONFIDENCE = 0.9
+
+
+def _answer(row, field):
+    value = row.get(field)
+    return value.strip() if isinstance(value, str) else ''
+
+
+def genre_text(row):
+    """The text the classifier sees for one respondent"""
+    parts = [_answer(row, field) for field in GENRE_FIELDS]
+    return ' \n '.join(part for part in parts if part)
+
+
+class GenreClassifier:
+    """Trained pipeline, its confidence cut and the known bands (see module docstring)"""
+
+    def __init__(self, pipeline, min_confidence, bands):
+        self.pipeline = pipeline
+        self.min_confidence = min_confidence
+        self.bands = bands  # normalised key -> display name
+
+    def mentioned_band(self, row):
+        """The one known band the answers mention, or None (none or several)"""
+        text = f" {' '.join(normalize_artist_name(_answer(row, field)) for field in BAND_FIELDS)} "
+        found = {key for key in self.bands if f" {key} " in text}
+        # "queen" inside "queen latifah" is the longer name
+        found = {key for key in found if not any(key != other and key in other for other in found)}
+        return self.bands[found.pop()] if len(found) == 1 else None
+
+    def label(self, rows):
+        """A stage 02 result for every row it is sure about, None for the rest"""
+        if self.min_confidence is None or not rows:
+            return [None] * len(rows)
+
+        texts = [genre_text(row) for row in rows]
+        probabilities = self.pipeline.predict_proba(texts)
+        classes = self.pipeline.classes_
+
+        results = []
+        for row, text, row_probabilities in zip(rows, texts, probabilities):
+            best = row_probabilities.argmax()
+            confidence = row_probabilities[best]
+            band = self.mentioned_band(row) if text and confidence >= self.min_confidence else None
+            if band is None:
+                results.append(None)
+                continue
+            results.append({
+                'genre': classes[best],
+                'favourite_band': band,
+                'confidence': 'high' if confidence >= HIGH_CONFIDENCE else 'medium',
+                'source': 'local',
+            })
+        return results
+
+
+def _calibrate(probabilities, correct):
+    # Lowest cut whose accepted rows are still TARGET_ACCURACY right
+    pairs = sorted(zip(probabilities, correct), reverse=True)
+    best = None
+    right = 0
+    for seen, (probability, is_right) in enumerate(pairs, 1):
+        right += is_right
+        if seen >= MIN_SUPPORT and right / seen >= TARGET_ACCURACY:
+            best = probability
+    return best
+
+
+def train_genre_classifier(df):
+    """
+    Classifier trained on the model-labelled rows of a stage 02 output, or
+    None when there are too few of them
+    """
+    # Only needed when training; the pipeline itself doesn't depend on it
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import cross_val_predict
+    from sklearn.pipeline import make_pipeline
+
+    labelled = df[df['extracted_genre'].notna() & df['extraction_confidence'].isin(['high', 'medium'])]
+    if 'genre_source' in labelled.columns:
+        labelled = labelled[labelled['genre_source'] != 'local']
+    counts = labelled['extracted_genre'].value_counts()
+    labelled = labelled[labelled['extracted_genre'].isin(counts[counts >= MIN_GENRE_ROWS].index)]
+    rows = [row for _, row in labelled.iterrows()]
+    texts = [genre_text(row) for row in rows]
+    genres = labelled['extracted_genre'].tolist()
+    if len(rows) < MIN_TRAINING_ROWS:
+        print(f"Genre classifier: only {len(rows)} model-labelled rows, need {MIN_TRAINING_ROWS}")
+        return None
+
+    def make_model():
+        return make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, min_df=2),
+            LogisticRegression(max_iter=2000, C=10.0),
+        )
+
+    probabilities = cross_val_predict(make_model(), texts, genres, cv=FOLDS, method='predict_proba')
+    classes = sorted(set(genres))
+    predicted = [classes[i] for i in probabilities.argmax(axis=1)]
+    min_confidence = _calibrate(probabilities.max(axis=1), [p == g for p, g in zip(predicted, genres)])
+
+    pipeline = make_model().fit(texts, genres)
+    bands = {}
+    for band in df['extracted_favourite_band'].dropna():
+        key = normalize_artist_name(band)
+        if len(key) >= MIN_BAND_KEY_LENGTH:
+            bands.setdefault(key, band)
+
+    print(f"Genre classifier: trained on {len(rows)} rows, {len(bands)} known bands, "
+          f"confidence cut {min_confidence if min_confidence is None else round(float(min_confidence), 3)}")
+    return GenreClassifier(pipeline, min_confidence, bands)
+
+
+def save_genre_classifier(classifier, path=MODEL_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(classifier, f)
+    os.replace(tmp_path, path)
+
+
+def load_genre_classifier(path=MODEL_PATH):
+    """The saved classifier, or None (not trained yet, or scikit-learn missing)"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except ImportError as e:
+        print(f"Genre classifier unavailable ({e}); every row goes to the model")
+        return None
@@ -1,6 +1,47 @@
 import pandas as pd
 import numpy as np
 
+# Multi-select answers listed in the identity string: (column, phrase)
+DISCOVERY_METHODS = [
+    ('Q7_New_music_discover_1', "TikTok/Reels"),
+    ('Q7_New_music_discover_2', "streaming playlists"),
+    ('Q7_New_music_discover_3', "friend recommendations"),
+    ('Q7_New_music_discover_4', "movie/TV soundtracks"),
+    ('Q7_New_music_discover_5', "Shazam"),
+    ('Q7_New_music_discover_6', "music blogs"),
+    ('Q7_New_music_discover_7', "replays favorites"),
+]
+
+# Listening contexts answered 'Often' or 'Always'
+LISTEN_CONTEXTS = [
+    ('Q8_Music_listen_time_GRID_1', 'waking up'),
+    ('Q8_Music_listen_time_GRID_2', 'commuting'),
+    ('Q8_Music_listen_time_GRID_3', 'working out'),
+    ('Q8_Music_listen_time_GRID_4', 'cooking'),
+    ('Q8_Music_listen_time_GRID_5', 'cleaning'),
+    ('Q8_Music_listen_time_GRID_6', 'unwinding'),
+]
+FREQUENT = ['Often', 'Always']
+
+BEHAVIORS = [
+    ('Q12_Music_bingo_1', "makes breakup playlists"),
+    ('Q12_Music_bingo_2', "play DJ on road trips"),
+    ('Q12_Music_bingo_3', "use music for motivation"),
+    ('Q12_Music_bingo_4', "crie to sad songs"),
+    ('Q12_Music_bingo_5', "share songs romantically"),
+    ('Q12_Music_bingo_6', "make vibe playlists"),
+    ('Q12_Music_bingo_7', "replay same song many times"),
+]
+
+SHARING_METHODS = [
+    ('Q13_Share_the_music_you_love_1', "text links"),
+    ('Q13_Share_the_music_you_love_2', "group chats"),
+    ('Q13_Share_the_music_you_love_3', "social media"),
+    ('Q13_Share_the_music_you_love_4', "curates playlists"),
+    ('Q13_Share_the_music_you_love_5', "in-person"),
+]
+NO_SHARING = 'Q13_Share_the_music_you_love_6'
+
 def create_survey_identity_string(row):
     """
     Survey respondent identity string
@@ -28,14 +69,7 @@ def create_survey_identity_string(row):
     parts.append(f"Current music preference: {row['Q9_Music_preference_these_days']}")
     
     # Current discovery methods
-    discovery_methods = []
-    if pd.notna(row['Q7_New_music_discover_1']): discovery_methods.append("TikTok/Reels")
-    if pd.notna(row['Q7_New_music_discover_2']): discovery_methods.append("streaming playlists")
-    if pd.notna(row['Q7_New_music_discover_3']): discovery_methods.append("friend recommendations")
-    if pd.notna(row['Q7_New_music_discover_4']): discovery_methods.append("movie/TV soundtracks")
-    if pd.notna(row['Q7_New_music_discover_5']): discovery_methods.append("Shazam")
-    if pd.notna(row['Q7_New_music_discover_6']): discovery_methods.append("music blogs")
-    if pd.notna(row['Q7_New_music_discover_7']): discovery_methods.append("replays favorites")
+    discovery_methods = [method for field, method in DISCOVERY_METHODS if pd.notna(row[field])]
     if discovery_methods:
         parts.append(f"Discover new music through: {', '.join(discovery_methods)}")
     
@@ -44,42 +78,22 @@ def create_survey_identity_string(row):
     parts.append(f"View on AI using dead artists' voices: {row['Q11_Use_of_dead_artists_voice_feelings']}")
     
     # Listening frequency (intensity signal)
-    listening_contexts = []
-    listen_map = {
-        'Q8_Music_listen_time_GRID_1': 'waking up',
-        'Q8_Music_listen_time_GRID_2': 'commuting',
-        'Q8_Music_listen_time_GRID_3': 'working out',
-        'Q8_Music_listen_time_GRID_4': 'cooking',
-        'Q8_Music_listen_time_GRID_5': 'cleaning',
-        'Q8_Music_listen_time_GRID_6': 'unwinding'
-    }
-    for field, context in listen_map.items():
-        if pd.notna(row[field]) and row[field] in ['Often', 'Always']:
-            listening_contexts.append(context)
+    listening_contexts = [
+        context for field, context in LISTEN_CONTEXTS
+        if pd.notna(row[field]) and row[field] in FREQUENT
+    ]
     if listening_contexts:
         parts.append(f"Listen to music often/always when: {', '.join(listening_contexts)}")
     
     # Engagement behaviors
-    behaviors = []
-    if pd.notna(row['Q12_Music_bingo_1']): behaviors.append("makes breakup playlists")
-    if pd.notna(row['Q12_Music_bingo_2']): behaviors.append("play DJ on road trips")
-    if pd.notna(row['Q12_Music_bingo_3']): behaviors.append("use music for motivation")
-    if pd.notna(row['Q12_Music_bingo_4']): behaviors.append("crie to sad songs")
-    if pd.notna(row['Q12_Music_bingo_5']): behaviors.append("share songs romantically")
-    if pd.notna(row['Q12_Music_bingo_6']): behaviors.append("make vibe playlists")
-    if pd.notna(row['Q12_Music_bingo_7']): behaviors.append("replay same song many times")
+    behaviors = [behavior for field, behavior in BEHAVIORS if pd.notna(row[field])]
     if behaviors:
         parts.append(f"Music behaviors: {', '.join(behaviors)}")
     
     # Sharing behavior (social dimension)
-    sharing_methods = []
-    if pd.notna(row['Q13_Share_the_music_you_love_1']): sharing_methods.append("text links")
-    if pd.notna(row['Q13_Share_the_music_you_love_2']): sharing_methods.append("group chats")
-    if pd.notna(row['Q13_Share_the_music_you_love_3']): sharing_methods.append("social media")
-    if pd.notna(row['Q13_Share_the_music_you_love_4']): sharing_methods.append("curates playlists")
-    if pd.notna(row['Q13_Share_the_music_you_love_5']): sharing_methods.append("in-person")
-    
-    if pd.notna(row['Q13_Share_the_music_you_love_6']):
+    sharing_methods = [method for field, method in SHARING_METHODS if pd.notna(row[field])]
+    
+    if pd.notna(row[NO_SHARING]):
         parts.append("Don't share music")
     elif sharing_methods:
         parts.append(f"Share music by: {', '.join(sharing_methods)}")
@@ -102,6 +116,80 @@ def create_survey_identity_string(row):
     return "\n".join(parts)
 
 
+# --- Whole-DataFrame builder ---
+# create_survey_identity_string as column operations: each line is built for
+# all rows at once as "<line>\n" or "" (numpy object arrays), and every row's
+# lines are joined once at the end.
+
+def _text(df, column):
+    """str() of every value, as the per-row f-strings format them"""
+    return df[column].map(str).to_numpy(dtype=object)
+
+def _line(label, values, mask=None):
+    line = label + values + "\n"
+    return line if mask is None else np.where(mask, line, "")
+
+def _listing(label, items, mask=None):
+    """
+    The "<label>a, b, c" line for multi-select (selected, phrase) items; empty
+    for rows with nothing selected (or outside mask)
+    """
+    listed = np.full(len(items[0][0]), "", dtype=object)
+    for selected, phrase in items:
+        listed = listed + np.where(selected, phrase + ", ", "")
+    has_items = listed != ""
+    if mask is not None:
+        has_items &= mask
+    # Drop the trailing ", " of each list
+    listed = np.array([value[:-2] for value in listed], dtype=object)
+    return _line(label, listed, has_items)
+
+def create_survey_identity_strings(df):
+    """
+    create_survey_identity_string for every row of df, as a Series aligned
+    with df.index. Each string is byte-identical to the per-row function's
+    output for that row (see check_identity_strings).
+    """
+    def answered(column):
+        return df[column].notna().to_numpy()
+
+    def selected(items):
+        return [(answered(field), phrase) for field, phrase in items]
+
+    shares_nothing = answered(NO_SHARING)
+    lines = [
+        _line("Music relationship: ", _text(df, 'Q1_Relationship_with_music')),
+        _line("First discovered music through: ", _text(df, 'Q2_Discovering_music')),
+        _line("First artist that pulled you in: ", _text(df, 'Q3_artist_that_pulled_you_in'),
+              answered('Q3_artist_that_pulled_you_in')),
+        _line("Current music preference: ", _text(df, 'Q9_Music_preference_these_days')),
+        _listing("Discover new music through: ", selected(DISCOVERY_METHODS)),
+        _line("View on AI-generated music: ", _text(df, 'Q10_Songs_by_AI')),
+        _line("View on AI using dead artists' voices: ", _text(df, 'Q11_Use_of_dead_artists_voice_feelings')),
+        _listing("Listen to music often/always when: ", [
+            (df[field].isin(FREQUENT).to_numpy(), context) for field, context in LISTEN_CONTEXTS
+        ]),
+        _listing("Music behaviors: ", selected(BEHAVIORS)),
+        np.where(shares_nothing, "Don't share music\n", ""),
+        _listing("Share music by: ", selected(SHARING_METHODS), ~shares_nothing),
+        _line("When friend shares music: ", _text(df, 'Q14_Friend_shares_a_song')),
+        _line("Guilty pleasure attitude: ", _text(df, 'Q15_Music_guilty_pleasure')),
+        _line("Guilty pleasure song: ", _text(df, 'Q16_Music_guilty_pleasure_text_OE'),
+              answered('Q16_Music_guilty_pleasure_text_OE')),
+        _line("Genre preference: ", _text(df, 'extracted_genre'), answered('extracted_genre')),
+        _line("Favorite artist: ", _text(df, 'extracted_favourite_band'), answered('extracted_favourite_band')),
+    ]
+
+    # One join per row; the last line's newline goes ("\n".join has none)
+    strings = ["".join(parts)[:-1] for parts in zip(*lines)]
+    return pd.Series(strings, index=df.index, dtype=object)
+
+def check_identity_strings(df):
+    """Index labels of rows where the column-wise builder differs from the per-row function"""
+    batch = create_survey_identity_strings(df)
+    return [index for index, row in df.iterrows() if batch[index] != create_survey_identity_string(row)]
+
+
 def create_user_identity_string(answers):
     """
     User quiz identity string
@@ -0,0 +1,193 @@
+"""
+Shared Spotify search for the pipeline stages (05 entity links, 06 favourite
+artist URLs).
+
+- The client-credentials token is fetched once and reused until shortly
+  before it expires (a 401 refreshes it early).
+- Every query's result is kept in an SQLite cache on disk, including "not
+  found", so reruns and overlapping stages only search for new names.
+  Negative results expire after SPOTIFY_NEGATIVE_TTL_DAYS (default 30) so
+  new releases get picked up eventually; errors are never cached.
+- Identical lookups running at the same time share one request.
+
+    resolver = get_spotify_resolver()
+    resolver.search("Bring Me The Horizon", 'artist')
+    # {'name': ..., 'url': ..., 'type': 'artist'} or None
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+from singleflight import SingleFlight
+from upstream import get_spotify_session, SPOTIFY_ACCOUNTS_URL, SPOTIFY_API_URL
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'cache', 'spotify.sqlite')
+
+# Refresh the token this long before Spotify says it expires
+TOKEN_EXPIRY_MARGIN = 60
+
+
+def normalize_query(query):
+    """Cache key form of a query: case and whitespace don't matter"""
+    return ' '.join(str(query).split()).casefold()
+
+
+def parse_search_result(data, search_type):
+    """First track/artist of a search response in the shape the pipeline stores"""
+    if search_type == 'track' and data.get('tracks', {}).get('items'):
+        item = data['tracks']['items'][0]
+        return {
+            'name': item['name'],
+            'artist': item['artists'][0]['name'],
+            'url': item['external_urls']['spotify'],
+            'type': 'track'
+        }
+    elif search_type == 'artist' and data.get('artists', {}).get('items'):
+        item = data['artists']['items'][0]
+        return {
+            'name': item['name'],
+            'url': item['external_urls']['spotify'],
+            'type': 'artist'
+        }
+    return None
+
+
+class SpotifyResolver:
+    """Cached, deduplicated Spotify search (see module docstring)"""
+
+    def __init__(self, client_id, client_secret, cache_path=DEFAULT_CACHE_PATH, negative_ttl=30 * 86400):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.negative_ttl = negative_ttl
+
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+        self._flight = SingleFlight('spotify_search')
+        self._stats = {'cache_hits': 0, 'searches': 0, 'token_requests': 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
+        # WAL lets 05 and 06 share the cache when they run at the same time
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS lookups ('
+            ' search_type TEXT NOT NULL,'
+            ' query TEXT NOT NULL,'
+            ' result TEXT,'
+            ' fetched_at REAL NOT NULL,'
+            ' PRIMARY KEY (search_type, query))'
+        )
+        self._db.commit()
+
+    # --- token ---
+
+    def token(self, force_refresh=False):
+        """The client-credentials token, fetched only when missing or about to expire"""
+        with self._token_lock:
+            if force_refresh or self._token is None or time.time() >= self._token_expires:
+                response = get_spotify_session().post(f'{SPOTIFY_ACCOUNTS_URL}/api/token', {
+                    'grant_type': 'client_credentials',
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                })
+                response.raise_for_status()
+                auth_data = response.json()
+                self._stats['token_requests'] += 1
+                self._token = auth_data['access_token']
+                self._token_expires = time.time() + auth_data.get('expires_in', 3600) - TOKEN_EXPIRY_MARGIN
+            return self._token
+
+    # --- cache ---
+
+    def _cached(self, search_type, query):
+        """(found, result) from the disk cache; stale negative entries count as not found"""
+        with self._db_lock:
+            row = self._db.execute(
+                'SELECT result, fetched_at FROM lookups WHERE search_type = ? AND query = ?',
+                (search_type, query)
+            ).fetchone()
+        if row is None:
+            return False, None
+        result, fetched_at = row
+        if result is None:
+            if self.negative_ttl is not None and time.time() - fetched_at > self.negative_ttl:
+                return False, None
+            return True, None
+        return True, json.loads(result)
+
+    def _store(self, search_type, query, result):
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO lookups (search_type, query, result, fetched_at) VALUES (?, ?, ?, ?)',
+                (search_type, query, json.dumps(result) if result is not None else None, time.time())
+            )
+            self._db.commit()
+
+    # --- search ---
+
+    def _search_upstream(self, query, search_type):
+        params = {
+            'q': query,
+            'type': search_type,
+            'limit': 1
+        }
+        for attempt in range(2):
+            headers = {'Authorization': f'Bearer {self.token(force_refresh=attempt > 0)}'}
+            response = get_spotify_session().get(f'{SPOTIFY_API_URL}/v1/search', headers=headers, params=params)
+            # A 401 means the token was revoked or expired early: refresh once
+            if response.status_code != 401:
+                break
+        response.raise_for_status()
+        with self._db_lock:
+            self._stats['searches'] += 1
+        return parse_search_result(response.json(), search_type)
+
+    def _lookup(self, query, search_type, key):
+        # Re-check under the flight: a previous leader may have just stored it
+        found, result = self._cached(search_type, key)
+        if found:
+            return result
+        result = self._search_upstream(query, search_type)
+        self._store(search_type, key, result)
+        return result
+
+    def search(self, query, search_type='track'):
+        """
+        Best match for query, or None if Spotify has nothing. Network and HTTP
+        errors propagate (and are not cached).
+        """
+        key = normalize_query(query)
+        found, result = self._cached(search_type, key)
+        if found:
+            with self._db_lock:
+                self._stats['cache_hits'] += 1
+            return result
+        return self._flight.do((search_type, key), self._lookup, query, search_type, key)
+
+    def stats(self):
+        with self._db_lock:
+            return dict(self._stats, coalesced=self._flight.stats()['coalesced'])
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_spotify_resolver():
+    """The process-wide resolver, configured from SPOTIFY_* environment variables"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = SpotifyResolver(
+                os.getenv('SPOTIFY_CLIENT_ID'),
+                os.getenv('SPOTIFY_CLIENT_SECRET'),
+                cache_path=os.getenv('SPOTIFY_CACHE_PATH', DEFAULT_CACHE_PATH),
+                negative_ttl=float(os.getenv('SPOTIFY_NEGATIVE_TTL_DAYS', 30)) * 86400,
+            )
+        return _resolver
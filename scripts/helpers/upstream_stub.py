@@ -0,0 +1,476 @@
+"""
+Local stand-in for the OpenAI and Spotify endpoints we use, for running the
+app and pipeline offline and exercising the retry/circuit-breaker behaviour
+in src/upstream.py.
+
+Usage:
+    python scripts/helpers/upstream_stub.py --port 8089
+    export OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+    export SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8089
+    export SPOTIFY_API_URL=http://127.0.0.1:8089
+
+/v1/files and /v1/batches are implemented too, so the pipeline's --batch
+mode (scripts/helpers/batch_mode.py) can run end to end; a batch completes
+STUB_BATCH_SECONDS (default 0) after it is created.
+
+Faults can be injected at runtime:
+    curl -X POST localhost:8089/__stub__/faults \\
+         -d '{"path": "/v1/chat", "status": 503, "count": 3}'
+and request counts read back from GET /__stub__/stats.
+
+    python scripts/helpers/upstream_stub.py --check
+starts a stub in-process and runs the upstream client against it.
+"""
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import struct
+import base64
+import hashlib
+import random
+import itertools
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIMS = 1536
+
+
+def tiny_png(width=8, height=8, rgb=(102, 126, 234)):
+    """A valid solid-colour PNG, small enough to build on every request"""
+    raw = b''.join(b'\x00' + bytes(rgb) * width for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+def fake_embedding(text, dims=EMBEDDING_DIMS):
+    """Deterministic unit vector derived from the text"""
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vec = [rng.gauss(0, 1) for _ in range(dims)]
+    norm = sum(v * v for v in vec) ** 0.5
+    return [v / norm for v in vec]
+
+
+def parse_multipart(content_type, raw):
+    """Form fields of a multipart upload; the file part's bytes go under 'file'"""
+    from email.parser import BytesParser
+    from email.policy import HTTP
+
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + raw
+    )
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        payload = part.get_payload(decode=True)
+        if part.get_filename():
+            fields['filename'] = part.get_filename()
+            fields[name] = payload
+        else:
+            fields[name] = payload.decode('utf-8')
+    return fields
+
+
+class StubState:
+    """Fault plan and counters shared by all handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.faults = []
+        self.requests = {}
+        self.chat_content = os.getenv('STUB_CHAT_CONTENT', '{}')
+        self.latency = float(os.getenv('STUB_LATENCY', '0'))
+        self.batch_seconds = float(os.getenv('STUB_BATCH_SECONDS', '0'))
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+
+    def new_id(self, prefix):
+        return f"{prefix}-stub-{next(self._ids)}"
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def take_fault(self, path):
+        """Return the first pending fault matching path, consuming one use of it"""
+        with self.lock:
+            for fault in self.faults:
+                if path.startswith(fault.get('path', '')) and fault['count'] > 0:
+                    fault['count'] -= 1
+                    return fault
+        return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status, body, content_type='application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if 'application/json' in content_type and raw:
+            return json.loads(raw)
+        if 'application/x-www-form-urlencoded' in content_type:
+            from urllib.parse import parse_qs
+            return {k: v[0] for k, v in parse_qs(raw.decode('utf-8')).items()}
+        if 'multipart/form-data' in content_type:
+            return parse_multipart(content_type, raw)
+        return raw
+
+    def _handle(self, method):
+        path = self.path.split('?', 1)[0]
+        body = self._read_body() if method == 'POST' else None
+
+        if path.startswith('/__stub__/'):
+            return self._control(path, body)
+
+        self.state.count(path)
+        if self.state.latency:
+            time.sleep(self.state.latency)
+
+        fault = self.state.take_fault(path)
+        if fault:
+            if fault.get('delay'):
+                time.sleep(fault['delay'])
+            headers = {}
+            if fault.get('retry_after') is not None:
+                headers['Retry-After'] = str(fault['retry_after'])
+            return self._send_json(fault['status'], {'error': {'message': 'stub fault', 'type': 'stub'}}, headers)
+
+        route, args = ROUTES.get((method, path)), ()
+        if route is None:
+            for route_method, pattern, handler in PATTERN_ROUTES:
+                match = pattern.fullmatch(path)
+                if route_method == method and match:
+                    route, args = handler, match.groups()
+                    break
+        if route is None:
+            return self._send_json(404, {'error': {'message': f'no stub for {method} {path}'}})
+        status, payload = route(self, body, *args)
+        if isinstance(payload, bytes):
+            return self._send_bytes(status, payload)
+        return self._send_json(status, payload, self.rate_limit_headers())
+
+    def rate_limit_headers(self):
+        return {
+            'x-ratelimit-limit-requests': '500',
+            'x-ratelimit-remaining-requests': '499',
+            'x-ratelimit-reset-requests': '120ms',
+            'x-ratelimit-limit-tokens': '200000',
+            'x-ratelimit-remaining-tokens': '199000',
+            'x-ratelimit-reset-tokens': '300ms',
+        }
+
+    def _control(self, path, body):
+        if path == '/__stub__/faults':
+            faults = body if isinstance(body, list) else [body]
+            with self.state.lock:
+                self.state.faults.extend(dict(f) for f in faults)
+            return self._send_json(200, {'faults': len(self.state.faults)})
+        if path == '/__stub__/reset':
+            with self.state.lock:
+                self.state.faults.clear()
+                self.state.requests.clear()
+            return self._send_json(200, {})
+        if path == '/__stub__/stats':
+            with self.state.lock:
+                return self._send_json(200, {'requests': dict(self.state.requests)})
+        return self._send_json(404, {})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    # --- OpenAI ---
+
+    def chat_completions(self, body):
+        return 200, {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': self.state.chat_content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        }
+
+    def embeddings(self, body):
+        inputs = body.get('input')
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dims = body.get('dimensions') or EMBEDDING_DIMS
+        return 200, {
+            'object': 'list',
+            'model': body.get('model', 'stub'),
+            'data': [
+                {'object': 'embedding', 'index': i, 'embedding': fake_embedding(text, dims)}
+                for i, text in enumerate(inputs)
+            ],
+            'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+        }
+
+    def images(self, body):
+        image_b64 = base64.b64encode(tiny_png()).decode('ascii')
+        return 200, {
+            'created': int(time.time()),
+            'data': [{'b64_json': image_b64} for _ in range(body.get('n', 1))],
+        }
+
+    def upload_file(self, body):
+        file_id = self.state.new_id('file')
+        content = body.get('file', b'')
+        with self.state.lock:
+            self.state.files[file_id] = content
+        return 200, {
+            'id': file_id,
+            'object': 'file',
+            'bytes': len(content),
+            'created_at': int(time.time()),
+            'filename': body.get('filename', 'upload.jsonl'),
+            'purpose': body.get('purpose', 'batch'),
+            'status': 'processed',
+        }
+
+    def file_content(self, body, file_id):
+        with self.state.lock:
+            content = self.state.files.get(file_id)
+        if content is None:
+            return 404, {'error': {'message': f'no such file {file_id}'}}
+        return 200, content
+
+    def create_batch(self, body):
+        """Answer every request in the input file straight away; the batch reports done later"""
+        with self.state.lock:
+            content = self.state.files.get(body.get('input_file_id'))
+        if content is None:
+            return 400, {'error': {'message': 'unknown input_file_id'}}
+
+        lines = []
+        for line in content.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            status, payload = self.chat_completions(request['body'])
+            lines.append(json.dumps({
+                'id': f"batch_req_{len(lines) + 1}",
+                'custom_id': request['custom_id'],
+                'response': {'status_code': status, 'request_id': 'stub', 'body': payload},
+                'error': None,
+            }))
+
+        output_file_id = self.state.new_id('file')
+        batch_id = self.state.new_id('batch')
+        batch = {
+            'id': batch_id,
+            'object': 'batch',
+            'endpoint': body.get('endpoint'),
+            'input_file_id': body.get('input_file_id'),
+            'completion_window': body.get('completion_window', '24h'),
+            'created_at': int(time.time()),
+            'output_file_id': output_file_id,
+            'error_file_id': None,
+            'request_counts': {'total': len(lines), 'completed': len(lines), 'failed': 0},
+            'ready_at': time.monotonic() + self.state.batch_seconds,
+        }
+        with self.state.lock:
+            self.state.files[output_file_id] = ("\n".join(lines) + "\n").encode('utf-8')
+            self.state.batches[batch_id] = batch
+        return 200, self._batch_view(batch)
+
+    def get_batch(self, body, batch_id):
+        with self.state.lock:
+            batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return 404, {'error': {'message': f'no such batch {batch_id}'}}
+        return 200, self._batch_view(batch)
+
+    def _batch_view(self, batch):
+        view = {k: v for k, v in batch.items() if k != 'ready_at'}
+        if time.monotonic() < batch['ready_at']:
+            view.update(status='in_progress', output_file_id=None,
+                        request_counts=dict(batch['request_counts'], completed=0))
+        else:
+            view['status'] = 'completed'
+        return view
+
+    # --- Spotify ---
+
+    def spotify_token(self, body):
+        return 200, {'access_token': 'stub-token', 'token_type': 'Bearer', 'expires_in': 3600}
+
+    def spotify_search(self, body):
+        from urllib.parse import urlparse, parse_qs
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        query = params.get('q', '')
+        slug = hashlib.sha1(query.encode('utf-8')).hexdigest()[:22]
+        item = {'name': query, 'external_urls': {'spotify': f'https://open.spotify.com/{params.get("type", "track")}/{slug}'}}
+        if params.get('type') == 'artist':
+            return 200, {'artists': {'items': [item]}}
+        item['artists'] = [{'name': query}]
+        return 200, {'tracks': {'items': [item]}}
+
+
+ROUTES = {
+    ('POST', '/v1/chat/completions'): StubHandler.chat_completions,
+    ('POST', '/v1/embeddings'): StubHandler.embeddings,
+    ('POST', '/v1/images/generations'): StubHandler.images,
+    ('POST', '/api/token'): StubHandler.spotify_token,
+    ('GET', '/v1/search'): StubHandler.spotify_search,
+    ('POST', '/v1/files'): StubHandler.upload_file,
+    ('POST', '/v1/batches'): StubHandler.create_batch,
+}
+
+# Routes with an id in the path; groups are passed to the handler
+PATTERN_ROUTES = [
+    ('GET', re.compile(r'/v1/files/([\w-]+)/content'), StubHandler.file_content),
+    ('GET', re.compile(r'/v1/batches/([\w-]+)'), StubHandler.get_batch),
+]
+
+
+def start_stub_server(port=0):
+    """Start the stub on a background thread. Returns (server, base_url)."""
+    handler = type('BoundStubHandler', (StubHandler,), {'state': StubState()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_check():
+    """Exercise src/upstream.py against the stub: retries, then the circuit breaker"""
+    server, base_url = start_stub_server()
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ.setdefault('OPENAI_API_KEY', 'stub')
+    os.environ['UPSTREAM_BACKOFF_BASE'] = '0.01'
+    os.environ['UPSTREAM_BREAKER_RESET'] = '0.5'
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+    import upstream
+
+    state = server.RequestHandlerClass.state
+    client = upstream.get_openai_client()
+
+    def chat():
+        return client.chat.completions.create(model='stub', messages=[{'role': 'user', 'content': 'hi'}])
+
+    # Two 503s then success: the call should succeed after 3 attempts
+    state.faults.append({'path': '/v1/chat', 'status': 503, 'count': 2})
+    chat()
+    print(f"retry: succeeded after {state.requests['/v1/chat/completions']} attempts")
+
+    # A 429 with Retry-After is honoured and doesn't count against the breaker
+    state.faults.append({'path': '/v1/chat', 'status': 429, 'count': 1, 'retry_after': 0.05})
+    chat()
+    print(f"429: breaker state is {upstream.breakers['openai'].state}")
+
+    # Upstream down: the breaker opens and later calls fail without a request
+    state.faults.append({'path': '/v1/chat', 'status': 503, 'count': 100})
+    for _ in range(3):
+        try:
+            chat()
+        except Exception as e:
+            print(f"down: {type(e).__name__}")
+    before = state.requests['/v1/chat/completions']
+    try:
+        chat()
+    except Exception as e:
+        print(f"open: {type(e).__name__}, upstream requests made: {state.requests['/v1/chat/completions'] - before}")
+
+    # After reset_timeout a trial call closes the circuit again
+    state.faults.clear()
+    time.sleep(0.6)
+    chat()
+    print(f"recovered: breaker state is {upstream.breakers['openai'].state}")
+
+    # A 429 on the trial call closes the circuit (the upstream is up) rather than wedging it
+    state.faults.append({'path': '/v1/chat', 'status': 503, 'count': 100})
+    for _ in range(3):
+        try:
+            chat()
+        except Exception:
+            pass
+    state.faults.clear()
+    time.sleep(0.6)
+    state.faults.append({'path': '/v1/chat', 'status': 429, 'count': 1, 'retry_after': 0.05})
+    chat()
+    print(f"429 on trial: breaker state is {upstream.breakers['openai'].state}")
+    assert upstream.breakers['openai'].state == 'closed'
+
+    # Nor does an unexpected error during the trial
+    breaker = upstream.CircuitBreaker('check', failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+
+    def broken():
+        raise ValueError("not a connection error")
+
+    try:
+        upstream.send_with_retries(broken, upstream.retry_policy(), breaker, 'check')
+    except ValueError:
+        pass
+    trial = breaker.before_call()
+    print(f"error on trial: breaker lets the next trial through ({breaker.state})")
+
+    # A call admitted while closed that fails after the breaker opened doesn't free the trial slot
+    breaker.record_failure(trial=False)
+    breaker.end_call(False)
+    time.sleep(0.1)  # past reset_timeout: only the in-flight trial keeps it closed to callers
+    try:
+        breaker.before_call()
+        raise AssertionError("a second concurrent trial was let through")
+    except upstream.CircuitOpenError:
+        print("concurrent trial: refused while the first is in flight")
+    breaker.end_call(trial)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI/Spotify stub server")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--check', action='store_true', help="Run the upstream client against an in-process stub")
+    args = parser.parse_args()
+
+    if args.check:
+        run_check()
+    else:
+        server, base_url = start_stub_server(args.port)
+        print(f"Stub upstream listening on {base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,277 @@
+"""
+Run the data pipeline (stages 01-06 and 08) as a DAG.
+
+Each stage declares its input files, output files and the code that
+produces them. A stage is skipped when the hash of its inputs and code
+matches its last successful run and its outputs haven't changed since, so
+a routine refresh only rebuilds what actually changed. Stages
+whose dependencies are done run in parallel: after 02, the embeddings (04)
+and the entity -> artist catalog branch (05 -> 06) overlap.
+
+    python scripts/run_pipeline.py                      # everything that's stale
+    python scripts/run_pipeline.py --from entities      # start at 05
+    python scripts/run_pipeline.py --until genres --force
+    python scripts/run_pipeline.py --list
+
+Hashes of the last successful run of every stage are kept in
+data/processed/.pipeline_state.json.
+"""
+import os
+import sys
+import json
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+STATE_FILE = os.path.join(ROOT_DIR, 'data', 'processed', '.pipeline_state.json')
+
+# Paths are relative to the repository root. 'code' lists the files whose
+# changes alter the stage's output: every helper the script imports
+# (directly or through another helper) and any model or threshold file it
+# loads; 'batch' marks stages that take --batch.
+STAGES = [
+    {
+        'name': 'clean',
+        'script': 'scripts/01_clean_data.py',
+        # Calibrated pre-filter thresholds decide which rows reach the model
+        'code': ['scripts/helpers/executor.py', 'scripts/helpers/batch_mode.py', 'scripts/helpers/completion_cache.py',
+                 'scripts/helpers/effort_heuristics.py', 'src/upstream.py', 'src/rate_limiter.py',
+                 'data/processed/effort_thresholds.json'],
+        'inputs': ['data/raw/music_survey_data.csv'],
+        'outputs': ['data/processed/01_music_survey_high_effort.csv', 'data/processed/low_effort_report.txt'],
+        'batch': True,
+    },
+    {
+        'name': 'genres',
+        'script': 'scripts/02_extract_genre_bands.py',
+        # Loads the saved classifier; only --train (not run here) reads the previous output
+        'code': ['scripts/helpers/executor.py', 'scripts/helpers/batch_mode.py', 'scripts/helpers/completion_cache.py',
+                 'scripts/helpers/genre_classifier.py', 'scripts/helpers/artist_catalog.py', 'src/upstream.py',
+                 'src/rate_limiter.py', 'data/processed/genre_classifier.pkl'],
+        'inputs': ['data/processed/01_music_survey_high_effort.csv'],
+        'outputs': ['data/processed/02_music_survey_with_genres.csv'],
+        'batch': True,
+    },
+    {
+        'name': 'embeddings',
+        'script': 'scripts/04_generate_survey_embeddings.py',
+        'code': ['scripts/helpers/identity_string_utils.py', 'scripts/helpers/executor.py', 'src/upstream.py',
+                 'src/rate_limiter.py'],
+        'inputs': ['data/processed/02_music_survey_with_genres.csv'],
+        'outputs': ['data/processed/survey_embeddings.json'],
+    },
+    {
+        'name': 'entities',
+        'script': 'scripts/05_extract_music_entities.py',
+        'code': ['scripts/helpers/executor.py', 'scripts/helpers/batch_mode.py', 'scripts/helpers/completion_cache.py',
+                 'scripts/helpers/spotify.py', 'src/singleflight.py', 'src/upstream.py', 'src/rate_limiter.py'],
+        'inputs': ['data/processed/02_music_survey_with_genres.csv'],
+        'outputs': ['data/processed/03_music_survey_with_extracted_entities.csv'],
+        'batch': True,
+    },
+    {
+        # Reads the entity columns too, so it follows 05 rather than 02
+        'name': 'artists',
+        'script': 'scripts/06_build_artist_catalog.py',
+        'code': ['scripts/helpers/spotify.py', 'scripts/helpers/artist_catalog.py', 'scripts/helpers/executor.py',
+                 'src/entity_spans.py', 'src/singleflight.py', 'src/upstream.py', 'src/rate_limiter.py'],
+        'inputs': ['data/processed/03_music_survey_with_extracted_entities.csv'],
+        'outputs': ['data/processed/04_music_survey_with_artist_urls.csv', 'data/processed/artist_catalog.json'],
+    },
+    {
+        # Publishes the survey file the app reads, with the personality dimensions
+        'name': 'dimensions',
+        'script': 'scripts/08_score_personality_dimensions.py',
+        'code': ['scripts/helpers/generate_image_prompt.py', 'scripts/helpers/executor.py'],
+        'inputs': ['data/processed/04_music_survey_with_artist_urls.csv', 'data/processed/artist_catalog.json'],
+        'outputs': ['src/static/data/survey_data.csv', 'src/static/data/artist_catalog.json'],
+    },
+    {
+        'name': 'personality',
+        'script': 'scripts/03_visualize_personality_distributions.py',
+        'code': ['scripts/helpers/generate_image_prompt.py'],
+        'inputs': ['src/static/data/survey_data.csv'],
+        'outputs': ['data/analysis/personality_scores.csv', 'data/analysis/personality_distributions.png'],
+        # Save the figure without opening a window
+        'env': {'MPLBACKEND': 'Agg'},
+    },
+]
+
+STAGES_BY_NAME = {stage['name']: stage for stage in STAGES}
+
+
+def dependencies(stage):
+    """Stages producing any of this stage's inputs"""
+    return [
+        other['name'] for other in STAGES
+        if other is not stage and set(other['outputs']) & set(stage['inputs'])
+    ]
+
+
+def downstream(name):
+    """name and every stage that (transitively) depends on it"""
+    names = {name}
+    for stage in STAGES:
+        if set(dependencies(stage)) & names:
+            names.add(stage['name'])
+    return names
+
+
+def upstream(name):
+    """name and every stage it (transitively) depends on"""
+    names = {name}
+    for stage in reversed(STAGES):
+        if stage['name'] in names:
+            names.update(dependencies(stage))
+    return names
+
+
+def file_hash(path):
+    """sha256 of a file's content, or None if it doesn't exist"""
+    full_path = os.path.join(ROOT_DIR, path)
+    if not os.path.exists(full_path):
+        return None
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stage_hash(stage):
+    """Hash of everything that determines a stage's output"""
+    digest = hashlib.sha256()
+    for path in [stage['script']] + stage['code'] + stage['inputs']:
+        digest.update(f"{path}={file_hash(path)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_state():
+    if os.path.exists(STATE_FILE):
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp_path = f"{STATE_FILE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def is_fresh(stage, digest, state):
+    """Unchanged since its last successful run, with outputs untouched since"""
+    previous = state.get(stage['name'])
+    if not previous or previous['hash'] != digest:
+        return False
+    return all(file_hash(path) == previous['outputs'].get(path) for path in stage['outputs'])
+
+
+def stage_args(stage, options):
+    return ['--batch'] if options.batch and stage.get('batch') else []
+
+
+def run_stage(stage, args):
+    """Run one stage's script from the repository root; returns its exit code"""
+    print(f"[{stage['name']}] running {stage['script']} {' '.join(args)}".rstrip())
+    env = dict(os.environ, **stage.get('env', {}))
+    result = subprocess.run([sys.executable, stage['script']] + args, cwd=ROOT_DIR, env=env)
+    print(f"[{stage['name']}] {'done' if result.returncode == 0 else f'failed (exit {result.returncode})'}")
+    return result.returncode
+
+
+def select_stages(options):
+    selected = {stage['name'] for stage in STAGES}
+    if options.from_stage:
+        selected &= downstream(options.from_stage)
+    if options.until:
+        selected &= upstream(options.until)
+    return selected
+
+
+def run_pipeline(options):
+    """Run the selected stages, skipping fresh ones; returns True if nothing failed"""
+    selected = select_stages(options)
+    state = load_state()
+
+    finished = set()
+    failed = set()
+    running = {}  # future -> (name, hash)
+    running_names = lambda: {name for name, _ in running.values()}
+    executor = ThreadPoolExecutor(max_workers=len(STAGES))
+    try:
+        while True:
+            # Start every selected stage whose selected dependencies are done
+            for stage in STAGES:
+                name = stage['name']
+                if name not in selected or name in finished or name in failed or name in running_names():
+                    continue
+                deps = [dep for dep in dependencies(stage) if dep in selected]
+                if any(dep in failed for dep in deps):
+                    print(f"[{name}] skipped: an upstream stage failed")
+                    failed.add(name)
+                    continue
+                if not all(dep in finished for dep in deps):
+                    continue
+
+                digest = stage_hash(stage)
+                if not options.force and is_fresh(stage, digest, state):
+                    print(f"[{name}] up to date")
+                    finished.add(name)
+                    continue
+                missing = [path for path in stage['inputs'] if file_hash(path) is None]
+                if missing:
+                    print(f"[{name}] missing inputs: {', '.join(missing)}")
+                    failed.add(name)
+                    continue
+                future = executor.submit(run_stage, stage, stage_args(stage, options))
+                running[future] = (name, digest)
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, digest = running.pop(future)
+                if future.result() == 0:
+                    finished.add(name)
+                    stage = STAGES_BY_NAME[name]
+                    state[name] = {
+                        'hash': digest,
+                        'outputs': {path: file_hash(path) for path in stage['outputs']},
+                    }
+                    save_state(state)
+                else:
+                    failed.add(name)
+    finally:
+        executor.shutdown(wait=True)
+
+    return not failed
+
+
+def list_stages():
+    state = load_state()
+    for stage in STAGES:
+        deps = ', '.join(dependencies(stage)) or '-'
+        status = 'up to date' if is_fresh(stage, stage_hash(stage), state) else 'stale'
+        print(f"{stage['name']:<12} {stage['script']:<52} after: {deps:<20} {status}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the data pipeline, rebuilding only stale stages")
+    names = [stage['name'] for stage in STAGES]
+    parser.add_argument('--from', dest='from_stage', choices=names, help="Start at this stage (and run what depends on it)")
+    parser.add_argument('--until', choices=names, help="Stop after this stage (and what it depends on)")
+    parser.add_argument('--force', action='store_true', help="Rebuild the selected stages even if their inputs are unchanged")
+    parser.add_argument('--batch', action='store_true', help="Pass --batch to the OpenAI-bound stages (01, 02, 05)")
+    parser.add_argument('--list', action='store_true', help="Show the stages, their dependencies and whether they're stale")
+    options = parser.parse_args()
+
+    if options.list:
+        list_stages()
+        sys.exit(0)
+    sys.exit(0 if run_pipeline(options) else 1)
@@ -1,82 +1,178 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, send_file, url_for, abort, redirect
 import json
 import csv
 import os
-import sys
-import numpy as np
-import pandas as pd
 from collections import Counter
-from openai import OpenAI
 import re
+import base64
 
-
-# Add scripts to path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
 from generate_image_prompt import AISpectrumLevel, IntensityLevel, SocialityLevel, generate_avatar_prompt
 from identity_string_utils import create_user_identity_string
 from generate_image_prompt import create_image_prompt_from_survey
 from models import RespondentProfile, MatchResult, QuestionnaireResponse
-
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+from upstream import get_openai_client
+from avatar_cache import avatar_key, load_avatar_cache, load_pregenerated_avatars
+from singleflight import SingleFlight, request_key
+from avatar_derivatives import DERIVATIVE_SIZES, avif_enabled, derivative_path, schedule_derivatives, wait_for_derivatives
+from entity_spans import row_entity_spans, render_spans, TYPE, SPOTIFY_URL, ARTIST_ID
 
 # Base directory configuration
 BASE_DIR = os.path.dirname(__file__)
+# Survey data, embeddings, artist catalog and avatar manifest
+DATA_DIR = os.getenv('SURVEY_DATA_DIR', os.path.join(BASE_DIR, "static", "data"))
 
 app = Flask(__name__)
 
-def load_survey_data():
-    """Load survey data from CSV with extracted entities"""
-    # Load data with extracted entities
-    entities_file = os.path.join(BASE_DIR, "./static/data/survey_data.csv")
-    with open(entities_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        return list(reader)
-
-def convert_entities_to_html(text, entities_json):
-    """Convert text with entity annotations to HTML with Spotify links"""
-    if not entities_json or entities_json == 'nan' or str(entities_json).strip() == '':
-        return text
+# Image generation settings (all part of the avatar cache key)
+IMAGE_MODEL = "gpt-image-1"
+IMAGE_SIZE = "1024x1024"
+IMAGE_QUALITY = "medium"
 
-    try:
-        data = json.loads(entities_json)
-    except (json.JSONDecodeError, TypeError):
-        return text
+# Avatar URLs are content addressed, so browsers can cache them for a year
+AVATAR_MAX_AGE = 365 * 24 * 60 * 60
 
-    if not data or 'annotated_text' not in data:
-        return text
+# How long a derivative request waits on an in-flight resize before falling back
+DERIVATIVE_WAIT_SECONDS = 2
 
-    # Start with the annotated text
-    html = data['annotated_text']
+# Generated avatars are cached on disk, keyed by prompt/model/size/quality
+avatar_cache = load_avatar_cache(BASE_DIR)
 
-    # Replace each entity marker with HTML
-    pattern = r'\|\|(\{[^}]+\})([^|]+)\|\|'
+# Avatars pregenerated offline by scripts/07_pregenerate_avatars.py
+pregenerated_avatars = load_pregenerated_avatars(BASE_DIR)
+_avatar_manifest = {'mtime': None, 'avatars': {}}
+_artist_catalog = {'mtime': None, 'artists': {}}
+_survey_data = {'mtime': None, 'rows': [], 'entity_spans': {}}
 
-    def replace_entity(match):
-        try:
-            metadata = json.loads(match.group(1))
-            matched_text = match.group(2)
-
-            # Find corresponding entity with spotify_url
-            spotify_url = None
-            for entity in data.get('entities', []):
-                if entity.get('matched_text') == matched_text:
-                    spotify_url = entity.get('spotify_url')
-                    break
-
-            if spotify_url:
-                return f'<a href="{spotify_url}" target="_blank" class="music-entity">{matched_text}</a>'
-            else:
-                return matched_text
-        except:
-            return match.group(2)
+# Concurrent identical requests share one upstream call
+avatar_flight = SingleFlight('generate_avatar')
+analyze_flight = SingleFlight('analyze_match')
+image_flight = SingleFlight('image_generation')
 
-    html = re.sub(pattern, replace_entity, html)
-    return html
+def load_survey_data():
+    """Load survey data from CSV with extracted entities, re-reading it only when the file changes"""
+    # Load data with extracted entities
+    entities_file = os.path.join(DATA_DIR, "survey_data.csv")
+    mtime = os.path.getmtime(entities_file)
+    if mtime != _survey_data['mtime']:
+        with open(entities_file, 'r', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        # Entity spans are decoded once here, so rendering needs no parsing
+        _survey_data['entity_spans'] = {row['participant_id']: row_entity_spans(row) for row in rows}
+        _survey_data['rows'] = rows
+        _survey_data['mtime'] = mtime
+    return _survey_data['rows']
+
+def survey_entity_spans(participant_id, column):
+    """(text, spans) of a respondent's entity column, or None"""
+    return _survey_data['entity_spans'].get(participant_id, {}).get(column)
+
+def load_artist_catalog():
+    """Load the artist catalog (scripts/06_build_artist_catalog.py), re-reading it only when the file changes"""
+    catalog_file = os.path.join(DATA_DIR, "artist_catalog.json")
+    try:
+        mtime = os.path.getmtime(catalog_file)
+    except OSError:
+        return {}
+
+    if mtime != _artist_catalog['mtime']:
+        with open(catalog_file, 'r', encoding='utf-8') as f:
+            _artist_catalog['artists'] = json.load(f).get('artists', {})
+        _artist_catalog['mtime'] = mtime
+    return _artist_catalog['artists']
+
+def artist_spotify_url(artist_id, fallback=None):
+    """Spotify URL of a catalog artist, or fallback for data without catalog ids"""
+    artist = load_artist_catalog().get(artist_id) if artist_id else None
+    if artist and artist.get('spotify_url'):
+        return artist['spotify_url']
+    return fallback
+
+def entity_spotify_url(span):
+    """A span's Spotify link, preferring the artist catalog's for artists"""
+    if span[TYPE] == 'artist':
+        return artist_spotify_url(span[ARTIST_ID], span[SPOTIFY_URL])
+    return span[SPOTIFY_URL]
+
+def convert_entities_to_html(text, entity_spans):
+    """Convert text with entity spans (survey_entity_spans()) to HTML with Spotify links"""
+    if not entity_spans:
+        return text
+
+    span_text, spans = entity_spans
+    return render_spans(
+        span_text,
+        spans,
+        link='<a href="{url}" target="_blank" class="music-entity">{text}</a>',
+        resolve_url=entity_spotify_url,
+    )
+
+def generate_avatar_image(prompt):
+    """
+    Generate an avatar for a prompt and return its avatar id.
+    The PNG is stored server-side and served from /avatars/<id>.png;
+    repeat prompts are served straight from the avatar cache.
+    """
+    key = avatar_key(prompt, IMAGE_MODEL, IMAGE_SIZE, IMAGE_QUALITY)
+    path = avatar_cache.get(key)
+    if path is not None:
+        print(f"Avatar cache hit: {key}")
+        schedule_derivatives(path, avatar_cache.cache_dir, key)
+        return key
+
+    # Identical prompts already being generated share that one image call
+    return image_flight.do(key, _generate_and_store_avatar, key, prompt)
+
+def _generate_and_store_avatar(key, prompt):
+    """Call the image API and store the result under its avatar id"""
+    response = get_openai_client().images.generate(
+        model=IMAGE_MODEL,
+        prompt=prompt,
+        size=IMAGE_SIZE,
+        quality=IMAGE_QUALITY,
+        n=1,
+    )
+    path = avatar_cache.put(key, base64.b64decode(response.data[0].b64_json))
+
+    # Resized WebP/AVIF copies are written in a process pool, off this thread
+    schedule_derivatives(path, avatar_cache.cache_dir, key)
+    return key
+
+def load_avatar_manifest():
+    """Load the pregenerated avatar manifest, re-reading it only when the file changes"""
+    manifest_file = os.path.join(DATA_DIR, "avatar_manifest.json")
+    try:
+        mtime = os.path.getmtime(manifest_file)
+    except OSError:
+        return {}
+
+    if mtime != _avatar_manifest['mtime']:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            _avatar_manifest['avatars'] = json.load(f).get('avatars', {})
+        _avatar_manifest['mtime'] = mtime
+    return _avatar_manifest['avatars']
+
+def find_avatar(avatar_id):
+    """Return (path, store) for a stored avatar, checking pregenerated avatars first"""
+    for store in (pregenerated_avatars, avatar_cache):
+        path = store.get(avatar_id)
+        if path is not None:
+            return path, store
+    return None, None
+
+def avatar_url(avatar_id):
+    """Public URL for a stored avatar (the full-size original)"""
+    return url_for('serve_avatar', avatar_id=avatar_id)
+
+def avatar_srcset(avatar_id):
+    """srcset of resized derivatives, used for display instead of the original"""
+    return ", ".join(
+        f"{url_for('serve_avatar_derivative', avatar_id=avatar_id, size=size)} {size}w"
+        for size in sorted(DERIVATIVE_SIZES)
+    )
 
 def load_embeddings():
     """Load embeddings data"""
-    embeddings_file = os.path.join(BASE_DIR, "./static/data/survey_embeddings.json")
+    embeddings_file = os.path.join(DATA_DIR, "survey_embeddings.json")
     if os.path.exists(embeddings_file):
         with open(embeddings_file, 'r', encoding='utf-8') as f:
             return json.load(f)
@@ -92,12 +188,86 @@ def stats():
     """Dashboard page"""
     return render_template('stats.html')
 
+@app.route('/avatars/<avatar_id>.png')
+def serve_avatar(avatar_id):
+    """Serve a generated avatar. Ids are content hashes, so responses never change."""
+    if not re.fullmatch(r'[0-9a-f]{64}', avatar_id):
+        abort(404)
+
+    path, _ = find_avatar(avatar_id)
+    if path is None:
+        abort(404)
+
+    # conditional=True gives ETag / If-None-Match and Range support
+    response = send_file(path, mimetype='image/png', conditional=True, etag=True, max_age=AVATAR_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/avatars/<avatar_id>/<int:size>')
+def serve_avatar_derivative(avatar_id, size):
+    """Serve a resized avatar: AVIF when enabled and accepted, otherwise WebP"""
+    if not re.fullmatch(r'[0-9a-f]{64}', avatar_id) or size not in DERIVATIVE_SIZES:
+        abort(404)
+
+    path, store = find_avatar(avatar_id)
+    if path is None:
+        abort(404)
+
+    # Derivatives are normally written within a second of the original
+    wait_for_derivatives(avatar_id, timeout=DERIVATIVE_WAIT_SECONDS)
+
+    fmt = 'webp'
+    if avif_enabled() and 'image/avif' in request.headers.get('Accept', ''):
+        fmt = 'avif'
+    derivative = derivative_path(store.cache_dir, avatar_id, size, fmt)
+    fallback = False
+    if fmt == 'avif' and not os.path.exists(derivative):
+        # AVIF not written yet: queue it and send WebP meanwhile
+        schedule_derivatives(path, store.cache_dir, avatar_id)
+        fmt = 'webp'
+        fallback = True
+        derivative = derivative_path(store.cache_dir, avatar_id, size, fmt)
+
+    if not os.path.exists(derivative):
+        # Not written yet: queue it and send the original for now
+        schedule_derivatives(path, store.cache_dir, avatar_id)
+        response = redirect(avatar_url(avatar_id))
+        response.cache_control.no_store = True
+        return response
+
+    if fallback:
+        # Revalidated on every use, so this client picks up the AVIF copy once it exists
+        response = send_file(derivative, mimetype=f'image/{fmt}', conditional=True, etag=True, max_age=0)
+        response.cache_control.no_cache = True
+    else:
+        response = send_file(derivative, mimetype=f'image/{fmt}', conditional=True, etag=True, max_age=AVATAR_MAX_AGE)
+        response.cache_control.immutable = True
+    response.cache_control.public = True
+    response.vary.add('Accept')
+    return response
+
 def cosine_similarity(vec1, vec2):
     """Calculate cosine similarity between two vectors"""
+    # Imported on first match rather than at startup
+    import numpy as np
+
     vec1 = np.array(vec1)
     vec2 = np.array(vec2)
     return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
+def find_best_match(user_embedding, embeddings_data):
+    """(participant_id, similarity) of the survey embedding closest to the user's"""
+    best_match = None
+    best_similarity = -1
+
+    for entry in embeddings_data:
+        similarity = cosine_similarity(user_embedding, entry['embedding'])
+        if similarity > best_similarity:
+            best_similarity = similarity
+            best_match = entry['participant_id']
+    return best_match, best_similarity
+
 @app.route("/submit_answers", methods=["POST"])
 def submit_answers():
     try:
@@ -108,7 +278,7 @@ def submit_answers():
         print("User identity string:", identity_string)
 
         # Generate user embedding
-        response = client.embeddings.create(
+        response = get_openai_client().embeddings.create(
             input=identity_string,
             model="text-embedding-3-small"
         )
@@ -121,16 +291,7 @@ def submit_answers():
             return jsonify({"status": "error", "message": "No embeddings found"}), 500
 
         # Find best match with cosine similarity
-        best_match = None
-        best_similarity = -1
-
-        for entry in embeddings_data:
-            similarity = cosine_similarity(user_embedding, entry['embedding'])
-            if similarity > best_similarity:
-                # print(entry["participant_id"])
-                # print(similarity)
-                best_similarity = similarity
-                best_match = entry['participant_id']
+        best_match, best_similarity = find_best_match(user_embedding, embeddings_data)
 
         print(f"Best match: {best_match} with similarity: {best_similarity}")
 
@@ -181,25 +342,28 @@ def submit_answers():
         # Convert extracted entities to HTML with Spotify links
         first_artist_html = convert_entities_to_html(
             matched_response.get('Q3_artist_that_pulled_you_in', 'N/A'),
-            matched_response.get('Q3_extracted_entities')
+            survey_entity_spans(best_match, 'Q3_extracted_entities')
         )
         guilty_pleasure_html = convert_entities_to_html(
             matched_response.get('Q16_Music_guilty_pleasure_text_OE', 'N/A'),
-            matched_response.get('Q16_extracted_entities')
+            survey_entity_spans(best_match, 'Q16_extracted_entities')
         )
         theme_song_html = convert_entities_to_html(
             matched_response.get('Q18_Life_theme_song', 'N/A'),
-            matched_response.get('Q18_extracted_entities')
+            survey_entity_spans(best_match, 'Q18_extracted_entities')
         )
         favorite_lyric_html = convert_entities_to_html(
             matched_response.get('Q19_Lyric_that_stuck_with_you', 'N/A'),
-            matched_response.get('Q19_extracted_entities')
+            survey_entity_spans(best_match, 'Q19_extracted_entities')
         )
         # Handle favorite band with Spotify URL if available
         favorite_band_name = matched_response.get('extracted_favourite_band', 'N/A')
-        favorite_band_spotify_url = matched_response.get('extracted_favourite_band_spotify_url')
+        favorite_band_spotify_url = artist_spotify_url(
+            matched_response.get('extracted_favourite_band_artist_id'),
+            matched_response.get('extracted_favourite_band_spotify_url')
+        )
 
-        if favorite_band_spotify_url and pd.notna(favorite_band_spotify_url):
+        if favorite_band_spotify_url:
             favorite_band_html = f'<a href="{favorite_band_spotify_url}" target="_blank" class="music-entity">{favorite_band_name}</a>'
         else:
             favorite_band_html = favorite_band_name
@@ -257,22 +421,40 @@ def analyze_match():
         user_answers = data.get('user_answers', {})
         match_profile = data.get('match_profile', {})
 
-        # Create JSON objects for comparison
-        user_profile_json = {
-            "What's your relationship with music like?": user_answers.get('q1', 'N/A'),
-            "How did you first discover music you loved?": user_answers.get('q2', 'N/A'),
-            "What kind of music are you into these days?": user_answers.get('q3', 'N/A'),
-            "Real talk - how do you feel about AI making music": user_answers.get('q4', 'N/A'),
-            "In what situations are you listening to music the most?": user_answers.get('q5', 'N/A'),
-            "What is your absolute favourite band / artist and what do you love about them??": user_answers.get('q6', 'N/A')
-        }
+        # Duplicate payloads in flight at the same time share one LLM call
+        result = analyze_flight.do(
+            request_key('analyze_match', user_answers, match_profile),
+            analyze_match_profiles, user_answers, match_profile
+        )
 
-        import json as json_lib
-        user_json_str = json_lib.dumps(user_profile_json, indent=2)
-        match_json_str = json_lib.dumps(match_profile, indent=2)
+        return jsonify(result), 200
 
-        # Create comparison prompt
-        prompt = f"""Analyze the similarities between a user's music taste quiz answers and their matched survey respondent.
+    except Exception as e:
+        print(f"Error analyzing match: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+
+def analyze_match_profiles(user_answers, match_profile):
+    """Ask the LLM for the meaningful similarities between the user and their match"""
+    # Create JSON objects for comparison
+    user_profile_json = {
+        "What's your relationship with music like?": user_answers.get('q1', 'N/A'),
+        "How did you first discover music you loved?": user_answers.get('q2', 'N/A'),
+        "What kind of music are you into these days?": user_answers.get('q3', 'N/A'),
+        "Real talk - how do you feel about AI making music": user_answers.get('q4', 'N/A'),
+        "In what situations are you listening to music the most?": user_answers.get('q5', 'N/A'),
+        "What is your absolute favourite band / artist and what do you love about them??": user_answers.get('q6', 'N/A')
+    }
+
+    import json as json_lib
+    user_json_str = json_lib.dumps(user_profile_json, indent=2)
+    match_json_str = json_lib.dumps(match_profile, indent=2)
+
+    # Create comparison prompt
+    prompt = f"""Analyze the similarities between a user's music taste quiz answers and their matched survey respondent.
 
 USER'S ANSWERS:
 {user_json_str}
@@ -301,40 +483,33 @@ Example of a bad insight: "You both like music." (too vague, no evidence)
 
 Be honest, selective, and only highlight genuine connections."""
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a music taste analyst who finds meaningful connections for people. Respond only with valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=400
-        )
-
-        result_text = response.choices[0].message.content.strip()
-
-        # Remove markdown code blocks if present
-        if result_text.startswith('```'):
-            result_text = result_text.split('```')[1]
-            if result_text.startswith('json'):
-                result_text = result_text[4:]
-            result_text = result_text.strip()
-
-        import json as json_lib
-        analysis_result = json_lib.loads(result_text)
-
-        return jsonify({
-            "status": "success",
-            "summary": analysis_result.get("summary", ""),
-            "insights": analysis_result.get("insights", [])
-        }), 200
-
-    except Exception as e:
-        print(f"Error analyzing match: {str(e)}")
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+    response = get_openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are a music taste analyst who finds meaningful connections for people. Respond only with valid JSON."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=400
+    )
+
+    result_text = response.choices[0].message.content.strip()
+
+    # Remove markdown code blocks if present
+    if result_text.startswith('```'):
+        result_text = result_text.split('```')[1]
+        if result_text.startswith('json'):
+            result_text = result_text[4:]
+        result_text = result_text.strip()
+
+    import json as json_lib
+    analysis_result = json_lib.loads(result_text)
+
+    return {
+        "status": "success",
+        "summary": analysis_result.get("summary", ""),
+        "insights": analysis_result.get("insights", [])
+    }
 
 
 @app.route("/generate_avatar", methods=["POST"])
@@ -350,86 +525,89 @@ def generate_avatar():
                 "message": "participant_id required"
             }), 400
 
-        # Load survey data to find the matched response
-        survey_data = load_survey_data()
-        matched_response = next(
-            (r for r in survey_data if r['participant_id'] == participant_id),
-            None
-        )
-
-        if not matched_response:
+        # Serve the pregenerated avatar if there is one
+        pregenerated = load_avatar_manifest().get(participant_id)
+        pregenerated_path = pregenerated and pregenerated_avatars.get(pregenerated['avatar_id'])
+        if pregenerated_path:
+            schedule_derivatives(pregenerated_path, pregenerated_avatars.cache_dir, pregenerated['avatar_id'])
             return jsonify({
-                "status": "error",
-                "message": "Participant not found"
-            }), 404
+                "status": "success",
+                "image_url": avatar_url(pregenerated['avatar_id']),
+                "srcset": avatar_srcset(pregenerated['avatar_id']),
+                "prompt": pregenerated['prompt']
+            }), 200
 
-        # Generate image prompt from survey data
-        image_prompt = create_image_prompt_from_survey(matched_response, with_band=True)
+        # Otherwise fall back to live generation. Concurrent matches to the
+        # same respondent wait on the first request instead of generating again.
+        result, status = avatar_flight.do(
+            request_key('generate_avatar', participant_id),
+            generate_match_avatar, participant_id
+        )
+        return jsonify(result), status
 
-        print(f"Generated prompt: {image_prompt}")
+    except Exception as e:
+        print(f"Error generating avatar: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
 
-        # Try generating image with band reference first
-        try:
-            response = client.images.generate(
-                model="gpt-image-1",
-                prompt=image_prompt,
-                size="1024x1024",
-                quality="medium",
-                n=1,
-            )
 
-            # Get base64 encoded image data
-            image_b64 = response.data[0].b64_json
+def generate_match_avatar(participant_id):
+    """Live avatar generation for a survey respondent. Returns (payload, status)."""
+    # Load survey data to find the matched response
+    survey_data = load_survey_data()
+    matched_response = next(
+        (r for r in survey_data if r['participant_id'] == participant_id),
+        None
+    )
 
-            # Create data URI for frontend
-            image_data_uri = f"data:image/png;base64,{image_b64}"
+    if not matched_response:
+        return {
+            "status": "error",
+            "message": "Participant not found"
+        }, 404
 
-            return jsonify({
-                "status": "success",
-                "image_url": image_data_uri,
-                "prompt": image_prompt
-            }), 200
+    # Generate image prompt from survey data
+    image_prompt = create_image_prompt_from_survey(matched_response, with_band=True)
 
-        except Exception as dalle_error:
-            error_str = str(dalle_error)
+    print(f"Generated prompt: {image_prompt}")
 
-            # Check if it's a safety/moderation error
-            if 'safety system' in error_str.lower() or 'moderation_blocked' in error_str.lower() or 'content_policy' in error_str.lower():
-                print(f"Safety block with band reference, retrying without band: {dalle_error}")
+    # Try generating image with band reference first
+    try:
+        # Image is stored server-side; the frontend gets a cacheable URL
+        avatar_id = generate_avatar_image(image_prompt)
 
-                # Retry without band reference
-                image_prompt = create_image_prompt_from_survey(matched_response, with_band=False)
-                print(f"Retrying with prompt: {image_prompt}")
-
-                response = client.images.generate(
-                    model="gpt-image-1",
-                    prompt=image_prompt,
-                    size="1024x1024",
-                    quality="medium",
-                    n=1,
-                )
+        return {
+            "status": "success",
+            "image_url": avatar_url(avatar_id),
+            "srcset": avatar_srcset(avatar_id),
+            "prompt": image_prompt
+        }, 200
 
-                # Get base64 encoded image data
-                image_b64 = response.data[0].b64_json
+    except Exception as dalle_error:
+        error_str = str(dalle_error)
 
-                # Create data URI for frontend
-                image_data_uri = f"data:image/png;base64,{image_b64}"
+        # Check if it's a safety/moderation error
+        if 'safety system' in error_str.lower() or 'moderation_blocked' in error_str.lower() or 'content_policy' in error_str.lower():
+            print(f"Safety block with band reference, retrying without band: {dalle_error}")
 
-                return jsonify({
-                    "status": "success",
-                    "image_url": image_data_uri,
-                    "prompt": image_prompt
-                }), 200
-            else:
-                # Other DALL-E errors
-                raise dalle_error
+            # Retry without band reference
+            image_prompt = create_image_prompt_from_survey(matched_response, with_band=False)
+            print(f"Retrying with prompt: {image_prompt}")
 
-    except Exception as e:
-        print(f"Error generating avatar: {str(e)}")
-        return jsonify({
-            "status": "error",
-            "message": str(e)
-        }), 400
+            # Image is stored server-side; the frontend gets a cacheable URL
+            avatar_id = generate_avatar_image(image_prompt)
+
+            return {
+                "status": "success",
+                "image_url": avatar_url(avatar_id),
+                "srcset": avatar_srcset(avatar_id),
+                "prompt": image_prompt
+            }, 200
+        else:
+            # Other DALL-E errors
+            raise dalle_error
 
 
 @app.route('/generate_user_avatar', methods=["POST"])
@@ -465,7 +643,7 @@ Guidelines:
 - sociality_level: Based on q5 and overall tone - how much they share music with others
 - favourite_genre: Extract from q3 or q6
 - favourite_band: Extract exact band/artist name from q6"""
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a music preference analyzer. Return only valid JSON, no markdown formatting."},
@@ -533,23 +711,13 @@ Guidelines:
         print(f"Generated user avatar prompt: {avatar_prompt}")
 
         try:
-            image_response = client.images.generate(
-                model="gpt-image-1",
-                prompt=avatar_prompt,
-                size="1024x1024",
-                quality="medium",
-                n=1,
-            )
-
-             # Get base64 encoded image data
-            image_b64 = image_response.data[0].b64_json
-
-            # Create data URI for frontend
-            image_data_uri = f"data:image/png;base64,{image_b64}"
+            # Image is stored server-side; the frontend gets a cacheable URL
+            avatar_id = generate_avatar_image(avatar_prompt)
 
             return jsonify({
                 'status': 'success',
-                'image_url': image_data_uri,
+                'image_url': avatar_url(avatar_id),
+                'srcset': avatar_srcset(avatar_id),
                 'prompt': avatar_prompt
             })
 
@@ -572,23 +740,13 @@ Guidelines:
                 )
                 print(f"Retrying with prompt: {avatar_prompt}")
 
-                image_response = client.images.generate(
-                    model="gpt-image-1",
-                    prompt=avatar_prompt,
-                    size="1024x1024",
-                    quality="medium",
-                    n=1,
-                )
-
-                # Get base64 encoded image data
-                image_b64 = image_response.data[0].b64_json
-
-                # Create data URI for frontend
-                image_data_uri = f"data:image/png;base64,{image_b64}"
+                # Image is stored server-side; the frontend gets a cacheable URL
+                avatar_id = generate_avatar_image(avatar_prompt)
 
                 return jsonify({
                     'status': 'success',
-                    'image_url': image_data_uri,
+                    'image_url': avatar_url(avatar_id),
+                    'srcset': avatar_srcset(avatar_id),
                     'prompt': avatar_prompt
                 })
             else:
@@ -627,6 +785,16 @@ def get_stats():
 
     return jsonify(stats)
 
+@app.route('/api/metrics')
+def get_metrics():
+    """Request coalescing counters (how many upstream calls were saved)"""
+    return jsonify({
+        'singleflight': {
+            flight.name: flight.stats()
+            for flight in (avatar_flight, analyze_flight, image_flight)
+        }
+    })
+
 @app.route('/api/responses')
 def get_responses():
     """Get all survey responses with optional filtering"""
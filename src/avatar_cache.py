@@ -0,0 +1,105 @@
+import os
+import hashlib
+import threading
+
+
+def avatar_key(prompt, model, size, quality):
+    """Content address for a generated image: hash of everything that determines it"""
+    key_str = "\n".join([model, size, quality, prompt])
+    return hashlib.sha256(key_str.encode('utf-8')).hexdigest()
+
+
+class AvatarCache:
+    """
+    On-disk cache of generated avatar images, keyed by avatar_key().
+
+    Files are stored as <cache_dir>/<key>.png. Each hit bumps the file's mtime,
+    and once the directory grows past max_bytes the least recently used files
+    are evicted. With max_bytes=None nothing is ever evicted (used for the
+    pregenerated avatars that ship with the survey data).
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key):
+        """Return the path of a cached image, or None on a miss"""
+        path = self.path_for(key)
+        try:
+            # Mark as recently used
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, image_bytes):
+        """Store image bytes atomically, then evict down to the size cap"""
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, path)
+
+        self.evict()
+        return path
+
+    def evict(self):
+        """
+        Delete least recently used avatars until the cache is under max_bytes.
+        An avatar's derivatives (<key>-<size>.webp etc.) count towards its size
+        and are evicted along with it.
+        """
+        if self.max_bytes is None:
+            return
+
+        with self._lock:
+            groups = {}
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = name.split('.')[0].split('-')[0]
+                group = groups.setdefault(key, {'mtime': 0, 'size': 0, 'paths': []})
+                group['size'] += stat.st_size
+                group['paths'].append(path)
+                # Recency comes from the original; orphaned derivatives go first
+                if name == f"{key}.png":
+                    group['mtime'] = stat.st_mtime
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for group in sorted(groups.values(), key=lambda g: g['mtime']):
+                if total <= self.max_bytes:
+                    break
+                for path in group['paths']:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                total -= group['size']
+
+
+def load_avatar_cache(base_dir):
+    """Build the avatar cache from AVATAR_CACHE_DIR / AVATAR_CACHE_MAX_MB"""
+    cache_dir = os.getenv('AVATAR_CACHE_DIR', os.path.join(base_dir, "avatar_cache"))
+    max_mb = float(os.getenv('AVATAR_CACHE_MAX_MB', '500'))
+    return AvatarCache(cache_dir, int(max_mb * 1024 * 1024))
+
+
+def load_pregenerated_avatars(base_dir):
+    """Store for avatars written by scripts/07_pregenerate_avatars.py (never evicted)"""
+    avatars_dir = os.getenv('AVATAR_PREGENERATED_DIR', os.path.join(base_dir, "static", "avatars"))
+    return AvatarCache(avatars_dir, None)
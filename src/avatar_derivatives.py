@@ -0,0 +1,110 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Widths written for srcset. The results card shows avatars at up to 400px,
+# so 800 covers 2x screens; the 1024px original is only for fullscreen/download.
+DERIVATIVE_SIZES = (800, 400, 200)
+
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_flight = {}
+
+
+def avif_enabled():
+    """AVIF is opt-in (AVATAR_AVIF=1) and needs a Pillow build with AVIF support"""
+    if os.getenv('AVATAR_AVIF', '0') != '1':
+        return False
+    from PIL import features
+    return bool(features.check('avif'))
+
+
+def derivative_formats():
+    return ('webp', 'avif') if avif_enabled() else ('webp',)
+
+
+def derivative_path(avatars_dir, avatar_id, size, fmt):
+    return os.path.join(avatars_dir, f"{avatar_id}-{size}.{fmt}")
+
+
+def missing_formats(avatars_dir, avatar_id):
+    """Enabled formats some size of avatar_id hasn't been written in yet"""
+    return tuple(
+        fmt for fmt in derivative_formats()
+        if not all(os.path.exists(derivative_path(avatars_dir, avatar_id, size, fmt)) for size in DERIVATIVE_SIZES)
+    )
+
+
+def has_derivatives(avatars_dir, avatar_id):
+    return not missing_formats(avatars_dir, avatar_id)
+
+
+def write_derivatives(png_path, avatars_dir, avatar_id, formats=('webp',)):
+    """
+    Decode the original PNG once and write every size/format derivative.
+    Sizes are produced largest first, each resized from the previous one.
+    Runs inside the process pool, so it only takes picklable arguments.
+    """
+    from PIL import Image
+
+    with Image.open(png_path) as original:
+        image = original.convert('RGBA')
+
+    for size in DERIVATIVE_SIZES:
+        image = image.resize((size, size), Image.LANCZOS)
+        for fmt in formats:
+            path = derivative_path(avatars_dir, avatar_id, size, fmt)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            if fmt == 'webp':
+                image.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+            else:
+                image.save(tmp_path, 'AVIF', quality=AVIF_QUALITY)
+            os.replace(tmp_path, path)
+
+    return avatar_id
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.getenv('AVATAR_DERIVATIVE_WORKERS', '2'))
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def schedule_derivatives(png_path, avatars_dir, avatar_id):
+    """Queue derivative generation in the process pool (off the request thread)"""
+    with _pool_lock:
+        future = _in_flight.get(avatar_id)
+    if future is not None:
+        return future
+    formats = missing_formats(avatars_dir, avatar_id)
+    if not formats:
+        return None
+
+    pool = _get_pool()
+    with _pool_lock:
+        future = _in_flight.get(avatar_id)
+        if future is None:
+            future = pool.submit(write_derivatives, png_path, avatars_dir, avatar_id, formats)
+            _in_flight[avatar_id] = future
+            future.add_done_callback(lambda _: _in_flight.pop(avatar_id, None))
+    return future
+
+
+def wait_for_derivatives(avatar_id, timeout):
+    """Block briefly on an in-flight job for avatar_id, if there is one"""
+    with _pool_lock:
+        future = _in_flight.get(avatar_id)
+    if future is None:
+        return
+    try:
+        future.result(timeout=timeout)
+    except FutureTimeoutError:
+        pass  # still running; the caller serves what exists
+    except Exception as e:
+        print(f"Error writing avatar derivatives for {avatar_id}: {e}")
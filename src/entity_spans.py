@@ -0,0 +1,122 @@
+"""
+Span-offset representation of the extracted music entities, and the one
+renderer the app and the pipeline helpers share.
+
+Stage 05 stores each answer's entities as inline-annotated text
+(||{"type": ...}matched text||) plus an entity list. Stage 06 also writes
+them as spans over the original answer:
+
+    {"text": "Hard Times - The Chieftains",
+     "spans": [[0, 10, "song", "Hard Times", "https://open.spotify.com/track/...", null],
+               [13, 27, "artist", "The Chieftains", "https://...", "ar_3f9c..."]]}
+
+i.e. (start, end, type, name, spotify_url, artist_id), sorted and
+non-overlapping. Rendering is then one pass over the text with no regex or
+JSON work; annotations from before the span columns existed are converted
+once with spans_from_annotation() when they are loaded.
+"""
+import re
+import json
+
+ANNOTATION_PATTERN = re.compile(r'\|\|(\{[^}]+\})([^|]+)\|\|')
+
+ENTITY_COLUMNS = ['Q3_extracted_entities', 'Q16_extracted_entities', 'Q18_extracted_entities', 'Q19_extracted_entities']
+
+# Span tuple fields
+START, END, TYPE, NAME, SPOTIFY_URL, ARTIST_ID = range(6)
+
+
+def spans_column(entities_column):
+    """Span column written next to an entity column (Q18_extracted_entities -> Q18_entity_spans)"""
+    return entities_column.replace('_extracted_entities', '_entity_spans')
+
+
+def spans_from_annotation(data):
+    """
+    {'text', 'spans'} for a stored annotation ({'annotated_text', 'entities'},
+    as a dict or JSON string), or None if there's nothing to highlight
+    """
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return None
+    if not data or 'annotated_text' not in data:
+        return None
+
+    annotated_text = data['annotated_text']
+    entities = data.get('entities', [])
+    pieces = []
+    spans = []
+    length = 0
+    position = 0
+    for match in ANNOTATION_PATTERN.finditer(annotated_text):
+        pieces.append(annotated_text[position:match.start()])
+        length += match.start() - position
+        position = match.end()
+
+        matched_text = match.group(2)
+        pieces.append(matched_text)
+        try:
+            metadata = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            length += len(matched_text)
+            continue
+
+        # The entity the marker stands for, as the renderers always matched it
+        entity = next((e for e in entities if e.get('matched_text') == matched_text), {})
+        spans.append([
+            length,
+            length + len(matched_text),
+            metadata.get('type', 'unknown'),
+            metadata.get('name', matched_text),
+            entity.get('spotify_url'),
+            entity.get('artist_id'),
+        ])
+        length += len(matched_text)
+    pieces.append(annotated_text[position:])
+    return {'text': ''.join(pieces), 'spans': spans}
+
+
+def load_spans(value):
+    """(text, spans) from a span column cell (JSON string or dict), or None"""
+    if isinstance(value, str):
+        if not value.strip() or value == 'nan':
+            return None
+        try:
+            value = json.loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return None
+    if not value or 'text' not in value:
+        return None
+    return value['text'], [tuple(span) for span in value.get('spans', [])]
+
+
+def row_entity_spans(row):
+    """{entity column: (text, spans) or None} for a survey row, preferring the span columns"""
+    decoded = {}
+    for column in ENTITY_COLUMNS:
+        spans = load_spans(row.get(spans_column(column)))
+        if spans is None:
+            spans = load_spans(spans_from_annotation(row.get(column)))
+        decoded[column] = spans
+    return decoded
+
+
+def render_spans(text, spans, link, unlinked='{text}', resolve_url=None):
+    """
+    HTML for text with every span formatted: link (with {url}, {text},
+    {type}) when it has a Spotify URL, otherwise unlinked. resolve_url(span)
+    may supply a fresher URL (e.g. from the artist catalog).
+    """
+    pieces = []
+    position = 0
+    for span in spans:
+        start, end = span[START], span[END]
+        pieces.append(text[position:start])
+        url = resolve_url(span) if resolve_url else span[SPOTIFY_URL]
+        template = link if url else unlinked
+        pieces.append(template.format(url=url, text=text[start:end], type=span[TYPE]))
+        position = end
+    pieces.append(text[position:])
+    return ''.join(pieces)
@@ -1,7 +1,23 @@
-import pandas as pd
-import numpy as np
+import hashlib
+import random
 from enum import Enum
 
+
+# pandas.read_csv's default NA strings: the pipeline scores (scripts/08) see
+# these cells as NaN, while the app's csv.DictReader rows hold them as text
+_NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def _notna(value):
+    """pd.notna for the cell values these rows hold, reading blank CSV cells as pandas does"""
+    if isinstance(value, str):
+        return value not in _NA_STRINGS
+    return value is not None and value == value
+
+
 class AISpectrumLevel(Enum):
     """AI attitude levels"""
     EMBRACER = 3
@@ -46,15 +62,32 @@ class MusicGenre(Enum):
     KPOP = "k-pop"
     OTHER = "other"
 
+def stored_dimensions(data):
+    """
+    (ai_level, intensity_level, sociality_level) precomputed by
+    scripts/08_score_personality_dimensions.py, or None if the row doesn't
+    have them (older survey files, unscorable answers)
+    """
+    try:
+        return (
+            AISpectrumLevel[data['ai_level']],
+            IntensityLevel[data['intensity_level']],
+            SocialityLevel[data['sociality_level']],
+        )
+    except (KeyError, TypeError):
+        return None
+
 def create_image_prompt_from_survey(data, with_band=True):
     """
     Generate musical avatar image prompt from survey data
     """
 
-    # Calculate interpreted dimensions
-    ai_embracer_level = calculate_ai_spectrum(data)  # Returns (enum, score)
-    intensity_level = calculate_intensity(data)  # Returns (enum, score)
-    sociality_level = calculate_sociality(data)  # Returns (enum, score)
+    # Interpreted dimensions: stored with the survey data, scored here only
+    # for rows that don't have them
+    levels = stored_dimensions(data)
+    if levels is None:
+        levels = (calculate_ai_spectrum(data)[0], calculate_intensity(data)[0], calculate_sociality(data)[0])
+    ai_level, intensity_level, sociality_level = levels
     favourite_band = data.get("extracted_favourite_band")
     favourite_genre = data.get("extracted_genre")
 
@@ -68,12 +101,13 @@ def create_image_prompt_from_survey(data, with_band=True):
     # Generate Musical Avatar Image Prompt
     avatar_prompt = generate_avatar_prompt(
         physical_desc=physical_desc,
-        ai_level=ai_embracer_level[0],
-        intensity_level=intensity_level[0],
-        sociality_level=sociality_level[0],
+        ai_level=ai_level,
+        intensity_level=intensity_level,
+        sociality_level=sociality_level,
         favourite_genre=favourite_genre,
         favourite_band=favourite_band,
-        with_band=with_band
+        with_band=with_band,
+        seed=data.get('participant_id')
     )
 
     return avatar_prompt
@@ -84,7 +118,7 @@ def generate_physical_description(ethnicity, age, gender):
     parts = []
 
     # Age descriptor
-    if pd.notna(age):
+    if _notna(age):
         age_int = int(age)
         if age_int < 25:
             parts.append("young adult")
@@ -98,7 +132,7 @@ def generate_physical_description(ethnicity, age, gender):
             parts.append("mature adult")
 
     # Gender
-    if pd.notna(gender):
+    if _notna(gender):
         gender_str = str(gender).lower()
         if 'male' in gender_str and 'female' not in gender_str:
             parts.append("man")
@@ -110,7 +144,7 @@ def generate_physical_description(ethnicity, age, gender):
         parts.append("person")
 
     # Ethnicity
-    if pd.notna(ethnicity):
+    if _notna(ethnicity):
         ethnicity_str = str(ethnicity).strip()
         if ethnicity_str == "White":
             parts.append("of European descent")
@@ -138,18 +172,38 @@ def generate_physical_description(ethnicity, age, gender):
     return ", ".join(parts) if parts else "person"
 
 
-def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_level, favourite_genre, favourite_band, with_band=True):
-    """Generate image prompt for musical avatar"""
+def variant_rng(*parts):
+    """
+    Deterministic random generator for picking prompt variants.
+    Seeded from a stable hash so the same inputs always give the same prompt
+    (and therefore hit the avatar cache) across processes and restarts.
+    """
+    seed_str = "|".join(str(p) for p in parts)
+    digest = hashlib.sha256(seed_str.encode('utf-8')).digest()
+    return random.Random(int.from_bytes(digest[:8], 'big'))
+
+
+def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_level, favourite_genre, favourite_band, with_band=True, seed=None):
+    """
+    Generate image prompt for musical avatar
+
+    Variants are chosen deterministically from `seed` (e.g. participant_id),
+    or from the attribute tuple when no seed is given. with_band is left out
+    of the seed so the no-band retry keeps the same variants.
+    """
+    if seed is None:
+        seed = (physical_desc, ai_level, intensity_level, sociality_level, favourite_genre, favourite_band)
+    rng = variant_rng(seed)
 
     prompt = f"Avatar of a {physical_desc}, "
 
     wearing = "wearing "
     # Band t-shirt
     if with_band:
-        if pd.notna(favourite_band) and str(favourite_band).lower() not in ['unknown', 'unknown artist', 'nan']:
+        if _notna(favourite_band) and str(favourite_band).lower() not in ['unknown', 'unknown artist', 'nan']:
             wearing += f"a {favourite_band}  t-shirt, "
 
-    if pd.notna(favourite_genre):
+    if _notna(favourite_genre):
         genre_lower = str(favourite_genre).lower()
         if "other" not in genre_lower:
             wearing += genre_lower + " music fashion. "
@@ -161,7 +215,6 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
     prompt += wearing
 
     # Intensity influences energy and expression
-    import random
     if intensity_level == IntensityLevel.OBSESSED:
         expressions = [
             "Passionate intense expression, surrounded by concert tickets and music memorabilia. ",
@@ -169,7 +222,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Electric intensity in their eyes, wearing headphones. ",
             "Fervent music lover aura with festival wristbands. "
         ]
-        prompt += random.choice(expressions)
+        prompt += rng.choice(expressions)
     elif intensity_level == IntensityLevel.ENGAGED:
         expressions = [
             "Enthusiastic expression, head nodding to the beat with wireless headphones. ",
@@ -178,7 +231,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Energetic presence dancing subtly, with earbuds and a smile. ",
             "Engaged and immersed in the sound, eyes closed and feeling the rhythm. "
         ]
-        prompt += random.choice(expressions)
+        prompt += rng.choice(expressions)
     elif intensity_level == IntensityLevel.CASUAL:
         expressions = [
             "Relaxed expression, casually enjoying background music with one earbud in. ",
@@ -187,7 +240,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Comfortable and unhurried, music playing softly in the background. ",
             "Mellow presence appreciating the tunes without overwhelming focus. "
         ]
-        prompt += random.choice(expressions)
+        prompt += rng.choice(expressions)
     else:  # MINIMAL
         expressions = [
             "Understated expression, barely acknowledging the music in the background. ",
@@ -195,7 +248,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Distant relationship to sound, minimal engagement or accessories. ",
             "Low-key presence with music playing faintly, no visible enthusiasm. ",
         ]
-        prompt += random.choice(expressions)
+        prompt += rng.choice(expressions)
 
     # # Sociality influences background/setting - number of people
     # if sociality_level == SocialityLevel.ACTIVE_CURATOR:
@@ -208,7 +261,6 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
     #     prompt += "Background: Alone "
 
     # AI attitude influences aesthetic style/lighting
-    import random
     if ai_level == AISpectrumLevel.EMBRACER:
         aesthetics = [
             "Neon-lit cyberpunk aesthetic with holographic elements and digital glow effects. ",
@@ -216,7 +268,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "High-tech sci-fi atmosphere with glowing circuit patterns and digital particles. ",
             "Ultra-modern space-age look with iridescent surfaces and laser light effects. ",
         ]
-        prompt += random.choice(aesthetics)
+        prompt += rng.choice(aesthetics)
     elif ai_level == AISpectrumLevel.CURIOUS:
         aesthetics = [
             "Contemporary urban aesthetic with clean lines and studio lighting. ",
@@ -225,7 +277,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Sleek modern design with geometric patterns and ambient lighting. ",
             "Fresh contemporary vibe with digital-meets-analog aesthetic. "
         ]
-        prompt += random.choice(aesthetics)
+        prompt += rng.choice(aesthetics)
     else: # REJECTOR or UNCERTAIN
         aesthetics = [
             "Neutral balanced aesthetic blending retro and modern elements. ",
@@ -238,7 +290,7 @@ def generate_avatar_prompt(physical_desc, ai_level, intensity_level, sociality_l
             "Timeless old-school look with tape deck vibes and warm tungsten lighting. ",
             "Authentic vintage atmosphere with cassette-era aesthetics and film photography feel. ",
         ]
-        prompt += random.choice(aesthetics)
+        prompt += rng.choice(aesthetics)
 
     prompt += "detailed digital illustration, music-themed, non-photorealistic."
 
@@ -320,7 +372,7 @@ def calculate_intensity(data):
         'Q12_Music_bingo_7',  # replayed same song 10+ times
     ]
     
-    q12_count = sum(1 for field in q12_fields if field in data and pd.notna(data[field]))
+    q12_count = sum(1 for field in q12_fields if field in data and _notna(data[field]))
     
     # Normalize Q12 to 0-4 scale (max is 6)
     q12_normalized = (q12_count / 6) * 4
@@ -354,28 +406,28 @@ def calculate_sociality(data):
     score = 0
 
     # Discovery through social channels (+1 each)
-    if pd.notna(data.get('Q7_New_music_discover_3')):  # Friend recs
+    if _notna(data.get('Q7_New_music_discover_3')):  # Friend recs
         score += 1
-    if pd.notna(data.get('Q7_New_music_discover_7')):  # Music blogs or critics
+    if _notna(data.get('Q7_New_music_discover_7')):  # Music blogs or critics
         score += 1
 
     # Music bingo social behaviors (+1 each)
-    if pd.notna(data.get('Q12_Music_bingo_2')):  # DJ on road trip
+    if _notna(data.get('Q12_Music_bingo_2')):  # DJ on road trip
         score += 1
-    if pd.notna(data.get('Q12_Music_bingo_5')):  # Shared a song to flirt
+    if _notna(data.get('Q12_Music_bingo_5')):  # Shared a song to flirt
         score += 1
 
     # Sharing methods (count how many ways they share)
     sharing_count = 0
-    if pd.notna(data.get('Q13_Share_the_music_you_love_1')):  # Texting links
+    if _notna(data.get('Q13_Share_the_music_you_love_1')):  # Texting links
         sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_2')):  # Group chats
+    if _notna(data.get('Q13_Share_the_music_you_love_2')):  # Group chats
         sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_3')):  # Social media
+    if _notna(data.get('Q13_Share_the_music_you_love_3')):  # Social media
         sharing_count += 1
-    if pd.notna(data.get('Q13_Share_the_music_you_love_4')):  # Curating playlists
+    if _notna(data.get('Q13_Share_the_music_you_love_4')):  # Curating playlists
         sharing_count += 1  # Weighted higher - more curation effort
-    if pd.notna(data.get('Q13_Share_the_music_you_love_5')):  # In-person
+    if _notna(data.get('Q13_Share_the_music_you_love_5')):  # In-person
         sharing_count += 1
 
     # Add sharing count to score
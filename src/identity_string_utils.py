@@ -1,5 +1,7 @@
-import pandas as pd
-import numpy as np
+def _notna(value):
+    """pd.notna for the scalar cell values these rows hold, without importing pandas"""
+    return value is not None and value == value
+
 
 def create_survey_identity_string(row):
     """
@@ -15,13 +17,13 @@ def create_survey_identity_string(row):
     
     # Discovery background
     parts.append(f"First discovered music through: {row['Q2_Discovering_music']}")
-    if pd.notna(row['Q3_artist_that_pulled_you_in']):
+    if _notna(row['Q3_artist_that_pulled_you_in']):
         parts.append(f"First artist that pulled you in: {row['Q3_artist_that_pulled_you_in']}")
     
     # # Format changes (shows adaptability)
-    # if pd.notna(row['Q4_Music_format_changes']):
+    # if _notna(row['Q4_Music_format_changes']):
     #     parts.append(f"Most memorable format change: {row['Q4_Music_format_changes']}")
-    # if pd.notna(row['Q6_Music_format_change_feelings']):
+    # if _notna(row['Q6_Music_format_change_feelings']):
     #     parts.append(f"Felt about format changes: {row['Q6_Music_format_change_feelings']}")
     
     # Current behavior
@@ -29,13 +31,13 @@ def create_survey_identity_string(row):
     
     # Current discovery methods
     discovery_methods = []
-    if pd.notna(row['Q7_New_music_discover_1']): discovery_methods.append("TikTok/Reels")
-    if pd.notna(row['Q7_New_music_discover_2']): discovery_methods.append("streaming playlists")
-    if pd.notna(row['Q7_New_music_discover_3']): discovery_methods.append("friend recommendations")
-    if pd.notna(row['Q7_New_music_discover_4']): discovery_methods.append("movie/TV soundtracks")
-    if pd.notna(row['Q7_New_music_discover_5']): discovery_methods.append("Shazam")
-    if pd.notna(row['Q7_New_music_discover_6']): discovery_methods.append("music blogs")
-    if pd.notna(row['Q7_New_music_discover_7']): discovery_methods.append("replays favorites")
+    if _notna(row['Q7_New_music_discover_1']): discovery_methods.append("TikTok/Reels")
+    if _notna(row['Q7_New_music_discover_2']): discovery_methods.append("streaming playlists")
+    if _notna(row['Q7_New_music_discover_3']): discovery_methods.append("friend recommendations")
+    if _notna(row['Q7_New_music_discover_4']): discovery_methods.append("movie/TV soundtracks")
+    if _notna(row['Q7_New_music_discover_5']): discovery_methods.append("Shazam")
+    if _notna(row['Q7_New_music_discover_6']): discovery_methods.append("music blogs")
+    if _notna(row['Q7_New_music_discover_7']): discovery_methods.append("replays favorites")
     if discovery_methods:
         parts.append(f"Discover new music through: {', '.join(discovery_methods)}")
     
@@ -54,32 +56,32 @@ def create_survey_identity_string(row):
         'Q8_Music_listen_time_GRID_6': 'unwinding'
     }
     for field, context in listen_map.items():
-        if pd.notna(row[field]) and row[field] in ['Often', 'Always']:
+        if _notna(row[field]) and row[field] in ['Often', 'Always']:
             listening_contexts.append(context)
     if listening_contexts:
         parts.append(f"Listen to music often/always when: {', '.join(listening_contexts)}")
     
     # Engagement behaviors
     behaviors = []
-    if pd.notna(row['Q12_Music_bingo_1']): behaviors.append("makes breakup playlists")
-    if pd.notna(row['Q12_Music_bingo_2']): behaviors.append("play DJ on road trips")
-    if pd.notna(row['Q12_Music_bingo_3']): behaviors.append("use music for motivation")
-    if pd.notna(row['Q12_Music_bingo_4']): behaviors.append("crie to sad songs")
-    if pd.notna(row['Q12_Music_bingo_5']): behaviors.append("share songs romantically")
-    if pd.notna(row['Q12_Music_bingo_6']): behaviors.append("make vibe playlists")
-    if pd.notna(row['Q12_Music_bingo_7']): behaviors.append("replay same song many times")
+    if _notna(row['Q12_Music_bingo_1']): behaviors.append("makes breakup playlists")
+    if _notna(row['Q12_Music_bingo_2']): behaviors.append("play DJ on road trips")
+    if _notna(row['Q12_Music_bingo_3']): behaviors.append("use music for motivation")
+    if _notna(row['Q12_Music_bingo_4']): behaviors.append("crie to sad songs")
+    if _notna(row['Q12_Music_bingo_5']): behaviors.append("share songs romantically")
+    if _notna(row['Q12_Music_bingo_6']): behaviors.append("make vibe playlists")
+    if _notna(row['Q12_Music_bingo_7']): behaviors.append("replay same song many times")
     if behaviors:
         parts.append(f"Music behaviors: {', '.join(behaviors)}")
     
     # Sharing behavior (social dimension)
     sharing_methods = []
-    if pd.notna(row['Q13_Share_the_music_you_love_1']): sharing_methods.append("text links")
-    if pd.notna(row['Q13_Share_the_music_you_love_2']): sharing_methods.append("group chats")
-    if pd.notna(row['Q13_Share_the_music_you_love_3']): sharing_methods.append("social media")
-    if pd.notna(row['Q13_Share_the_music_you_love_4']): sharing_methods.append("curates playlists")
-    if pd.notna(row['Q13_Share_the_music_you_love_5']): sharing_methods.append("in-person")
+    if _notna(row['Q13_Share_the_music_you_love_1']): sharing_methods.append("text links")
+    if _notna(row['Q13_Share_the_music_you_love_2']): sharing_methods.append("group chats")
+    if _notna(row['Q13_Share_the_music_you_love_3']): sharing_methods.append("social media")
+    if _notna(row['Q13_Share_the_music_you_love_4']): sharing_methods.append("curates playlists")
+    if _notna(row['Q13_Share_the_music_you_love_5']): sharing_methods.append("in-person")
     
-    if pd.notna(row['Q13_Share_the_music_you_love_6']):
+    if _notna(row['Q13_Share_the_music_you_love_6']):
         parts.append("Don't share music")
     elif sharing_methods:
         parts.append(f"Share music by: {', '.join(sharing_methods)}")
@@ -88,15 +90,15 @@ def create_survey_identity_string(row):
     
     # Self-perception
     parts.append(f"Guilty pleasure attitude: {row['Q15_Music_guilty_pleasure']}")
-    if pd.notna(row['Q16_Music_guilty_pleasure_text_OE']):
+    if _notna(row['Q16_Music_guilty_pleasure_text_OE']):
         parts.append(f"Guilty pleasure song: {row['Q16_Music_guilty_pleasure_text_OE']}")
     
     # Genre (extracted feature)
-    if pd.notna(row['extracted_genre']):
+    if _notna(row['extracted_genre']):
         parts.append(f"Genre preference: {row['extracted_genre']}")
     
     # Favorite band (extracted feature)
-    if pd.notna(row['extracted_favourite_band']):
+    if _notna(row['extracted_favourite_band']):
         parts.append(f"Favorite artist: {row['extracted_favourite_band']}")
     
     return "\n".join(parts)
@@ -0,0 +1,126 @@
+import re
+import time
+import threading
+
+# OpenAI-style durations in rate-limit headers: "120ms", "1s", "6m0s", "1h2m3.5s"
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value):
+    """Seconds from a header duration, or None if it can't be parsed"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers, name):
+    try:
+        return int(float(headers.get(name)))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Classic token bucket holding up to one minute of capacity, refilled
+    continuously at per_minute / 60 per second.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = float(per_minute)
+        self.tokens = self.per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.per_minute, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available (0 if it is now)"""
+        self._refill(now)
+        # A single request larger than the bucket can only ever wait for a full bucket
+        amount = min(amount, self.per_minute)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def set_limit(self, per_minute):
+        """Adopt the limit the upstream reports"""
+        if per_minute and per_minute != self.per_minute:
+            self.per_minute = float(per_minute)
+            self.tokens = min(self.tokens, self.per_minute)
+
+    def sync(self, remaining, now):
+        """Trust the upstream when it has less left than we think (e.g. other clients share the key)"""
+        self._refill(now)
+        if remaining is not None and remaining < self.tokens:
+            self.tokens = float(remaining)
+
+
+class RateLimiter:
+    """
+    Paces requests against both a requests-per-minute and a tokens-per-minute
+    budget. Limits start from configuration and are then adjusted from the
+    upstream's x-ratelimit-* headers; a 429 pauses every caller until the
+    reported reset (or Retry-After).
+
+    Used as a hook by src/upstream.py: before_request() blocks until the
+    request may go out, after_response() feeds back the headers.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None):
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.paused_until = 0.0
+        self.stats = {'requests': 0, 'throttled': 0, 'waited_seconds': 0.0}
+
+    def before_request(self, estimated_tokens=0):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(self.paused_until - now, self.requests.wait_time(1, now))
+                if self.tokens is not None and estimated_tokens:
+                    wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+                if wait <= 0:
+                    self.requests.take(1)
+                    if self.tokens is not None:
+                        self.tokens.take(estimated_tokens)
+                    self.stats['requests'] += 1
+                    self.stats['waited_seconds'] += waited
+                    return
+            time.sleep(wait)
+            waited += wait
+
+    def after_response(self, status_code, headers):
+        now = time.monotonic()
+        with self._lock:
+            self.requests.set_limit(_header_int(headers, 'x-ratelimit-limit-requests'))
+            self.requests.sync(_header_int(headers, 'x-ratelimit-remaining-requests'), now)
+            if self.tokens is not None:
+                self.tokens.set_limit(_header_int(headers, 'x-ratelimit-limit-tokens'))
+                self.tokens.sync(_header_int(headers, 'x-ratelimit-remaining-tokens'), now)
+
+            if status_code == 429:
+                self.stats['throttled'] += 1
+                pause = parse_duration(headers.get('retry-after'))
+                if pause is None:
+                    resets = [
+                        parse_duration(headers.get('x-ratelimit-reset-requests')),
+                        parse_duration(headers.get('x-ratelimit-reset-tokens')),
+                    ]
+                    pause = max([r for r in resets if r] or [1.0])
+                self.paused_until = max(self.paused_until, now + pause)
@@ -0,0 +1,323 @@
+# Shared access to upstream services (OpenAI and Spotify).
+#
+# Everything that talks to an upstream goes through one pooled keep-alive
+# client per service, with configurable timeouts, jittered exponential retry
+# on 429/5xx (honouring Retry-After) and a circuit breaker that fails fast
+# while an upstream is down. Settings come from UPSTREAM_* environment
+# variables. Point OPENAI_BASE_URL / SPOTIFY_ACCOUNTS_URL / SPOTIFY_API_URL
+# at scripts/helpers/upstream_stub.py to run everything offline.
+import os
+import time
+import random
+import json
+import threading
+import httpx
+from rate_limiter import RateLimiter
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    # requests is only needed by the pipeline scripts (Spotify lookups)
+    requests = None
+    HTTPAdapter = object
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Connection-level failures worth retrying (not bad URLs or other config errors)
+CONNECTION_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+if requests is not None:
+    CONNECTION_ERRORS += (requests.ConnectionError, requests.Timeout)
+
+SPOTIFY_ACCOUNTS_URL = os.getenv('SPOTIFY_ACCOUNTS_URL', 'https://accounts.spotify.com')
+SPOTIFY_API_URL = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com')
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that is currently failing"""
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter"), capped at max_delay"""
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=20.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures. While open every call
+    fails fast with CircuitOpenError; after reset_timeout one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError or admit the call; returns True if it is the half-open trial"""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+            self._trial_in_flight = True
+            return True
+
+    def end_call(self, trial):
+        """Let the next trial through if this call was the trial (whatever its outcome)"""
+        if trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self, trial=False):
+        with self._lock:
+            self._failures += 1
+            if trial:
+                self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    print(f"{self.name} circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+def parse_retry_after(value):
+    """Retry-After in seconds (the HTTP-date form is treated as absent)"""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def send_with_retries(send, policy, breaker, describe, limiter=None, cost=0):
+    """
+    Call send() until it returns a non-retryable response or retries run out.
+
+    send() returns a response with .status_code/.headers or raises a
+    connection-level exception. 5xx and connection errors count against the
+    circuit breaker; a 429 closes it (the upstream is up, just throttling us).
+    If a rate limiter is given, every attempt waits for its budget first and
+    feeds the response headers back to it.
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.before_request(cost)
+        trial = breaker.before_call()
+
+        try:
+            response = send()
+        except CONNECTION_ERRORS as e:
+            breaker.record_failure(trial)
+            if attempt >= policy.max_retries:
+                raise
+            delay = policy.delay(attempt)
+            print(f"{describe}: {type(e).__name__}, retrying in {delay:.1f}s")
+        else:
+            if limiter is not None:
+                limiter.after_response(response.status_code, response.headers)
+
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+
+            if response.status_code >= 500:
+                breaker.record_failure(trial)
+            else:
+                breaker.record_success()
+            if attempt >= policy.max_retries:
+                return response
+
+            delay = policy.delay(attempt, parse_retry_after(response.headers.get('retry-after')))
+            print(f"{describe}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+        finally:
+            breaker.end_call(trial)
+
+        time.sleep(delay)
+        attempt += 1
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """httpx transport (used by the OpenAI client) adding retries and circuit breaking"""
+
+    def __init__(self, service, policy, breaker, limits):
+        self._inner = httpx.HTTPTransport(limits=limits)
+        self.service = service
+        self.policy = policy
+        self.breaker = breaker
+
+    def handle_request(self, request):
+        request.read()  # buffer the body so it can be re-sent
+        limiter = rate_limiters.get(self.service)
+        cost = estimate_tokens(request.content) if limiter is not None else 0
+
+        def send():
+            response = self._inner.handle_request(request)
+            if response.status_code in RETRY_STATUSES:
+                response.read()
+            return response
+
+        return send_with_retries(send, self.policy, self.breaker, f"{request.method} {request.url.path}", limiter, cost)
+
+    def close(self):
+        self._inner.close()
+
+
+class ResilientAdapter(HTTPAdapter):
+    """requests adapter (used for Spotify) adding retries, circuit breaking and a default timeout"""
+
+    def __init__(self, service, policy, breaker, timeout, pool_size):
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.service = service
+        self.policy = policy
+        self.breaker = breaker
+        self.timeout = timeout
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        parent_send = super().send
+        return send_with_retries(
+            lambda: parent_send(request, **kwargs),
+            self.policy, self.breaker, f"{request.method} {request.path_url}",
+            rate_limiters.get(self.service)
+        )
+
+
+_lock = threading.Lock()
+_openai_client = None
+_spotify_session = None
+breakers = {
+    'openai': CircuitBreaker(
+        'openai',
+        failure_threshold=int(_env_float('UPSTREAM_BREAKER_THRESHOLD', 5)),
+        reset_timeout=_env_float('UPSTREAM_BREAKER_RESET', 30),
+    ),
+    'spotify': CircuitBreaker(
+        'spotify',
+        failure_threshold=int(_env_float('UPSTREAM_BREAKER_THRESHOLD', 5)),
+        reset_timeout=_env_float('UPSTREAM_BREAKER_RESET', 30),
+    ),
+}
+
+
+# Rate limiters are opt-in (the pipeline scripts enable them); see enable_rate_limiting()
+rate_limiters = {}
+
+
+def estimate_tokens(body):
+    """
+    Rough token cost of an OpenAI request body for the tokens-per-minute budget:
+    ~4 characters per prompt token plus the completion allowance (max_tokens).
+    """
+    if not body:
+        return 0
+    cost = len(body) // 4
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return cost
+    if isinstance(payload, dict):
+        cost += int(payload.get('max_tokens') or payload.get('max_completion_tokens') or 0)
+    return cost
+
+
+def enable_rate_limiting():
+    """
+    Pace this process's upstream calls with adaptive token buckets instead of
+    fixed sleeps. Starting limits come from OPENAI_RPM / OPENAI_TPM / SPOTIFY_RPM
+    and are then adjusted from the upstream's rate-limit headers and 429s.
+    """
+    with _lock:
+        if 'openai' not in rate_limiters:
+            rate_limiters['openai'] = RateLimiter(
+                'openai',
+                requests_per_minute=_env_float('OPENAI_RPM', 500),
+                tokens_per_minute=_env_float('OPENAI_TPM', 200000),
+            )
+        if 'spotify' not in rate_limiters:
+            rate_limiters['spotify'] = RateLimiter('spotify', requests_per_minute=_env_float('SPOTIFY_RPM', 600))
+    return rate_limiters
+
+
+def retry_policy():
+    return RetryPolicy(
+        max_retries=int(_env_float('UPSTREAM_MAX_RETRIES', 3)),
+        base_delay=_env_float('UPSTREAM_BACKOFF_BASE', 0.5),
+        max_delay=_env_float('UPSTREAM_BACKOFF_MAX', 20),
+    )
+
+
+def get_openai_client():
+    """The process-wide OpenAI client (pooled connections, shared retry/breaker policy)"""
+    global _openai_client
+    with _lock:
+        if _openai_client is None:
+            from openai import OpenAI
+
+            pool_size = int(_env_float('UPSTREAM_POOL_SIZE', 20))
+            transport = ResilientTransport(
+                'openai',
+                retry_policy(),
+                breakers['openai'],
+                httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            timeout = httpx.Timeout(
+                _env_float('OPENAI_TIMEOUT', 120),
+                connect=_env_float('UPSTREAM_CONNECT_TIMEOUT', 10),
+            )
+            _openai_client = OpenAI(
+                api_key=os.getenv('OPENAI_API_KEY'),
+                max_retries=0,  # retries happen in ResilientTransport
+                timeout=timeout,
+                http_client=httpx.Client(transport=transport, timeout=timeout),
+            )
+        return _openai_client
+
+
+def get_spotify_session():
+    """The process-wide requests session for Spotify (keep-alive pool, retries, breaker)"""
+    global _spotify_session
+    with _lock:
+        if _spotify_session is None:
+            pool_size = int(_env_float('UPSTREAM_POOL_SIZE', 20))
+            timeout = (_env_float('UPSTREAM_CONNECT_TIMEOUT', 10), _env_float('SPOTIFY_TIMEOUT', 15))
+            adapter = ResilientAdapter('spotify', retry_policy(), breakers['spotify'], timeout, pool_size)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _spotify_session = session
+        return _spotify_session